@@ -7,6 +7,7 @@ N_NODES = "N"      # 动态节点数量
 # B. 几何塔 (Geometric Tower)
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 from torch_geometric.data import Data
 
 class GeometricTower(nn.Module):
@@ -36,17 +37,150 @@ class GeometricTower(nn.Module):
     
 
 # C. 语义塔 (Semantic Tower)
+from transformers import AutoModel, AutoTokenizer
+
 class SemanticTower(nn.Module):
-    def __init__(self, llm_model_name, use_lora=True):
+    def __init__(self, llm_model_name, use_lora=True, micro_batch_size=32, quantize_projector=False,
+                 max_length=512):
         super().__init__()
         # 加载预训练 LLM (如 'meta-llama/Meta-Llama-3-8B')
-        self.llm = AutoModel.from_pretrained(llm_model_name)
+        # BF16 权重 + SDPA (FlashAttention / mem-efficient 融合 kernel)，基座权重冻结，只训练 LoRA
+        self.llm = AutoModel.from_pretrained(
+            llm_model_name,
+            torch_dtype=torch.bfloat16,
+            attn_implementation="sdpa",
+        )
+        self.llm.requires_grad_(False)
         if use_lora:
-            self.llm = apply_lora(self.llm) # 伪代码：应用 LoRA
+            # LoRA 只挂在注意力的 q_proj / v_proj 上，可训练参数量最小；
+            # 适配器权重与基座同为 BF16，LoRA 梯度显存减半
+            from peft import LoraConfig, get_peft_model
+            lora_config = LoraConfig(
+                r=8,
+                lora_alpha=32,
+                lora_dropout=0.1,
+                target_modules=["q_proj", "v_proj"],
+                bias="none",
+                task_type="FEATURE_EXTRACTION",
+            )
+            self.llm = get_peft_model(self.llm, lora_config).to(torch.bfloat16)
+            self.llm.print_trainable_parameters()
         
-        self.tokenizer = AutoTokenizer.from_pretrained(llm_model_name)
+        # Rust 实现的 fast tokenizer；左侧 padding，有效 token 右对齐
+        self.tokenizer = AutoTokenizer.from_pretrained(llm_model_name, use_fast=True, padding_side="left")
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.max_length = max_length  # 节点文本 / prompt 的最大 token 数
         # 投影层：将 LLM 维度映射到统一维度 d_model
-        self.projector = nn.Linear(D_LLM_RAW, D_MODEL)
+        if quantize_projector:
+            # 推理用 int8 权重投影 (bitsandbytes)：4096x1024 的权重读取是瓶颈，int8 减少 4 倍权重字节
+            # threshold=0 关闭离群值的 FP16 分解路径，避免 int8 <-> fp16 来回切换；权重不可训练
+            import bitsandbytes as bnb
+            self.projector = bnb.nn.Linear8bitLt(D_LLM_RAW, D_MODEL, has_fp16_weights=False, threshold=0.0)
+            self._proj_dtype = torch.float16
+        else:
+            self.projector = nn.Linear(D_LLM_RAW, D_MODEL)
+            self._proj_dtype = torch.float32
+
+        # 注意力池化的可学习 query；初始化为 0 时注意力均匀分布，等价于 masked mean pooling
+        self.pool_q = nn.Parameter(torch.zeros(1, 1, D_LLM_RAW))
+
+        self.use_lora = use_lora
+        self.micro_batch_size = micro_batch_size  # 节点文本按长度分桶后每个 micro-batch 的大小
+        # 只作编码器使用（不传 past_key_values、不做生成），关闭 KV cache，前向不再分配并返回无用的缓存
+        self.llm.config.use_cache = False
+        # 编码缓存：节点文本在不同图/不同 step 之间大量重复，prompt 通常固定
+        self._node_emb_cache: dict[str, torch.Tensor] = {}    # 节点文本 -> raw_sem_emb [D_LLM_RAW]
+        self._prompt_emb_cache: dict[str, torch.Tensor] = {}  # prompt 文本 -> 最后 token hidden [1, D_LLM_RAW]
+        self._prompt_proj_cache: dict[str, torch.Tensor] = {} # prompt 文本 -> 投影后的 H_prompt [1, D_MODEL] (仅 eval)
+
+    @property
+    def _llm_frozen(self) -> bool:
+        """LLM 参数在当前模式下不会更新 (eval 模式或未启用 LoRA)，此时 LLM 输出可缓存"""
+        return not (self.training and self.use_lora)
+
+    def train(self, mode: bool = True):
+        # LoRA 权重与池化 query 可能在训练中改变，切换模式时丢弃旧缓存
+        self.clear_cache()
+        return super().train(mode)
+
+    def clear_cache(self) -> None:
+        self._node_emb_cache.clear()
+        self._prompt_emb_cache.clear()
+        self._prompt_proj_cache.clear()
+
+    def _pool_texts(self, texts: list[str], llm_grad: bool) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        文本 -> LLM 最后一层 hidden state 的两种池化结果:
+            pooled_emb: 可学习 query 对整个序列做注意力池化 [len(texts), D_LLM_RAW]
+            last_emb: 最后一个有效 Token 的 hidden state [len(texts), D_LLM_RAW]
+
+        先按长度排序，再切成长度相近的 micro-batch 分别 tokenize，减少 padding 位置上的无效计算；
+        padding 位置被 attention mask 屏蔽，不会污染嵌入。
+        llm_grad 只控制 LLM 前向是否记录梯度，池化 query 的梯度由外部 grad 模式决定。
+        """
+        device = self.pool_q.device
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        pooled, lasts = [], []
+        for start in range(0, len(order), self.micro_batch_size):
+            batch_texts = [texts[i] for i in order[start:start + self.micro_batch_size]]
+            inputs = self.tokenizer(batch_texts, return_tensors="pt", padding="longest",
+                                    truncation=True, max_length=self.max_length)
+            inputs = {k: v.to(device, non_blocking=True) for k, v in inputs.items()}
+            with torch.set_grad_enabled(llm_grad):
+                h = self.llm(**inputs).last_hidden_state                  # [B, L, D]
+            attn = inputs["attention_mask"]                               # [B, L]
+            # SDPA 融合 kernel：单个 query 对序列做 cross-attention，不物化 [B, L] 的注意力矩阵
+            q = self.pool_q.to(h.dtype).expand(h.shape[0], -1, -1)        # [B, 1, D]
+            pooled.append(F.scaled_dot_product_attention(q, h, h, attn_mask=attn[:, None, :].bool()).squeeze(1))
+            # 最后一个有效 Token 的位置 (兼容左/右 padding)
+            last_idx = attn.shape[1] - 1 - attn.flip(1).argmax(dim=1)
+            lasts.append(h[torch.arange(h.shape[0], device=device), last_idx])
+        # 还原为输入顺序
+        inverse = torch.argsort(torch.tensor(order, device=device))
+        return torch.cat(pooled)[inverse], torch.cat(lasts)[inverse]
+
+    def _encode(self, node_texts: list[str], prompt_text: str = None) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        节点文本与 prompt 拼成一个 batch，在同一次 LLM 调用中编码
+
+        Returns:
+            raw_sem_emb: 节点注意力池化嵌入 [N, D_LLM_RAW]
+            raw_prompt_emb: prompt 最后一个 Token 的 hidden state [1, D_LLM_RAW]，无 prompt 时为 None
+
+        按文本缓存，只对未命中缓存的去重节点文本 (以及未缓存的 prompt) 做前向：
+        - 节点嵌入依赖可训练的池化 query，只在 eval 模式下缓存
+        - prompt 嵌入只依赖 LLM，LLM 冻结时即可缓存
+        """
+        cache_nodes = not self.training
+        cache_prompt = self._llm_frozen
+        if cache_nodes:
+            node_batch = [t for t in dict.fromkeys(node_texts) if t not in self._node_emb_cache]
+        else:
+            node_batch = list(node_texts)
+        need_prompt = bool(prompt_text) and not (cache_prompt and prompt_text in self._prompt_emb_cache)
+
+        texts = node_batch + ([prompt_text] if need_prompt else [])
+        if texts:
+            llm_grad = torch.is_grad_enabled() and not self._llm_frozen
+            pooled_emb, last_emb = self._pool_texts(texts, llm_grad)
+
+        if cache_nodes:
+            if node_batch:
+                for text, emb in zip(node_batch, pooled_emb.detach()):
+                    self._node_emb_cache[text] = emb
+            raw_sem_emb = torch.stack([self._node_emb_cache[t] for t in node_texts])
+        else:
+            raw_sem_emb = pooled_emb[:len(node_batch)]
+
+        raw_prompt_emb = None
+        if need_prompt:
+            raw_prompt_emb = last_emb[-1:]  # 取最后一个 Token 代表句意
+            if cache_prompt:
+                self._prompt_emb_cache[prompt_text] = raw_prompt_emb.detach()
+        elif prompt_text:
+            raw_prompt_emb = self._prompt_emb_cache[prompt_text]
+        return raw_sem_emb, raw_prompt_emb
 
     def forward(self, node_texts: list[str], prompt_text: str = None) -> tuple[torch.Tensor, torch.Tensor]:
         """
@@ -57,40 +191,86 @@ class SemanticTower(nn.Module):
             H_sem: 节点语义嵌入 [N, D_MODEL]
             H_prompt: 提示嵌入 (用于 Query) [1, D_MODEL]
         """
-        # 1. Tokenize 节点文本 (Batch processing)
-        inputs = self.tokenizer(node_texts, return_tensors="pt", padding=True, truncation=True)
+        # 0. 推理时 Prompt 固定，投影后的 H_prompt 直接复用 (返回同一张量，融合层的门控缓存也能命中)
+        #    训练时投影层权重每步都在变，不缓存
+        H_prompt = None
+        if prompt_text and not self.training:
+            H_prompt = self._prompt_proj_cache.get(prompt_text)
         
-        # 2. 获取 LLM 最后一层 hidden state (取 [CLS] 或 平均池化)
-        outputs = self.llm(**inputs)
-        raw_sem_emb = outputs.last_hidden_state.mean(dim=1) # [N, 4096]
+        # 1-3. 节点文本与 Prompt 一起 Tokenize，一次 LLM 前向得到最后一层 hidden state
+        #      节点取注意力池化，Prompt 取最后一个 Token；命中缓存的文本跳过前向
+        raw_sem_emb, raw_prompt_emb = self._encode(
+            node_texts, prompt_text if H_prompt is None else None
+        ) # [N, 4096], [1, 4096]
         
-        # 3. 处理 Prompt (如果有)
-        H_prompt = None
-        if prompt_text:
-            p_inputs = self.tokenizer(prompt_text, return_tensors="pt")
-            p_out = self.llm(**p_inputs)
-            raw_prompt_emb = p_out.last_hidden_state[:,-1,:] # 取最后一个 Token 代表句意
-            H_prompt = self.projector(raw_prompt_emb) # [1, 1024]
-
-        # 4. 投影对齐
-        H_sem = self.projector(raw_sem_emb) # [N, 1024]
+        # 4. 投影对齐：节点与 Prompt 共用一次矩阵乘 (LLM 输出为 BF16，投影之后保持 FP32)
+        num_nodes = raw_sem_emb.shape[0]
+        raw_emb = raw_sem_emb if raw_prompt_emb is None else torch.cat([raw_sem_emb, raw_prompt_emb])
+        projected = self.projector(raw_emb.to(self._proj_dtype)).float()
+        H_sem = projected[:num_nodes] # [N, 1024]
+        if raw_prompt_emb is not None:
+            H_prompt = projected[num_nodes:] # [1, 1024]
+            if not self.training:
+                H_prompt = self._prompt_proj_cache[prompt_text] = H_prompt.detach()
         
         return H_sem, H_prompt
 
 
 # D. 跨模态融合层 (Fusion Layer)
+from collections import OrderedDict
+
 class GatedFusionLayer(nn.Module):
-    def __init__(self, d_model):
+    def __init__(self, d_model, gate_cache_size: int = 8):
         super().__init__()
-        self.attention = nn.MultiheadAttention(embed_dim=d_model, num_heads=8)
         self.gate_fc = nn.Linear(d_model, 2) # 生成两个标量权重 lambda_geo, lambda_sem
+        # 门控系数只取决于 Prompt，而同一任务 Prompt 在各图之间不变：
+        # 推理时缓存最近 gate_cache_size 个 Prompt 的门控结果 (LRU)，跳过 gate_fc + softmax
+        self.gate_cache_size = gate_cache_size
+        self._gate_cache: "OrderedDict[int, tuple[torch.Tensor, torch.Tensor]]" = OrderedDict()
+
+    def train(self, mode: bool = True):
+        # gate_fc 权重在训练中会更新，切换模式时丢弃旧缓存
+        self._gate_cache.clear()
+        return super().train(mode)
 
-    def forward(self, H_geo: torch.Tensor, H_sem: torch.Tensor, H_prompt: torch.Tensor) -> torch.Tensor:
+    def compute_gates(self, H_prompt: torch.Tensor) -> torch.Tensor:
+        """
+        Input:
+            H_prompt: [1, d_model]
+        Output:
+            gates: [lambda_geo, lambda_sem] [2]
+
+        缓存以 Prompt 张量本身为键 (按对象身份比较，不需要把张量拷回 CPU 做哈希)；
+        缓存项持有该张量的引用，保证其存储不会被释放后复用。
+        """
+        if self.training:
+            return torch.softmax(self.gate_fc(H_prompt), dim=-1).squeeze(0)
+
+        key = id(H_prompt)
+        entry = self._gate_cache.get(key)
+        if entry is not None and entry[0] is H_prompt:
+            self._gate_cache.move_to_end(key)
+            return entry[1]
+
+        gates = torch.softmax(self.gate_fc(H_prompt), dim=-1).squeeze(0).detach()
+        self._gate_cache[key] = (H_prompt, gates)
+        if len(self._gate_cache) > self.gate_cache_size:
+            self._gate_cache.popitem(last=False)
+        return gates
+
+    def forward(
+        self,
+        H_geo: torch.Tensor,
+        H_sem: torch.Tensor,
+        H_prompt: torch.Tensor = None,
+        gates: torch.Tensor = None,
+    ) -> torch.Tensor:
         """
         Input:
             H_geo: [N, d_model]
             H_sem: [N, d_model]
             H_prompt: [1, d_model] (作为 Query)
+            gates: 预先算好的门控系数 [2] (见 compute_gates)，给出时忽略 H_prompt
         Output:
             Z_fused: 融合后的节点表示 [N, d_model]
         """
@@ -100,27 +280,25 @@ class GatedFusionLayer(nn.Module):
         
         # 策略A：利用 Prompt 计算动态门控权重 (Dynamic Gating)
         # 门控系数取决于任务 Prompt
-        gates = torch.softmax(self.gate_fc(H_prompt), dim=-1) # [1, 2]
-        lambda_geo = gates[0, 0]
-        lambda_sem = gates[0, 1]
+        if gates is None:
+            gates = self.compute_gates(H_prompt) # [2]
+        lambda_geo = gates[0]  # lambda_sem = 1 - lambda_geo
         
-        # 2. 基础融合
-        H_combined = lambda_geo * H_geo + lambda_sem * H_sem
+        # 2. 基础融合：lambda_geo * H_geo + lambda_sem * H_sem
+        # 两个门控系数之和为 1，等价于一次 lerp，单个 kernel 完成，不产生中间张量
+        H_combined = torch.lerp(H_sem, H_geo, lambda_geo)
         
-        # 3. (可选) 进一步利用 Prompt 对节点进行 Attention 加权
-        # Query=H_prompt, Key=H_combined, Value=H_combined
-        # 注意：这里维度需要调整为 [Seq_len, Batch, Dim] 适配 torch.nn.MHA
-        # 这里的 Attention 作用是：根据 Prompt 筛选哪些节点特征更重要
-        # 但在节点分类/排序任务中，通常是对每个节点独立增强
+        # 3. (可选) 进一步利用 Prompt 对节点进行 Cross-Attention 加权
+        # 在节点分类/排序任务中，通常是对每个节点独立增强，这里不使用
         
-        Z_fused = H_combined # 简化版，实际可用更复杂的 Cross-Attn
+        Z_fused = H_combined
         
         return Z_fused
 
 
 # E. 主模型封装 (SIG-FM Main Wrapper)
 class SIG_FM(nn.Module):
-    def __init__(self):
+    def __init__(self, compile_head: bool = True, overlap_towers: bool = True):
         super().__init__()
         self.geo_tower = GeometricTower(...)
         self.sem_tower = SemanticTower(...) # 设为 eval 模式或只训练 LoRA
@@ -130,21 +308,69 @@ class SIG_FM(nn.Module):
             nn.ReLU(),
             nn.Linear(256, 1) # 输出标量分数
         )
+        # 融合 -> 解码 -> softmax 是纯张量计算，用 torch.compile 融合成少量 kernel；
+        # N 随图变化，dynamic=True 避免每个新 N 都重新编译。
+        # 语义塔包含 tokenizer (Python 字符串处理)、几何塔包含 PyG scatter 算子，两者保持 eager。
+        self._head = torch.compile(self._score, dynamic=True) if compile_head else self._score
+        # 两个塔在融合前没有数据依赖：GPU 上分别放到独立的 CUDA stream，GNN 与 LLM 的 kernel 可以重叠执行
+        self.overlap_towers = overlap_towers
+        self._tower_streams = None  # (geo_stream, sem_stream)，首次在 GPU 上前向时创建
 
-    def forward(self, graph_data, node_texts, task_prompt):
-        # 1. 获取双塔特征
-        H_geo = self.geo_tower(graph_data)
-        H_sem, H_prompt = self.sem_tower(node_texts, task_prompt)
-        
+    def _score(self, H_geo: torch.Tensor, H_sem: torch.Tensor, gates: torch.Tensor, top_k: int = None):
         # 2. 融合 (Phase 2 训练重点)
-        Z = self.fusion(H_geo, H_sem, H_prompt)
+        Z = self.fusion(H_geo, H_sem, gates=gates)
         
         # 3. 预测干预分数 (Predict Intervention Score)
         logits = self.decoder(Z) # [N, 1]
         
         # 4. 转换为概率分布 (用于采样或排序)
-        probs = torch.softmax(logits, dim=0) 
+        if top_k is None:
+            probs = torch.softmax(logits, dim=0) 
+            return probs
         
-        return probs
+        # 下游只需要前 k 个候选：先 topk 再只对 k 个分数做 softmax，避免全图 exp + 归一化
+        vals, idx = torch.topk(logits.squeeze(-1), min(top_k, logits.shape[0]))
+        return idx, torch.softmax(vals, dim=0)
 
+    def _run_towers_concurrently(self, graph_data, node_texts, task_prompt):
+        """几何塔与语义塔分别在两个 CUDA stream 上前向，返回 (H_geo, H_sem, H_prompt)"""
+        if self._tower_streams is None:
+            self._tower_streams = (torch.cuda.Stream(), torch.cuda.Stream())
+        geo_stream, sem_stream = self._tower_streams
+        
+        # 两个 stream 都要等当前 stream 上的输入准备好 (例如 non_blocking 的 H2D 拷贝)
+        current = torch.cuda.current_stream()
+        geo_stream.wait_stream(current)
+        sem_stream.wait_stream(current)
+        
+        with torch.cuda.stream(geo_stream):
+            H_geo = self.geo_tower(graph_data)
+        with torch.cuda.stream(sem_stream):
+            H_sem, H_prompt = self.sem_tower(node_texts, task_prompt)
+        
+        # 融合前汇合；输出张量在旁路 stream 上分配，需登记到当前 stream，避免被提前复用
+        current.wait_stream(geo_stream)
+        current.wait_stream(sem_stream)
+        for t in (H_geo, H_sem, H_prompt):
+            if t is not None:
+                t.record_stream(current)
+        return H_geo, H_sem, H_prompt
 
+    def forward(self, graph_data, node_texts, task_prompt, top_k: int = None):
+        """
+        Output:
+            top_k 为 None 时: 全部节点的概率分布 probs [N, 1]
+            否则: (top-k 节点下标 [k], 在这 k 个节点上归一化的概率 [k])
+        """
+        # 1. 获取双塔特征
+        if self.overlap_towers and graph_data.x.is_cuda:
+            H_geo, H_sem, H_prompt = self._run_towers_concurrently(graph_data, node_texts, task_prompt)
+        else:
+            H_geo = self.geo_tower(graph_data)
+            H_sem, H_prompt = self.sem_tower(node_texts, task_prompt)
+        
+        # 门控系数只依赖 Prompt，在编译区域外计算 (推理时命中 LRU 缓存)
+        gates = self.fusion.compute_gates(H_prompt)
+        
+        # 2-4. 融合、打分、归一化 (编译后的计算图，topk + softmax 一并融合)
+        return self._head(H_geo, H_sem, gates, top_k)
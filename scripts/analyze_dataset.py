@@ -5,90 +5,195 @@
 
 用法:
     python scripts/analyze_dataset.py data/fine_tuning/dismantle/train.json
+    python scripts/analyze_dataset.py data/fine_tuning/dismantle/train.json --workers 8
 """
 
 import argparse
-import json
-from collections import Counter
+import math
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
 
+import numpy as np
 
-def analyze_dataset(data_file: str):
-    """分析数据集统计信息"""
-    with open(data_file, 'r', encoding='utf-8') as f:
-        samples = json.load(f)
-    
+from sample_io import iter_samples
+
+
+def iter_chunks(samples, chunk_size: int):
+    """将样本流切成大小为 chunk_size 的列表"""
+    it = iter(samples)
+    while True:
+        chunk = list(islice(it, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def summarize_samples(samples: list) -> dict:
+    """
+    统计一批样本的部分结果 (map 阶段，可在子进程中执行)
+    
+    Returns:
+        部分统计量字典，多个结果用 merge_summaries 合并；数值列以数组列表形式保存，报告时再拼接
+    """
+    metas = [s['meta'] for s in samples]
+    labels_per_sample = [s['auxiliary_labels'] for s in samples if 'auxiliary_labels' in s]
+    label_counts = np.fromiter((len(labels) for labels in labels_per_sample), dtype=np.int64,
+                               count=len(labels_per_sample))
+    label_values = np.fromiter((v for labels in labels_per_sample for v in labels.values()),
+                               dtype=np.float64, count=int(label_counts.sum()))
+    
+    # 在 C 层对整列做 "/" 切分，取总步数
+    budget_steps = np.asarray([m.get('budget_step', '1/10') for m in metas], dtype=str)
+    budget_steps = budget_steps[np.char.find(budget_steps, '/') >= 0]
+    if budget_steps.size:
+        budgets = np.char.partition(budget_steps, '/')[:, 2].astype(np.int64)
+    else:
+        budgets = np.empty(0, dtype=np.int64)
+    
+    has_labels = label_values.size > 0
+    label_mean = float(label_values.mean()) if has_labels else 0.0
+    
+    return {
+        'num_samples': len(samples),
+        'task_counts': Counter(m.get('task', 'unknown') for m in metas),
+        'source_counts': Counter(m.get('data_source', 'unknown') for m in metas),
+        'node_counts': [np.fromiter((m.get('num_nodes', 0) for m in metas), dtype=np.int64, count=len(metas))],
+        'budgets': [budgets],
+        'label_counts': [label_counts],
+        'label_n': int(label_values.size),
+        'label_mean': label_mean,
+        'label_m2': float(np.square(label_values - label_mean).sum()),
+        'label_min': float(label_values.min()) if has_labels else math.inf,
+        'label_max': float(label_values.max()) if has_labels else -math.inf,
+        'missing_labels': sum(1 for s in samples if not s.get('auxiliary_labels')),
+        'missing_conversations': sum(1 for s in samples if 'conversations' not in s or len(s['conversations']) < 3),
+    }
+
+
+def merge_summaries(a: dict, b: dict) -> dict:
+    """合并两个部分统计量 (reduce 阶段)；均值/方差按 Chan 并行公式合并，保持数值稳定"""
+    label_n = a['label_n'] + b['label_n']
+    delta = b['label_mean'] - a['label_mean']
+    if label_n:
+        label_mean = a['label_mean'] + delta * b['label_n'] / label_n
+        label_m2 = a['label_m2'] + b['label_m2'] + delta * delta * a['label_n'] * b['label_n'] / label_n
+    else:
+        label_mean, label_m2 = 0.0, 0.0
+    
+    return {
+        'num_samples': a['num_samples'] + b['num_samples'],
+        'task_counts': a['task_counts'] + b['task_counts'],
+        'source_counts': a['source_counts'] + b['source_counts'],
+        'node_counts': a['node_counts'] + b['node_counts'],
+        'budgets': a['budgets'] + b['budgets'],
+        'label_counts': a['label_counts'] + b['label_counts'],
+        'label_n': label_n,
+        'label_mean': label_mean,
+        'label_m2': label_m2,
+        'label_min': min(a['label_min'], b['label_min']),
+        'label_max': max(a['label_max'], b['label_max']),
+        'missing_labels': a['missing_labels'] + b['missing_labels'],
+        'missing_conversations': a['missing_conversations'] + b['missing_conversations'],
+    }
+
+
+def summarize_parallel(chunks, workers: int):
+    """
+    多进程统计各分块，按提交顺序产出部分结果
+    
+    最多同时有 2 * workers 个分块在途，保持流式读取的内存上界。
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(summarize_samples, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def analyze_dataset(data_file: str, workers: int = 1, chunk_size: int = 10000):
+    """
+    分析数据集统计信息
+    
+    Args:
+        data_file: 数据文件路径
+        workers: 统计用的进程数，1 表示在当前进程中执行
+        chunk_size: 每个分块的样本数
+    """
     print(f"\n{'='*60}")
     print(f"Dataset Analysis: {data_file}")
     print(f"{'='*60}")
-    print(f"Total samples: {len(samples)}")
     
-    if len(samples) == 0:
+    # 流式读取 -> 分块统计 (map) -> 合并 (reduce)，不保留样本对象
+    chunks = iter_chunks(iter_samples(data_file), chunk_size)
+    if workers > 1:
+        summaries = summarize_parallel(chunks, workers)
+    else:
+        summaries = map(summarize_samples, chunks)
+    
+    summary = None
+    for part in summaries:
+        summary = part if summary is None else merge_summaries(summary, part)
+    
+    num_samples = summary['num_samples'] if summary else 0
+    print(f"Total samples: {num_samples}")
+    
+    if num_samples == 0:
         print("Warning: Empty dataset!")
         return
     
+    node_counts = np.concatenate(summary['node_counts'])
+    budgets = np.concatenate(summary['budgets'])
+    label_counts = np.concatenate(summary['label_counts'])
+    
     # 任务类型分布
-    task_types = [s['meta'].get('task', 'unknown') for s in samples]
     print(f"\nTask type distribution:")
-    for task, count in Counter(task_types).items():
-        print(f"  {task}: {count} ({count/len(samples)*100:.1f}%)")
+    for task, count in summary['task_counts'].items():
+        print(f"  {task}: {count} ({count/num_samples*100:.1f}%)")
     
     # 数据源分布
-    data_sources = [s['meta'].get('data_source', 'unknown') for s in samples]
     print(f"\nData source distribution:")
-    for source, count in Counter(data_sources).items():
-        print(f"  {source}: {count} ({count/len(samples)*100:.1f}%)")
+    for source, count in summary['source_counts'].items():
+        print(f"  {source}: {count} ({count/num_samples*100:.1f}%)")
     
     # 节点数分布
-    node_counts = [s['meta'].get('num_nodes', 0) for s in samples]
-    if node_counts:
+    if node_counts.size:
         print(f"\nNode count statistics:")
-        print(f"  Min: {min(node_counts)}")
-        print(f"  Max: {max(node_counts)}")
-        print(f"  Mean: {sum(node_counts) / len(node_counts):.2f}")
-        print(f"  Median: {sorted(node_counts)[len(node_counts)//2]}")
+        print(f"  Min: {node_counts.min()}")
+        print(f"  Max: {node_counts.max()}")
+        print(f"  Mean: {node_counts.mean():.2f}")
+        print(f"  Median: {np.partition(node_counts, num_samples // 2)[num_samples // 2]}")
     
     # 操作预算分布
-    budgets = []
-    for s in samples:
-        budget_step = s['meta'].get('budget_step', '1/10')
-        if '/' in budget_step:
-            total_steps = int(budget_step.split('/')[1])
-            budgets.append(total_steps)
-    
-    if budgets:
+    if budgets.size:
         print(f"\nBudget statistics:")
-        print(f"  Min: {min(budgets)}")
-        print(f"  Max: {max(budgets)}")
-        print(f"  Mean: {sum(budgets) / len(budgets):.2f}")
+        print(f"  Min: {budgets.min()}")
+        print(f"  Max: {budgets.max()}")
+        print(f"  Mean: {budgets.mean():.2f}")
     
     # auxiliary_labels 统计
-    label_values = []
-    label_counts = []
-    for s in samples:
-        if 'auxiliary_labels' in s:
-            labels = s['auxiliary_labels']
-            label_values.extend(labels.values())
-            label_counts.append(len(labels))
-    
-    if label_values:
+    label_n = summary['label_n']
+    if label_n:
         print(f"\nLabel value statistics:")
-        print(f"  Min: {min(label_values):.4f}")
-        print(f"  Max: {max(label_values):.4f}")
-        print(f"  Mean: {sum(label_values) / len(label_values):.4f}")
-        print(f"  Std: {(sum((x - sum(label_values)/len(label_values))**2 for x in label_values) / len(label_values))**0.5:.4f}")
+        print(f"  Min: {summary['label_min']:.4f}")
+        print(f"  Max: {summary['label_max']:.4f}")
+        print(f"  Mean: {summary['label_mean']:.4f}")
+        print(f"  Std: {math.sqrt(summary['label_m2'] / label_n):.4f}")
     
-    if label_counts:
+    if label_counts.size:
         print(f"\nCandidate count per sample:")
-        print(f"  Min: {min(label_counts)}")
-        print(f"  Max: {max(label_counts)}")
-        print(f"  Mean: {sum(label_counts) / len(label_counts):.2f}")
+        print(f"  Min: {label_counts.min()}")
+        print(f"  Max: {label_counts.max()}")
+        print(f"  Mean: {label_counts.mean():.2f}")
     
     # 检查数据完整性
+    missing_labels = summary['missing_labels']
+    missing_conversations = summary['missing_conversations']
     print(f"\nData quality check:")
-    missing_labels = sum(1 for s in samples if 'auxiliary_labels' not in s or not s['auxiliary_labels'])
-    missing_conversations = sum(1 for s in samples if 'conversations' not in s or len(s['conversations']) < 3)
-    
     print(f"  Samples with missing labels: {missing_labels}")
     print(f"  Samples with incomplete conversations: {missing_conversations}")
     
@@ -100,6 +205,9 @@ def main():
     parser = argparse.ArgumentParser(description="分析数据集")
     
     parser.add_argument("data_file", type=str, help="数据文件路径（train.json 或 eval.json）")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="统计用的进程数 (默认 1；大数据集可设为 CPU 核数)")
+    parser.add_argument("--chunk_size", type=int, default=10000, help="每个进程分块的样本数")
     
     args = parser.parse_args()
     
@@ -108,7 +216,7 @@ def main():
         print(f"Error: File not found: {data_file}")
         return
     
-    analyze_dataset(str(data_file))
+    analyze_dataset(str(data_file), workers=args.workers, chunk_size=args.chunk_size)
 
 
 if __name__ == "__main__":
@@ -5,13 +5,22 @@
 
 用法:
     python scripts/clear_gpu_memory.py
+    python scripts/clear_gpu_memory.py --device 0   # 只处理/报告指定 GPU
 """
 
-import torch
+import argparse
 import gc
+from typing import Optional
+
+import torch
 
-def clear_gpu_memory():
-    """清理 GPU 内存"""
+def clear_gpu_memory(device: Optional[int] = None):
+    """
+    清理 GPU 内存
+    
+    Args:
+        device: 只处理指定 GPU，None 表示所有持有显存的 GPU
+    """
     print("正在清理 GPU 内存...")
     
     # 清理 Python 垃圾回收
@@ -19,16 +28,34 @@ def clear_gpu_memory():
     
     # 清理 PyTorch 缓存
     if torch.cuda.is_available():
+        # empty_cache 只归还缓存分配器中未使用的块，不需要先 synchronize 整个设备
         torch.cuda.empty_cache()
-        torch.cuda.synchronize()
+        # 释放跨进程共享 (IPC) 的显存句柄
+        torch.cuda.ipc_collect()
+        
+        if device is not None:
+            devices = [device]
+        else:
+            # 跳过未持有任何显存的 GPU
+            devices = [i for i in range(torch.cuda.device_count())
+                       if torch.cuda.memory_reserved(i) > 0]
         
         # 显示当前 GPU 内存使用情况
-        for i in range(torch.cuda.device_count()):
+        for i in devices:
+            torch.cuda.reset_peak_memory_stats(i)
             allocated = torch.cuda.memory_allocated(i) / 1024**3
             reserved = torch.cuda.memory_reserved(i) / 1024**3
             print(f"GPU {i}: 已分配 {allocated:.2f} GB, 已保留 {reserved:.2f} GB")
     
     print("GPU 内存清理完成!")
 
+def main():
+    parser = argparse.ArgumentParser(description="清理 GPU 内存")
+    parser.add_argument("--device", type=int, default=None,
+                        help="只处理指定 GPU (默认: 所有持有显存的 GPU)")
+    args = parser.parse_args()
+    
+    clear_gpu_memory(args.device)
+
 if __name__ == "__main__":
-    clear_gpu_memory()
+    main()
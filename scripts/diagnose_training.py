@@ -10,9 +10,11 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 import torch
-import json
+from array import array
 import numpy as np
 
+from sample_io import iter_samples
+
 
 def check_data_quality(data_path: str):
     """检查数据质量"""
@@ -20,29 +22,47 @@ def check_data_quality(data_path: str):
     print("1. 检查数据质量")
     print("=" * 60)
     
-    with open(data_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    print(f"样本数量: {len(data)}")
+    # 流式读取时只抽取 auxiliary_labels 的扁平数值列及其归属 (样本下标, op_id)，
+    # 异常值检查和统计量在读取结束后一次性向量化完成
+    sample_ids = []
+    values = array('d')
+    owners = array('q')
+    op_ids = []
+    length_issues = []  # (样本下标, 问题描述)
     
-    issues = []
-    for i, sample in enumerate(data):
+    for i, sample in enumerate(iter_samples(data_path)):
+        sample_ids.append(sample.get('id', 'unknown'))
         aux_labels = sample.get("auxiliary_labels", {})
-        
-        # 检查 auxiliary_labels
-        for op_id, value in aux_labels.items():
-            if value != value:  # NaN check
-                issues.append(f"样本 {i} ({sample.get('id', 'unknown')}): {op_id} 值为 NaN")
-            if abs(value) == float('inf'):
-                issues.append(f"样本 {i} ({sample.get('id', 'unknown')}): {op_id} 值为 Inf")
-            if abs(value) > 100:
-                issues.append(f"样本 {i} ({sample.get('id', 'unknown')}): {op_id} 值异常大: {value}")
+        values.extend(aux_labels.values())
+        owners.extend([i] * len(aux_labels))
+        op_ids.extend(aux_labels.keys())
         
         # 检查文本长度
         convs = sample.get("conversations", [])
         total_len = sum(len(c.get("value", "")) for c in convs)
         if total_len > 10000:
-            issues.append(f"样本 {i}: 文本总长度过长: {total_len}")
+            length_issues.append((i, f"样本 {i}: 文本总长度过长: {total_len}"))
+    
+    print(f"样本数量: {len(sample_ids)}")
+    
+    # 检查 auxiliary_labels
+    arr = np.frombuffer(values, dtype=np.float64)
+    is_nan = np.isnan(arr)
+    is_inf = np.isinf(arr)
+    too_large = np.abs(arr) > 100
+    label_issues = []
+    for k in np.flatnonzero(is_nan | is_inf | too_large):
+        i = owners[k]
+        prefix = f"样本 {i} ({sample_ids[i]}): {op_ids[k]}"
+        if is_nan[k]:
+            label_issues.append((i, f"{prefix} 值为 NaN"))
+        if is_inf[k]:
+            label_issues.append((i, f"{prefix} 值为 Inf"))
+        if too_large[k]:
+            label_issues.append((i, f"{prefix} 值异常大: {arr[k]}"))
+    
+    # 按样本顺序合并 (同一样本内标签问题在前)
+    issues = [msg for _, msg in sorted(label_issues + length_issues, key=lambda x: x[0])]
     
     if issues:
         print(f"\n⚠️ 发现 {len(issues)} 个潜在问题:")
@@ -54,17 +74,13 @@ def check_data_quality(data_path: str):
         print("✅ 数据质量检查通过，未发现异常值")
     
     # 统计 auxiliary_labels 分布
-    all_values = []
-    for sample in data:
-        all_values.extend(sample.get("auxiliary_labels", {}).values())
-    
-    if all_values:
+    if arr.size:
         print(f"\nauxiliary_labels 统计:")
-        print(f"  最小值: {min(all_values):.6f}")
-        print(f"  最大值: {max(all_values):.6f}")
-        print(f"  均值: {np.mean(all_values):.6f}")
-        print(f"  标准差: {np.std(all_values):.6f}")
-        print(f"  零值比例: {sum(1 for v in all_values if v == 0) / len(all_values) * 100:.1f}%")
+        print(f"  最小值: {arr.min():.6f}")
+        print(f"  最大值: {arr.max():.6f}")
+        print(f"  均值: {arr.mean():.6f}")
+        print(f"  标准差: {arr.std():.6f}")
+        print(f"  零值比例: {np.count_nonzero(arr == 0) / arr.size * 100:.1f}%")
     
     return len(issues) == 0
 
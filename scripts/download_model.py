@@ -11,6 +11,7 @@
 """
 
 import argparse
+import importlib.util
 import os
 import sys
 from pathlib import Path
@@ -20,12 +21,27 @@ if 'HF_ENDPOINT' not in os.environ:
     os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com'
     print("ℹ️  已设置 HuggingFace 镜像站点: https://hf-mirror.com")
 
+# 启用 hf_transfer (Rust 实现的多连接下载器)，必须在导入 huggingface_hub 之前设置；
+# 未安装 hf_transfer 时开启该开关会导致下载报错，因此只在已安装时启用
+HF_TRANSFER_AVAILABLE = importlib.util.find_spec('hf_transfer') is not None
+if 'HF_HUB_ENABLE_HF_TRANSFER' not in os.environ and HF_TRANSFER_AVAILABLE:
+    os.environ['HF_HUB_ENABLE_HF_TRANSFER'] = '1'
 
-def download_model(model_name: str = "Qwen/Qwen2.5-1.5B-Instruct"):
-    """下载模型到本地缓存"""
+# 仓库同时提供 safetensors 时，跳过同一份权重的其他格式
+DUPLICATE_WEIGHT_PATTERNS = ["*.bin", "*.pt", "*.pth", "*.h5", "*.msgpack", "*.ot", "*.onnx"]
+
+
+def download_model(model_name: str = "Qwen/Qwen2.5-1.5B-Instruct", max_workers: int = 8):
+    """
+    下载模型到本地缓存
+    
+    Args:
+        model_name: 模型名称
+        max_workers: 并行下载的文件数
+    """
     try:
         from transformers import AutoModelForCausalLM, AutoTokenizer
-        from huggingface_hub import snapshot_download
+        from huggingface_hub import HfApi, snapshot_download
     except ImportError:
         print("❌ 缺少依赖库")
         print("请安装: pip install transformers huggingface-hub")
@@ -36,6 +52,8 @@ def download_model(model_name: str = "Qwen/Qwen2.5-1.5B-Instruct"):
     print("=" * 60)
     print(f"模型名称: {model_name}")
     print(f"镜像站点: {os.environ.get('HF_ENDPOINT', 'https://huggingface.co')}")
+    if not HF_TRANSFER_AVAILABLE:
+        print("提示: 安装 hf_transfer 可显著加快下载: pip install hf_transfer")
     print()
     
     try:
@@ -52,11 +70,18 @@ def download_model(model_name: str = "Qwen/Qwen2.5-1.5B-Instruct"):
         print("   模型大小约 3GB (Qwen2.5-1.5B)")
         print()
         
-        # 下载模型（只下载配置，不加载到内存）
+        # 有 safetensors 权重时跳过 .bin 等重复格式
+        repo_files = HfApi().list_repo_files(model_name)
+        has_safetensors = any(f.endswith('.safetensors') for f in repo_files)
+        
+        # 下载模型（只下载配置，不加载到内存），多个文件并行下载
         snapshot_download(
             repo_id=model_name,
             local_files_only=False,
-            resume_download=True
+            resume_download=True,
+            max_workers=max_workers,
+            etag_timeout=30,
+            ignore_patterns=DUPLICATE_WEIGHT_PATTERNS if has_safetensors else None
         )
         
         print()
@@ -94,10 +119,16 @@ def main():
         default="Qwen/Qwen2.5-1.5B-Instruct",
         help="要下载的模型名称"
     )
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        default=8,
+        help="并行下载的文件数"
+    )
     
     args = parser.parse_args()
     
-    success = download_model(args.model_name)
+    success = download_model(args.model_name, max_workers=args.max_workers)
     
     if not success:
         sys.exit(1)
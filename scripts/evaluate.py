@@ -9,6 +9,7 @@
 """
 
 import argparse
+import hashlib
 import sys
 from pathlib import Path
 
@@ -19,12 +20,18 @@ import yaml
 import torch
 import numpy as np
 from tqdm import tqdm
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 from src.model.fusion_llm import ResilienceLLM, ModelConfig
+from src.model.checkpoint import load_checkpoint_state
 from src.data.dataset import create_dataloader
 from src.model.loss import ListMLELoss
 
+try:
+    import numba
+except ImportError:  # 未安装 numba 时 CPU 评估走 PyTorch 向量化实现
+    numba = None
+
 
 def load_config(config_path: str) -> dict:
     """加载配置文件"""
@@ -33,117 +40,404 @@ def load_config(config_path: str) -> dict:
     return config
 
 
-def compute_ranking_metrics(scores: torch.Tensor, labels: torch.Tensor, mask: torch.Tensor = None) -> Dict[str, float]:
+# NDCG 折扣表缓存：(device, k) -> 1 / log2(i + 2)，每个设备/长度只构建一次
+_DISCOUNTS: Dict[tuple, torch.Tensor] = {}
+
+
+def _get_discounts(k: int, device: torch.device) -> torch.Tensor:
+    """获取长度为 k 的 NDCG 折扣向量（按设备缓存）"""
+    key = (torch.device(device), k)
+    discounts = _DISCOUNTS.get(key)
+    if discounts is None:
+        discounts = 1.0 / torch.log2(torch.arange(2, k + 2, dtype=torch.float32, device=device))
+        _DISCOUNTS[key] = discounts
+    return discounts
+
+
+def _ndcg_from_prefix(per_pos_dcg: torch.Tensor, per_pos_idcg: torch.Tensor, k: int) -> torch.Tensor:
+    """由逐位置的 DCG/IDCG 增益取前 k 个求和，得到每个样本的 NDCG@k [batch_size]"""
+    dcg = per_pos_dcg[:, :k].sum(dim=1)
+    idcg = per_pos_idcg[:, :k].sum(dim=1)
+    return torch.where(idcg > 0, dcg / idcg.clamp_min(1e-12), torch.zeros_like(dcg))
+
+
+def _reciprocal_rank(scores: torch.Tensor, labels: torch.Tensor, mask: torch.Tensor) -> torch.Tensor:
     """
-    计算排序指标
+    每个样本第一个正标签的倒数名次 [batch_size]（没有正标签时为 0）
+    
+    用 >/>= 计数代替 argsort：optimistic 为得分严格更高的候选数，pessimistic 额外计入
+    同分候选（含自身），同分时取随机打破平局下的期望名次 (optimistic + pessimistic + 1) / 2
+    """
+    pos_scores = scores.masked_fill(labels <= 0, float('-inf')).max(dim=1, keepdim=True).values
+    optimistic = ((scores > pos_scores) & mask).sum(dim=1)
+    pessimistic = ((scores >= pos_scores) & mask).sum(dim=1)
+    rank = 0.5 * (optimistic + pessimistic).float() + 0.5
+    has_pos = (labels > 0).any(dim=1)
+    return torch.where(has_pos, 1.0 / rank.clamp_min(1.0), torch.zeros_like(rank))
+
+
+def _top1_accuracy(scores: torch.Tensor, labels: torch.Tensor, invalid: torch.Tensor) -> torch.Tensor:
+    """每个样本预测第一的候选是否具有最大真实标签 [batch_size]"""
+    top1_label = labels.gather(1, scores.argmax(dim=1, keepdim=True)).squeeze(1)
+    max_label = labels.masked_fill(invalid, float('-inf')).max(dim=1).values
+    return (top1_label == max_label).float()
+
+
+def _ranking_metrics_vectorized(
+    scores: torch.Tensor,
+    labels: torch.Tensor,
+    mask: torch.Tensor,
+    discounts: torch.Tensor
+) -> Dict[str, torch.Tensor]:
+    """
+    排序指标的向量化主体（gather → 乘折扣 → 求和 → 相除 → where 等一串小算子，适合整体编译融合）
     
     Args:
-        scores: 预测分数 [batch_size, num_candidates]
-        labels: 真实标签 [batch_size, num_candidates]
-        mask: 有效候选掩码 [batch_size, num_candidates]
+        scores: 预测分数 [batch_size, num_candidates]，float32
+        labels: 真实标签 [batch_size, num_candidates]，float32
+        mask: 有效候选掩码 [batch_size, num_candidates]，bool
+        discounts: NDCG 折扣向量 [min(10, num_candidates)]
     
     Returns:
-        指标字典
+        各指标在有效样本上的求和，以及有效样本数 "num_samples"
     """
-    batch_size = scores.shape[0]
-    
-    # 确保数据在 CPU 上并转换为 float32（避免 Half 精度问题）
-    scores = scores.detach().cpu().float()
-    labels = labels.detach().cpu().float()
-    if mask is not None:
-        mask = mask.detach().cpu()
-    
-    # 应用掩码
-    if mask is not None:
-        scores = scores.masked_fill(~mask.bool(), float('-inf'))
-        labels = labels.masked_fill(~mask.bool(), 0.0)
-    
-    # NDCG@K
-    def ndcg_at_k(y_true, y_pred, k=5):
-        """计算 NDCG@K"""
-        # 获取 top-k 预测
-        k_actual = min(k, len(y_pred))
-        _, top_k_indices = torch.topk(y_pred, k_actual, dim=-1)
-        # 确保索引是 long 类型
-        top_k_indices = top_k_indices.long()
-        top_k_true = y_true[top_k_indices]
+    # 没有带正标签的有效候选的样本不计入（用权重而不是布尔索引，避免数据相关形状引起同步）；
+    # 逐样本判断，指标与样本如何分 batch 无关
+    valid_rows = (mask & (labels > 0)).any(dim=1)
+    row_weight = valid_rows.float()
+    
+    # 应用掩码：无效候选分数为 -inf（排在最后），标签为 0（不贡献增益）
+    # 取反只做一次；标签直接乘 0/1 掩码，省掉一次 masked_fill
+    invalid = ~mask
+    scores = scores.masked_fill(invalid, float('-inf'))
+    labels = labels * mask.to(labels.dtype)
+    
+    # NDCG@5 / NDCG@10：一次 topk(10) + gather，DCG@5 是逐位置增益的前缀和，IDCG 同理
+    k10 = discounts.shape[0]
+    k5 = min(5, k10)
+    top_idx = scores.topk(k10, dim=1, sorted=True).indices
+    per_pos_dcg = labels.gather(1, top_idx) * discounts
+    # 理想排序只需要前 k 个最大标签（按序），topk 比全量 sort 更省
+    per_pos_idcg = labels.topk(k10, dim=1, sorted=True).values * discounts
+    
+    per_sample = {
+        "ndcg@5": _ndcg_from_prefix(per_pos_dcg, per_pos_idcg, k5),
+        "ndcg@10": _ndcg_from_prefix(per_pos_dcg, per_pos_idcg, k10),
+        "mrr": _reciprocal_rank(scores, labels, mask),
+        "top1_accuracy": _top1_accuracy(scores, labels, invalid),
+    }
+    metrics = {name: (values * row_weight).sum() for name, values in per_sample.items()}
+    metrics["num_samples"] = valid_rows.sum()
+    return metrics
+
+
+# Inductor 编译版本：把上面的逐元素 + 归约算子链融合成少量 kernel；
+# 候选数随 batch 变化，使用 dynamic=True 避免每种形状重新编译。
+# 需要可用的 C++/Triton 工具链且首次调用要编译数秒，因此只在 --compile_metrics 时使用
+_ranking_metrics_compiled = torch.compile(_ranking_metrics_vectorized, dynamic=True)
+
+
+if numba is not None:
+    # 不开启 ninf/nnan：被掩码的候选以 -inf 作为哨兵参与比较
+    @numba.njit(parallel=True, fastmath={'nsz', 'arcp', 'contract', 'afn', 'reassoc'}, cache=True)
+    def _ranking_metrics_numba(scores, labels, mask, k10):
+        """
+        CPU 上的排序指标内核（PyTorch 的 topk 等算子在 CPU 上明显慢于 Numba 标量循环）
         
-        # DCG - 将张量转换为 numpy 进行计算
-        top_k_true_np = top_k_true.numpy()
-        dcg = 0.0
-        for i, rel in enumerate(top_k_true_np):
-            dcg += float(rel) / np.log2(i + 2)
+        外层 prange 并行遍历样本，语义与 _ranking_metrics_vectorized 一致。
+        候选数很小（默认最多 10 个），top-k 用 k 轮选择代替 argpartition。
         
-        # IDCG (理想情况)
-        ideal_sorted = torch.sort(y_true, descending=True)[0]
-        ideal_sorted_np = ideal_sorted[:k].numpy()
-        idcg = 0.0
-        for i, rel in enumerate(ideal_sorted_np):
-            idcg += float(rel) / np.log2(i + 2)
+        Returns:
+            [ndcg@5 求和, ndcg@10 求和, mrr 求和, top1 求和, 有效样本数]
+        """
+        batch_size, num_candidates = scores.shape
+        k5 = min(5, k10)
+        ndcg5_sum = 0.0
+        ndcg10_sum = 0.0
+        mrr_sum = 0.0
+        top1_sum = 0.0
+        num_samples = 0
         
-        return dcg / idcg if idcg > 0 else 0.0
-    
-    # MRR (Mean Reciprocal Rank)
-    def mrr(y_true, y_pred):
-        """计算 MRR"""
-        sorted_indices = torch.argsort(y_pred, descending=True).long()
-        for rank, idx in enumerate(sorted_indices.tolist(), 1):
-            if y_true[idx].item() > 0:
-                return 1.0 / rank
-        return 0.0
-    
-    # 计算指标
-    all_ndcg_5 = []
-    all_ndcg_10 = []
-    all_mrr = []
-    all_top1_acc = []
-    
-    for i in range(batch_size):
-        y_true = labels[i]
-        y_pred = scores[i]
+        for i in numba.prange(batch_size):
+            row_scores = np.empty(num_candidates, dtype=np.float32)
+            row_labels = np.empty(num_candidates, dtype=np.float32)
+            has_pos = False
+            for j in range(num_candidates):
+                if mask[i, j]:
+                    row_scores[j] = scores[i, j]
+                    row_labels[j] = labels[i, j]
+                    if row_labels[j] > 0:
+                        has_pos = True
+                else:
+                    row_scores[j] = -np.inf
+                    row_labels[j] = 0.0
+            if not has_pos:
+                continue
+            num_samples += 1
+            
+            # DCG：按预测分数依次选出前 k10 个候选
+            picked = np.zeros(num_candidates, dtype=np.bool_)
+            dcg5 = 0.0
+            dcg10 = 0.0
+            for r in range(k10):
+                best = -1
+                for j in range(num_candidates):
+                    if not picked[j] and (best < 0 or row_scores[j] > row_scores[best]):
+                        best = j
+                picked[best] = True
+                gain = row_labels[best] / np.log2(r + 2.0)
+                dcg10 += gain
+                if r < k5:
+                    dcg5 += gain
+            
+            # IDCG：标签降序前 k10 个
+            ideal = np.sort(row_labels)[::-1]
+            idcg5 = 0.0
+            idcg10 = 0.0
+            for r in range(k10):
+                gain = ideal[r] / np.log2(r + 2.0)
+                idcg10 += gain
+                if r < k5:
+                    idcg5 += gain
+            if idcg5 > 0:
+                ndcg5_sum += dcg5 / idcg5
+            if idcg10 > 0:
+                ndcg10_sum += dcg10 / idcg10
+            
+            # MRR：>/>= 计数，同分取期望名次
+            pos_score = -np.inf
+            for j in range(num_candidates):
+                if row_labels[j] > 0 and row_scores[j] > pos_score:
+                    pos_score = row_scores[j]
+            optimistic = 0
+            pessimistic = 0
+            for j in range(num_candidates):
+                if mask[i, j]:
+                    if row_scores[j] > pos_score:
+                        optimistic += 1
+                    if row_scores[j] >= pos_score:
+                        pessimistic += 1
+            mrr_sum += 1.0 / max(0.5 * (optimistic + pessimistic) + 0.5, 1.0)
+            
+            # Top-1：预测第一的候选是否具有最大真实标签
+            top1 = 0
+            max_label = -np.inf
+            for j in range(num_candidates):
+                if row_scores[j] > row_scores[top1]:
+                    top1 = j
+                if mask[i, j] and row_labels[j] > max_label:
+                    max_label = row_labels[j]
+            if row_labels[top1] == max_label:
+                top1_sum += 1.0
         
-        # 过滤无效候选
-        if mask is None:
-            valid_mask = (y_true > 0).bool()  # 确保是布尔类型
+        return np.array([ndcg5_sum, ndcg10_sum, mrr_sum, top1_sum, float(num_samples)])
+
+
+_METRIC_NAMES = ("ndcg@5", "ndcg@10", "mrr", "top1_accuracy", "num_samples")
+
+
+def compute_ranking_metrics(
+    scores: torch.Tensor,
+    labels: torch.Tensor,
+    mask: torch.Tensor = None,
+    use_compile: bool = False,
+    reduction: str = "mean"
+) -> Dict[str, torch.Tensor]:
+    """
+    计算排序指标
+    
+    Args:
+        scores: 预测分数 [batch_size, num_candidates]
+        labels: 真实标签 [batch_size, num_candidates]
+        mask: 有效候选掩码 [batch_size, num_candidates]
+        use_compile: 是否使用 torch.compile 编译后的指标计算
+        reduction: "mean" 返回有效样本上的均值，"sum" 返回求和（便于跨 batch 累加）
+    
+    Returns:
+        指标字典（0 维张量，与 scores 在同一设备上；调用方在评估结束后再统一 .item()）
+    """
+    # 留在原设备上计算，避免每个 batch 的 .cpu() 同步；Half/BF16 转为 float32
+    scores = scores.detach().float()
+    labels = labels.detach().float()
+    
+    # 有效候选：没有掩码时沿用旧逻辑，只把正标签视为有效
+    if mask is None:
+        mask = labels > 0
+    mask = mask.detach().bool()
+    
+    k10 = min(10, scores.shape[1])
+    if numba is not None and scores.device.type == "cpu":
+        # CPU 评估：一次性转成 NumPy，交给 Numba 并行内核
+        sums = _ranking_metrics_numba(
+            scores.contiguous().numpy(), labels.contiguous().numpy(), mask.contiguous().numpy(), k10
+        )
+        metrics = dict(zip(_METRIC_NAMES, torch.from_numpy(sums)))
+    else:
+        kernel = _ranking_metrics_compiled if use_compile else _ranking_metrics_vectorized
+        metrics = kernel(scores, labels, mask, _get_discounts(k10, scores.device))
+    if reduction == "mean":
+        denom = metrics["num_samples"].clamp_min(1)
+        metrics = {name: value if name == "num_samples" else value / denom for name, value in metrics.items()}
+    return metrics
+
+
+# 检查点解析结果缓存：checkpoint_path -> 实际加载的文件（None 表示只有 LoRA 适配器）
+_CHECKPOINT_CACHE: Dict[str, Optional[Path]] = {}
+
+
+def resolve_checkpoint_file(checkpoint_path: str) -> Optional[Path]:
+    """
+    解析检查点路径，返回要加载的权重文件
+    
+    按顺序尝试：最新的 epoch_*/model.safetensors 或 model.pt、目录下最新的 .safetensors/.pt/.pth、LoRA 适配器、文件本身、
+    以及若干常见的相对位置，命中第一个即返回。结果按 checkpoint_path 缓存，
+    同一进程内重复评估（例如参数扫描）时不再重复 glob/stat。
+    
+    Returns:
+        权重文件路径；目录中只有 LoRA 适配器（由模型自动加载）时返回 None
+    
+    Raises:
+        FileNotFoundError: 找不到任何可用的检查点
+    """
+    if checkpoint_path in _CHECKPOINT_CACHE:
+        return _CHECKPOINT_CACHE[checkpoint_path]
+    
+    checkpoint_path_obj = Path(checkpoint_path)
+    checkpoint_file = None
+    
+    # 如果是目录，尝试查找所有可能的检查点文件
+    if checkpoint_path_obj.is_dir():
+        # 查找所有 epoch 目录，使用最新的 epoch
+        epoch_dirs = checkpoint_path_obj.glob("epoch_*")
+        latest_epoch_dir = max(epoch_dirs, key=lambda p: int(p.name.split("_")[1]), default=None)
+        if latest_epoch_dir is not None:
+            checkpoint_file = latest_epoch_dir / "model.safetensors"
+            if not checkpoint_file.exists():
+                checkpoint_file = latest_epoch_dir / "model.pt"
+            if not checkpoint_file.exists():
+                raise FileNotFoundError(f"在 {latest_epoch_dir} 中未找到 model.safetensors 或 model.pt")
+            print(f"找到检查点: {checkpoint_file}")
         else:
-            valid_mask = mask[i].bool() if mask[i].dtype != torch.bool else mask[i]  # 确保是布尔类型
-        
-        if valid_mask.sum() == 0:
-            continue
-        
-        # 使用布尔索引
-        y_true_valid = y_true[valid_mask]
-        y_pred_valid = y_pred[valid_mask]
-        
-        # NDCG
-        ndcg5 = ndcg_at_k(y_true_valid, y_pred_valid, k=5)
-        ndcg10 = ndcg_at_k(y_true_valid, y_pred_valid, k=10)
-        all_ndcg_5.append(ndcg5)
-        all_ndcg_10.append(ndcg10)
-        
-        # MRR
-        mrr_score = mrr(y_true_valid, y_pred_valid)
-        all_mrr.append(mrr_score)
-        
-        # Top-1 Accuracy
-        top1_idx = torch.argmax(y_pred_valid).long()
-        top1_acc = 1.0 if y_true_valid[top1_idx].item() == y_true_valid.max().item() else 0.0
-        all_top1_acc.append(top1_acc)
-    
-    return {
-        "ndcg@5": np.mean(all_ndcg_5) if all_ndcg_5 else 0.0,
-        "ndcg@10": np.mean(all_ndcg_10) if all_ndcg_10 else 0.0,
-        "mrr": np.mean(all_mrr) if all_mrr else 0.0,
-        "top1_accuracy": np.mean(all_top1_acc) if all_top1_acc else 0.0,
-        "num_samples": len(all_ndcg_5)
-    }
+            # 直接查找权重文件
+            checkpoint_files = (
+                list(checkpoint_path_obj.glob("*.safetensors"))
+                + list(checkpoint_path_obj.glob("*.pt"))
+                + list(checkpoint_path_obj.glob("*.pth"))
+            )
+            if checkpoint_files:
+                checkpoint_file = max(checkpoint_files, key=lambda p: p.stat().st_mtime)
+                print(f"加载检查点: {checkpoint_file}")
+            else:
+                # 尝试加载 adapter
+                adapter_path = checkpoint_path_obj / "adapter_model.bin"
+                if not adapter_path.exists():
+                    raise FileNotFoundError(f"在 {checkpoint_path} 中未找到模型文件。请检查路径是否正确。")
+                print(f"加载 LoRA 适配器: {adapter_path}")
+                # LoRA 适配器会自动加载
+    elif checkpoint_path_obj.is_file():
+        # 直接是文件
+        checkpoint_file = checkpoint_path_obj
+        print(f"加载检查点: {checkpoint_file}")
+    else:
+        # 尝试查找可能的路径，命中第一个即停止
+        # 每个位置先找 model.safetensors 再找 model.pt
+        candidate_dirs = (
+            checkpoint_path_obj,  # 检查点目录本身
+            checkpoint_path_obj.parent / "checkpoints" / checkpoint_path_obj.name,  # outputs/xxx/checkpoints/best/
+            checkpoint_path_obj.parent.parent / "checkpoints" / checkpoint_path_obj.name,  # 更深一层
+        )
+        possible_paths = (
+            directory / name for directory in candidate_dirs for name in ("model.safetensors", "model.pt")
+        )
+        checkpoint_file = next((path for path in possible_paths if path.is_file()), None)
+        if checkpoint_file is None:
+            # 列出可能的路径帮助用户
+            print(f"\n❌ 错误: 检查点路径不存在: {checkpoint_path}")
+            print("\n请尝试以下路径之一:")
+            print(f"  1. outputs/resilience_llm/checkpoints/epoch_3/model.safetensors（或 model.pt）")
+            print(f"  2. outputs/mixed_model/checkpoints/epoch_3/model.safetensors（或 model.pt）")
+            print(f"  3. 或指定具体的检查点文件路径")
+            raise FileNotFoundError(f"检查点路径不存在: {checkpoint_path}")
+        print(f"找到检查点: {checkpoint_file}")
+    
+    _CHECKPOINT_CACHE[checkpoint_path] = checkpoint_file
+    return checkpoint_file
+
+
+def load_checkpoint_weights(model: torch.nn.Module, checkpoint_file: Path) -> None:
+    """
+    把检查点权重加载到模型中
+    
+    .pt/.pth 使用 mmap + weights_only 加载、.safetensors 按 mmap 读取：张量按需读取并直接拷贝进
+    模型已有的参数，不再先把整个 state dict 反序列化到内存/显存里，峰值内存约减半。
+    """
+    model.load_state_dict(load_checkpoint_state(checkpoint_file), strict=False)
+
+
+def tokenized_cache_path(eval_data_path: str, tokenizer_name: str, max_length: int) -> Path:
+    """
+    评估集分词缓存文件路径
+    
+    以 (数据文件绝对路径、大小、修改时间、分词器、max_length) 的哈希为键，
+    数据文件或分词配置变化时自动换用新的缓存文件。
+    """
+    data_path = Path(eval_data_path).resolve()
+    stat = data_path.stat()
+    key = f"{data_path}|{stat.st_size}|{stat.st_mtime_ns}|{tokenizer_name}|{max_length}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return data_path.parent / ".tokenized_cache" / f"{data_path.stem}.{digest}.pt"
+
+
+def forward_scores(
+    model: torch.nn.Module,
+    input_ids: torch.Tensor,
+    attention_mask: torch.Tensor,
+    candidate_indices: torch.Tensor,
+    use_bf16: bool,
+    micro_batch_size: int
+) -> Tuple[Optional[torch.Tensor], int]:
+    """
+    按 micro_batch_size 分块做前向，显存不足时把块大小减半后重试整个 batch
+    
+    Returns:
+        (scores, micro_batch_size)：scores 为 [batch_size, num_candidates]（模型未返回分数时为 None），
+        micro_batch_size 为实际可用的块大小，供后续 batch 直接沿用
+    """
+    while True:
+        try:
+            chunks = []
+            for start in range(0, input_ids.shape[0], micro_batch_size):
+                end = start + micro_batch_size
+                # 推理没有训练时的数值稳定性压力：CUDA 上用 BF16 autocast，权重仍为 FP32
+                with torch.autocast(device_type='cuda' if use_bf16 else 'cpu', dtype=torch.bfloat16, enabled=use_bf16):
+                    outputs = model(
+                        input_ids=input_ids[start:end],
+                        attention_mask=attention_mask[start:end],
+                        candidate_indices=candidate_indices[start:end],
+                        return_scores=True
+                    )
+                if outputs.get("scores") is None:
+                    return None, micro_batch_size
+                chunks.append(outputs["scores"])
+            scores = chunks[0] if len(chunks) == 1 else torch.cat(chunks, dim=0)
+            return scores, micro_batch_size
+        except torch.cuda.OutOfMemoryError:
+            if micro_batch_size == 1:
+                raise
+            chunks = outputs = None
+            torch.cuda.empty_cache()
+            micro_batch_size = max(1, micro_batch_size // 2)
+            print(f"\n⚠️ 显存不足，评估块大小减半为 {micro_batch_size}")
 
 
 def evaluate_model(
     checkpoint_path: str,
     eval_data_path: str,
     config_path: str = "configs/default.yaml",
-    device: str = "cuda"
+    device: str = "cuda",
+    compile_metrics: bool = False,
+    cache_tokenized: bool = False,
+    eval_batch_size: Optional[int] = None
 ):
     """
     评估模型
@@ -153,6 +447,9 @@ def evaluate_model(
         eval_data_path: 评估数据路径
         config_path: 配置文件路径
         device: 设备
+        compile_metrics: 是否用 torch.compile 编译排序指标计算
+        cache_tokenized: 是否把评估集分词结果缓存到磁盘（重复评估时跳过分词）
+        eval_batch_size: 评估批大小（None 时取配置 training.eval_batch_size，再退回训练批大小的 4 倍）
     """
     print("=" * 60)
     print("模型评估")
@@ -178,176 +475,108 @@ def evaluate_model(
     model.initialize(device=device)
     
     # 加载检查点
-    checkpoint_path_obj = Path(checkpoint_path)
-    
-    # 尝试多种路径格式
-    possible_paths = [
-        checkpoint_path_obj,  # 直接路径
-        checkpoint_path_obj / "model.pt",  # 检查点目录下的 model.pt
-        checkpoint_path_obj.parent / "checkpoints" / checkpoint_path_obj.name / "model.pt",  # outputs/xxx/checkpoints/best/model.pt
-        checkpoint_path_obj.parent.parent / "checkpoints" / checkpoint_path_obj.name / "model.pt",  # 更深一层
-    ]
-    
-    # 如果是目录，尝试查找所有可能的检查点文件
-    if checkpoint_path_obj.is_dir():
-        # 查找所有 epoch 目录
-        epoch_dirs = sorted(checkpoint_path_obj.glob("epoch_*"), key=lambda p: int(p.name.split("_")[1]) if p.name.startswith("epoch_") else 0, reverse=True)
-        if epoch_dirs:
-            # 使用最新的 epoch
-            latest_epoch_dir = epoch_dirs[0]
-            checkpoint_file = latest_epoch_dir / "model.pt"
-            if checkpoint_file.exists():
-                print(f"找到检查点: {checkpoint_file}")
-                checkpoint = torch.load(checkpoint_file, map_location=device)
-                if 'model_state_dict' in checkpoint:
-                    model.load_state_dict(checkpoint['model_state_dict'], strict=False)
-                else:
-                    model.load_state_dict(checkpoint, strict=False)
-            else:
-                raise FileNotFoundError(f"在 {latest_epoch_dir} 中未找到 model.pt")
-        else:
-            # 直接查找 .pt 文件
-            checkpoint_files = list(checkpoint_path_obj.glob("*.pt")) + list(checkpoint_path_obj.glob("*.pth"))
-            if checkpoint_files:
-                checkpoint_file = max(checkpoint_files, key=lambda p: p.stat().st_mtime)
-                print(f"加载检查点: {checkpoint_file}")
-                checkpoint = torch.load(checkpoint_file, map_location=device)
-                if 'model_state_dict' in checkpoint:
-                    model.load_state_dict(checkpoint['model_state_dict'], strict=False)
-                else:
-                    model.load_state_dict(checkpoint, strict=False)
-            else:
-                # 尝试加载 adapter
-                adapter_path = checkpoint_path_obj / "adapter_model.bin"
-                if adapter_path.exists():
-                    print(f"加载 LoRA 适配器: {adapter_path}")
-                    # LoRA 适配器会自动加载
-                else:
-                    raise FileNotFoundError(f"在 {checkpoint_path} 中未找到模型文件。请检查路径是否正确。")
-    elif checkpoint_path_obj.is_file():
-        # 直接是文件
-        print(f"加载检查点: {checkpoint_path_obj}")
-        checkpoint = torch.load(checkpoint_path_obj, map_location=device)
-        if 'model_state_dict' in checkpoint:
-            model.load_state_dict(checkpoint['model_state_dict'], strict=False)
-        else:
-            model.load_state_dict(checkpoint, strict=False)
-    else:
-        # 尝试查找可能的路径
-        found = False
-        for path in possible_paths:
-            if path.exists() and path.is_file():
-                print(f"找到检查点: {path}")
-                checkpoint = torch.load(path, map_location=device)
-                if 'model_state_dict' in checkpoint:
-                    model.load_state_dict(checkpoint['model_state_dict'], strict=False)
-                else:
-                    model.load_state_dict(checkpoint, strict=False)
-                found = True
-                break
-        
-        if not found:
-            # 列出可能的路径帮助用户
-            print(f"\n❌ 错误: 检查点路径不存在: {checkpoint_path}")
-            print("\n请尝试以下路径之一:")
-            print(f"  1. outputs/resilience_llm/checkpoints/epoch_3/model.pt")
-            print(f"  2. outputs/mixed_model/checkpoints/epoch_3/model.pt")
-            print(f"  3. 或指定具体的检查点文件路径")
-            raise FileNotFoundError(f"检查点路径不存在: {checkpoint_path}")
+    checkpoint_file = resolve_checkpoint_file(checkpoint_path)
+    if checkpoint_file is not None:
+        load_checkpoint_weights(model, checkpoint_file)
     
     model.eval()
     print("模型加载完成")
     
     # 加载评估数据
     print(f"\n正在加载评估数据: {eval_data_path}")
+    max_length = config['data']['loading']['max_length']
+    cache_path = None
+    if cache_tokenized:
+        cache_path = tokenized_cache_path(eval_data_path, getattr(model.tokenizer, "name_or_path", ""), max_length)
+    # 评估不保存反向传播所需的激活，可用比训练更大的批；显存不足时 forward_scores 会自动减半
+    if eval_batch_size is None:
+        eval_batch_size = config['training'].get('eval_batch_size') or config['training']['batch_size'] * 4
     eval_loader = create_dataloader(
         data_path=eval_data_path,
         tokenizer=model.tokenizer,
-        batch_size=config['training']['batch_size'],
+        batch_size=eval_batch_size,
         shuffle=False,
-        max_length=config['data']['loading']['max_length']
+        pin_memory=str(device).startswith("cuda"),
+        max_length=max_length,
+        tokenization_cache_path=cache_path
     )
-    print(f"评估样本数: {len(eval_loader.dataset)}")
+    if cache_path is not None and not cache_path.exists():
+        # 首次运行：在主进程里一次性分词（DataLoader worker fork 后共享），并写盘
+        eval_loader.dataset.pretokenize()
+        eval_loader.dataset.save_tokenization_cache()
+        print(f"分词缓存已保存: {cache_path}")
+    print(f"评估样本数: {len(eval_loader.dataset)}, 评估批大小: {eval_batch_size}")
     
     # 评估
     print("\n开始评估...")
-    all_metrics = []
-    total_loss = 0.0
+    # 各指标的求和与有效样本数作为设备上的 0 维张量累加，评估结束后统一 .item()
+    metric_sums = {
+        name: torch.zeros((), device=device)
+        for name in _METRIC_NAMES
+    }
+    total_loss = torch.zeros((), device=device)  # 在设备上累加，避免每个 batch 的 loss.item() 同步
     num_batches = 0
     
     loss_fn = ListMLELoss()
+    use_bf16 = str(device).startswith("cuda") and torch.cuda.is_bf16_supported()
+    micro_batch_size = eval_batch_size
     
-    with torch.no_grad():
+    # inference_mode 比 no_grad 更省：不维护版本计数和视图追踪（循环内的张量不会再进入 autograd）
+    with torch.inference_mode():
         for batch in tqdm(eval_loader, desc="评估中"):
             input_ids = batch.get("input_ids")
             if input_ids is None:
                 continue
             
-            input_ids = input_ids.to(device)
-            attention_mask = batch["attention_mask"].to(device)
-            auxiliary_labels = batch["auxiliary_labels"].to(device)
+            # 指标内核逐样本跳过没有带正标签的有效候选的样本；这里在 CPU 副本上提前判断，
+            # 整个 batch 都没有这类样本时直接省掉指标计算（不涉及设备同步）
+            cpu_labels = batch["auxiliary_labels"]
+            cpu_valid = cpu_labels > 0
+            if batch.get("candidate_mask") is not None:
+                cpu_valid &= batch["candidate_mask"].bool()
+            has_metric_rows = bool(cpu_valid.any())
+            
+            # 锁页内存 + non_blocking：H2D 拷贝异步进行，可与上一个 batch 的计算重叠
+            input_ids = input_ids.to(device, non_blocking=True)
+            attention_mask = batch["attention_mask"].to(device, non_blocking=True)
+            auxiliary_labels = batch["auxiliary_labels"].to(device, non_blocking=True)
             candidate_mask = batch.get("candidate_mask")
             if candidate_mask is not None:
-                candidate_mask = candidate_mask.to(device)
+                candidate_mask = candidate_mask.to(device, non_blocking=True)
             
             # 获取候选操作位置索引（直接实现，不依赖训练器）
-            batch_size, seq_len = input_ids.shape
-            
-            # 从 batch 中获取候选数量
-            auxiliary_labels_tensor = batch.get("auxiliary_labels")
-            if auxiliary_labels_tensor is None:
-                continue
-            
-            num_candidates = auxiliary_labels_tensor.shape[1] if isinstance(auxiliary_labels_tensor, torch.Tensor) else 0
+            # 候选数量直接取自已搬到设备上的标签张量的形状（读取 shape 不会触发同步）
+            num_candidates = auxiliary_labels.shape[1]
             
             if num_candidates == 0:
                 continue
             
-            # 简化方法：使用序列末尾的 token 位置
-            candidate_indices = []
-            attention_mask_batch = batch.get("attention_mask", None)
+            # 简化方法：使用序列末尾的 token 位置（最后 num_candidates 个有效位置），直接在设备上计算
+            valid_lengths = attention_mask.sum(dim=1, dtype=torch.long)
+            offsets = torch.arange(num_candidates, device=input_ids.device)
+            candidate_indices = (valid_lengths.unsqueeze(1) - num_candidates + offsets.unsqueeze(0)).clamp_min_(0)
             
-            for i in range(batch_size):
-                if attention_mask_batch is not None:
-                    # 使用 attention_mask 找到最后一个有效位置
-                    valid_length = attention_mask_batch[i].sum().item()
-                    # 使用最后几个位置作为候选操作的表示
-                    positions = []
-                    for j in range(num_candidates):
-                        # 从末尾往前取位置
-                        pos = max(0, valid_length - num_candidates + j)
-                        positions.append(pos)
-                    candidate_indices.append(positions)
-                else:
-                    # 如果没有 attention_mask，使用序列末尾
-                    positions = [max(0, seq_len - num_candidates + j) for j in range(num_candidates)]
-                    candidate_indices.append(positions)
-            
-            candidate_indices = torch.tensor(candidate_indices, device=input_ids.device, dtype=torch.long)
-            
-            # 模型前向传播（使用 no_grad 确保在评估模式下）
-            with torch.amp.autocast(device_type='cuda' if device == 'cuda' else 'cpu', enabled=False):
-                outputs = model(
-                    input_ids=input_ids,
-                    attention_mask=attention_mask,
-                    candidate_indices=candidate_indices,
-                    return_scores=True
-                )
+            # 模型前向传播（inference_mode 下，确保在评估模式下）
+            raw_scores, micro_batch_size = forward_scores(
+                model, input_ids, attention_mask, candidate_indices, use_bf16, micro_batch_size
+            )
             
             # 计算损失
-            if "scores" in outputs and outputs["scores"] is not None:
-                scores = outputs["scores"]
-                # 确保 auxiliary_labels 与 scores 在同一设备上
-                auxiliary_labels_batch = auxiliary_labels.to(scores.device)
-                candidate_mask_batch = candidate_mask.to(scores.device) if candidate_mask is not None else None
-                
-                loss = loss_fn(scores, auxiliary_labels_batch, mask=candidate_mask_batch)
-                total_loss += loss.item()
+            if raw_scores is not None:
+                # 损失和指标在 float32 下计算（排序指标对 BF16 分数噪声不敏感）
+                scores = raw_scores.float()
+                # auxiliary_labels / candidate_mask 在循环开头已经搬到 device 上
+                loss = loss_fn(scores, auxiliary_labels, mask=candidate_mask)
+                total_loss += loss.detach()
                 num_batches += 1
                 
                 # 计算排序指标
-                metrics = compute_ranking_metrics(scores, auxiliary_labels_batch, candidate_mask_batch)
-                all_metrics.append(metrics)
+                if has_metric_rows:
+                    batch_sums = compute_ranking_metrics(
+                        scores, auxiliary_labels, candidate_mask, use_compile=compile_metrics, reduction="sum"
+                    )
+                    for name, value in batch_sums.items():
+                        metric_sums[name] += value
     
     # 汇总结果
     print("\n" + "=" * 60)
@@ -355,15 +584,16 @@ def evaluate_model(
     print("=" * 60)
     
     if num_batches > 0:
-        avg_loss = total_loss / num_batches
+        avg_loss = (total_loss / num_batches).item()
         print(f"平均损失: {avg_loss:.4f}")
     
-    if all_metrics:
-        avg_ndcg5 = np.mean([m["ndcg@5"] for m in all_metrics])
-        avg_ndcg10 = np.mean([m["ndcg@10"] for m in all_metrics])
-        avg_mrr = np.mean([m["mrr"] for m in all_metrics])
-        avg_top1 = np.mean([m["top1_accuracy"] for m in all_metrics])
-        total_samples = sum([m["num_samples"] for m in all_metrics])
+    total_samples = int(metric_sums["num_samples"].item())
+    if total_samples > 0:
+        # 按样本平均（而不是对各 batch 的均值再求平均）
+        avg_ndcg5 = metric_sums["ndcg@5"].item() / total_samples
+        avg_ndcg10 = metric_sums["ndcg@10"].item() / total_samples
+        avg_mrr = metric_sums["mrr"].item() / total_samples
+        avg_top1 = metric_sums["top1_accuracy"].item() / total_samples
         
         print(f"\n排序指标:")
         print(f"  NDCG@5:  {avg_ndcg5:.4f}")
@@ -384,6 +614,9 @@ def main():
     parser.add_argument("--eval_data", type=str, default=None, help="评估数据路径")
     parser.add_argument("--config", type=str, default="configs/default.yaml", help="配置文件路径")
     parser.add_argument("--device", type=str, default="cuda", help="设备 (cuda/cpu)")
+    parser.add_argument("--compile_metrics", action="store_true", help="用 torch.compile 编译排序指标计算（需要可用的编译工具链）")
+    parser.add_argument("--cache_tokenized", action="store_true", help="缓存评估集分词结果到磁盘，重复评估时直接加载")
+    parser.add_argument("--eval_batch_size", type=int, default=None, help="评估批大小（默认取配置 training.eval_batch_size）")
     
     args = parser.parse_args()
     
@@ -406,7 +639,10 @@ def main():
         checkpoint_path=args.checkpoint,
         eval_data_path=str(eval_data_path),
         config_path=args.config,
-        device=args.device
+        device=args.device,
+        compile_metrics=args.compile_metrics,
+        cache_tokenized=args.cache_tokenized,
+        eval_batch_size=args.eval_batch_size
     )
 
 
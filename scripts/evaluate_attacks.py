@@ -37,18 +37,36 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 import os
+import csv
 import json
 import numpy as np
 import networkx as nx
-import matplotlib.pyplot as plt
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.font_manager import FontProperties
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
-# 设置中文字体
-plt.rcParams['font.sans-serif'] = ['SimHei', 'DejaVu Sans', 'Arial Unicode MS']
-plt.rcParams['axes.unicode_minus'] = False
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import numba
+except ImportError:  # 未安装 numba 时 find_collapse_intersection 走 NumPy 向量化实现
+    numba = None
+
+# 中文字体：显式 FontProperties 传给各文本元素，不改全局 rcParams 的字体族
+_FONT_FAMILY = ['SimHei', 'DejaVu Sans', 'Arial Unicode MS']
+_LABEL_FONT = FontProperties(family=_FONT_FAMILY, size=12)
+_TITLE_FONT = FontProperties(family=_FONT_FAMILY, size=14, weight='bold')
+_LEGEND_FONT = FontProperties(family=_FONT_FAMILY, size=10)
+_ANNOTATION_FONT = FontProperties(family=_FONT_FAMILY, size=9)
+matplotlib.rcParams['axes.unicode_minus'] = False
 
 from src.attack import HighestDegreeAttack, RandomAttack, LLMAttack, AttackResult
+from src.env.gml import load_gml_robust
 
 
 def load_graph(graph_path: str) -> nx.Graph:
@@ -67,7 +85,7 @@ def load_graph(graph_path: str) -> nx.Graph:
             G = nx.read_gml(path, label='id')
         except Exception:
             # 如果失败，使用自定义解析器（处理重复 None 标签的情况）
-            G = _load_gml_robust(path)
+            G = load_gml_robust(path)
     elif path.suffix == '.graphml':
         G = nx.read_graphml(path)
     elif path.suffix == '.edgelist':
@@ -86,74 +104,6 @@ def load_graph(graph_path: str) -> nx.Graph:
     return G
 
 
-def _load_gml_robust(filepath: Path) -> nx.Graph:
-    """
-    稳健地加载 GML 文件，处理重复标签问题
-    
-    使用 id 作为节点标识符，而不是 label
-    """
-    g = nx.Graph()
-    with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-        lines = f.readlines()
-
-    in_node = False
-    in_edge = False
-    node_id = None
-    node_label = None
-    edge_u = None
-    edge_v = None
-
-    for raw in lines:
-        line = raw.strip()
-        if not line:
-            continue
-
-        if line.startswith("node"):
-            in_node = True
-            node_id = None
-            node_label = None
-            continue
-        if line.startswith("edge"):
-            in_edge = True
-            edge_u = None
-            edge_v = None
-            continue
-
-        if line == "]":
-            if in_node and node_id is not None:
-                # 使用 id 作为节点标识符，label 作为属性
-                g.add_node(node_id, label=node_label)
-            if in_edge and edge_u is not None and edge_v is not None:
-                g.add_edge(edge_u, edge_v)
-            in_node = False
-            in_edge = False
-            continue
-
-        if in_node:
-            if line.startswith("id "):
-                try:
-                    node_id = int(line.split()[1])
-                except Exception:
-                    pass
-            elif line.startswith('label "'):
-                # label "xxx"
-                if line.endswith('"') and len(line) >= 8:
-                    node_label = line[len('label "'): -1]
-        elif in_edge:
-            if line.startswith("source "):
-                try:
-                    edge_u = int(line.split()[1])
-                except Exception:
-                    pass
-            elif line.startswith("target "):
-                try:
-                    edge_v = int(line.split()[1])
-                except Exception:
-                    pass
-
-    return g
-
-
 def run_attack_algorithm(
     algorithm_name: str,
     graph: nx.Graph,
@@ -163,9 +113,13 @@ def run_attack_algorithm(
     collapse_threshold: float = 0.2,
     random_runs: int = 10,
     random_seed: int = 42,
+    random_workers: int = None,
     checkpoint_path: str = None,
     config_path: str = "configs/default.yaml",
     device: str = "cuda",
+    use_cuda_graph: bool = False,
+    adj_csr=None,
+    use_reverse_unionfind: bool = True,
 ) -> AttackResult:
     """
     运行指定的攻击算法
@@ -179,34 +133,43 @@ def run_attack_algorithm(
         collapse_threshold: 崩溃阈值
         random_runs: 随机攻击运行次数
         random_seed: 随机种子
+        random_workers: 随机攻击并行进程数（None 表示 min(random_runs, CPU 核数)）
         checkpoint_path: LLM 模型检查点路径（仅用于 llm 算法）
         config_path: 配置文件路径（仅用于 llm 算法）
         device: 设备 (cuda/cpu)（仅用于 llm 算法）
+        use_cuda_graph: 是否用 CUDA Graph 捕获每步打分前向（仅用于 llm 算法）
+        adj_csr: 预先构建的 CSR 邻接矩阵，多个算法共用（仅用于 hda/random 算法）
+        use_reverse_unionfind: 有 adj_csr 时，HDA 的 LCC 曲线是否倒序用并查集一次算出（仅用于 hda 算法）
     
     Returns:
         AttackResult: 攻击结果
     """
     if algorithm_name.lower() == 'hda':
-        attacker = HighestDegreeAttack(recalculate=True)
+        attacker = HighestDegreeAttack(recalculate=True, use_reverse_unionfind=use_reverse_unionfind)
         result = attacker.attack(
             graph=graph,
             budget=budget,
             dataset_name=dataset_name,
             graph_name=graph_name,
             collapse_threshold=collapse_threshold,
+            adj_csr=adj_csr,
         )
         return result
     
     elif algorithm_name.lower() == 'random':
         attacker = RandomAttack(seed=random_seed)
-        # 多次运行取平均
+        if random_workers is None:
+            random_workers = min(random_runs, os.cpu_count() or 1)
+        # 多次运行取平均（各次运行相互独立，进程池并行）
         multi_result = attacker.attack_multiple_runs(
+            max_workers=random_workers,
             graph=graph,
             budget=budget,
             num_runs=random_runs,
             dataset_name=dataset_name,
             graph_name=graph_name,
             collapse_threshold=collapse_threshold,
+            adj_csr=adj_csr,
         )
         return multi_result["average_result"]
     
@@ -216,7 +179,8 @@ def run_attack_algorithm(
         attacker = LLMAttack(
             checkpoint_path=checkpoint_path,
             config_path=config_path,
-            device=device
+            device=device,
+            use_cuda_graph=use_cuda_graph
         )
         result = attacker.attack(
             graph=graph,
@@ -231,25 +195,71 @@ def run_attack_algorithm(
         raise ValueError(f"未知的算法: {algorithm_name}")
 
 
-def compute_r_res_correct(removal_fractions: List[float], lcc_values: List[float]) -> float:
+def _finalize(results: List[AttackResult], collapse_threshold: float = 0.2) -> None:
     """
-    正确计算 R_res (LCC 曲线下面积)
+    一次算出所有结果的 R_res 与崩溃点，写回 result.r_res / result.collapse_fraction
     
     R_res = ∫₀^(q_max) LCC(q) dq
     
-    使用梯形积分法计算
+    各曲线截断到 removal_fractions 与 lcc_values 的公共长度后，用最后一个点填充到同一长度
+    （填充段宽度为 0，不影响面积，也不改变首次低于阈值的位置），堆成二维数组后：
+    - 一次梯形积分得到全部 R_res；
+    - 每行首个 LCC < threshold 的位置与前一点线性插值得到崩溃点（与 find_collapse_point 一致）。
+    后续的保存、绘图与汇总直接读取这两个属性，不再重复计算。
     """
-    if len(removal_fractions) < 2 or len(lcc_values) < 2:
-        return 0.0
+    if not results:
+        return
     
-    # 确保长度一致
-    n = min(len(removal_fractions), len(lcc_values))
-    x = np.array(removal_fractions[:n])
-    y = np.array(lcc_values[:n])
+    lengths = [min(len(r.removal_fractions), len(r.lcc_values)) for r in results]
+    max_len = max(max(lengths), 2)
+    X = np.zeros((len(results), max_len), dtype=np.float64)
+    Y = np.zeros((len(results), max_len), dtype=np.float64)
+    for i, (result, n) in enumerate(zip(results, lengths)):
+        if n == 0:
+            continue
+        X[i, :n] = result.removal_fractions[:n]
+        Y[i, :n] = result.lcc_values[:n]
+        X[i, n:] = X[i, n - 1]
+        Y[i, n:] = Y[i, n - 1]
     
     # 梯形积分
-    r_res = np.trapezoid(y, x)
-    return float(r_res)
+    areas = np.trapezoid(Y, X, axis=1)
+    
+    # 崩溃点：首次低于阈值处与前一点插值；第一个点就低于阈值时取该点
+    below = Y < collapse_threshold
+    crossed = below.any(axis=1)
+    first = np.argmax(below, axis=1)
+    rows = np.arange(len(results))
+    prev = np.maximum(first - 1, 0)
+    y_prev, y_curr = Y[rows, prev], Y[rows, first]
+    x_prev, x_curr = X[rows, prev], X[rows, first]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (y_prev - collapse_threshold) / (y_prev - y_curr)
+        collapse = np.where(first > 0, x_prev + t * (x_curr - x_prev), x_curr)
+    
+    for result, n, area, has_collapse, fraction in zip(results, lengths, areas, crossed, collapse):
+        result.r_res = float(area)
+        result.collapse_fraction = float(fraction) if n > 0 and has_collapse else None
+
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _find_collapse_intersection_nb(x, y, threshold):
+        """
+        find_collapse_intersection 的 Numba 版本：线性扫描首个穿越点并插值
+
+        没有交点时返回 (nan, nan)。不开 fastmath，保证与 NumPy 路径逐位一致。
+        """
+        n = min(x.shape[0], y.shape[0])
+        for i in range(1, n):
+            if y[i] < threshold and y[i - 1] >= threshold:
+                x1, y1 = x[i - 1], y[i - 1]
+                x2, y2 = x[i], y[i]
+                if y1 != y2:
+                    t = (y1 - threshold) / (y1 - y2)
+                    return x1 + t * (x2 - x1), threshold
+                return x1, threshold
+        return np.nan, np.nan
 
 
 def find_collapse_intersection(
@@ -263,20 +273,56 @@ def find_collapse_intersection(
     Returns:
         (x, y) 交点坐标，或 None
     """
-    for i in range(1, len(lcc_values)):
-        if lcc_values[i] < threshold and lcc_values[i-1] >= threshold:
-            # 线性插值找精确交点
-            x1, y1 = removal_fractions[i-1], lcc_values[i-1]
-            x2, y2 = removal_fractions[i], lcc_values[i]
-            
-            if y1 != y2:
-                t = (y1 - threshold) / (y1 - y2)
-                x_intersect = x1 + t * (x2 - x1)
-                return (x_intersect, threshold)
-            else:
-                return (x1, threshold)
-    
-    return None
+    if numba is not None:
+        x_intersect, _ = _find_collapse_intersection_nb(
+            np.ascontiguousarray(removal_fractions, dtype=np.float64),
+            np.ascontiguousarray(lcc_values, dtype=np.float64),
+            float(threshold),
+        )
+        if np.isnan(x_intersect):
+            return None
+        return (float(x_intersect), threshold)
+    
+    y = np.asarray(lcc_values, dtype=np.float64)
+    if len(y) < 2:
+        return None
+    
+    # 一次向量化比较找到第一个从 >= threshold 跌到 < threshold 的位置
+    mask = (y[1:] < threshold) & (y[:-1] >= threshold)
+    i = int(np.argmax(mask))
+    if not mask[i]:
+        return None
+    
+    # 线性插值找精确交点
+    x1, y1 = removal_fractions[i], y[i]
+    x2, y2 = removal_fractions[i + 1], y[i + 1]
+    
+    if y1 != y2:
+        t = (y1 - threshold) / (y1 - y2)
+        x_intersect = x1 + t * (x2 - x1)
+        return (float(x_intersect), threshold)
+    else:
+        return (x1, threshold)
+
+
+_FIG: Optional[Figure] = None
+_AX = None
+
+
+def _get_axes():
+    """
+    返回复用的 (Figure, Axes)，首次调用时创建
+
+    多个图依次评估时不再为每张图重建 Figure；直接使用 Figure 而不经过 pyplot，
+    不会注册到 pyplot 的图形管理器，也就无需 close。
+    """
+    global _FIG, _AX
+    if _FIG is None:
+        _FIG = Figure(figsize=(12, 8))
+        # constrained 布局在绘制时一并排版，保存时不必再为 bbox_inches='tight' 额外渲染一遍
+        _FIG.set_layout_engine('constrained')
+        _AX = _FIG.add_subplot()
+    return _FIG, _AX
 
 
 def plot_attack_comparison(
@@ -294,8 +340,8 @@ def plot_attack_comparison(
         collapse_threshold: 崩溃阈值
         title: 图表标题
     """
-    # 创建图形
-    fig, ax = plt.subplots(figsize=(12, 8))
+    fig, ax = _get_axes()
+    ax.clear()
     
     # 颜色映射
     colors = ['#e74c3c', '#3498db', '#2ecc71', '#9b59b6', '#f39c12', '#1abc9c']
@@ -308,22 +354,26 @@ def plot_attack_comparison(
         color = colors[idx % len(colors)]
         marker = markers[idx % len(markers)]
         
-        # 重新计算正确的 R_res
-        r_res = compute_r_res_correct(result.removal_fractions, result.lcc_values)
-        
-        # 绘制 LCC 曲线
-        label = f"{result.algorithm_name} (R_res={r_res:.4f})"
+        # 绘制 LCC 曲线（R_res 已由 _finalize 写入）
+        label = f"{result.algorithm_name} (R_res={result.r_res:.4f})"
         ax.plot(
             result.removal_fractions,
             result.lcc_values,
             color=color,
-            marker=marker,
-            markersize=4,
-            markevery=max(1, len(result.removal_fractions) // 20),
             linewidth=2,
             label=label,
             alpha=0.8,
         )
+        # 标记点按步长抽样后一次 scatter 绘制
+        stride = max(1, len(result.removal_fractions) // 20)
+        ax.scatter(
+            result.removal_fractions[::stride],
+            result.lcc_values[::stride],
+            color=color,
+            marker=marker,
+            s=16,
+            alpha=0.8,
+        )
         
         # 找到与崩溃线的交点
         intersection = find_collapse_intersection(
@@ -357,15 +407,15 @@ def plot_attack_comparison(
             f"{inter['name']}\n({x:.2%})",
             xy=(x, y),
             xytext=(x + 0.03, y + 0.05),
-            fontsize=9,
+            fontproperties=_ANNOTATION_FONT,
             ha='left',
             arrowprops=dict(arrowstyle='->', color='gray', alpha=0.7),
         )
     
     # 设置坐标轴
-    ax.set_xlabel('Fraction of Removed Nodes (q)', fontsize=12)
-    ax.set_ylabel('Largest Connected Component Ratio (LCC)', fontsize=12)
-    ax.set_title(title, fontsize=14, fontweight='bold')
+    ax.set_xlabel('Fraction of Removed Nodes (q)', fontproperties=_LABEL_FONT)
+    ax.set_ylabel('Largest Connected Component Ratio (LCC)', fontproperties=_LABEL_FONT)
+    ax.set_title(title, fontproperties=_TITLE_FONT)
     
     # 设置范围
     ax.set_xlim(-0.02, max(r.removal_fractions[-1] for r in results) + 0.05)
@@ -375,12 +425,10 @@ def plot_attack_comparison(
     ax.grid(True, linestyle=':', alpha=0.6)
     
     # 图例
-    ax.legend(loc='upper right', fontsize=10, framealpha=0.9)
+    ax.legend(loc='upper right', prop=_LEGEND_FONT, framealpha=0.9)
     
-    # 保存图像
-    plt.tight_layout()
-    plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    plt.close()
+    # 保存图像（.pdf/.svg 输出为矢量，dpi 只影响 PNG 等位图）
+    fig.savefig(output_path, dpi=150)
     
     print(f"✅ 图像已保存: {output_path}")
     
@@ -402,12 +450,8 @@ def save_experiment_data(
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
     
-    # 保存每个算法的详细结果
+    # 保存每个算法的详细结果（R_res 与崩溃点已由 _finalize 写入）
     for result in results:
-        # 重新计算正确的 R_res
-        result.r_res = compute_r_res_correct(result.removal_fractions, result.lcc_values)
-        result.collapse_fraction = result.find_collapse_point(collapse_threshold)
-        
         result_file = output_path / f"{result.algorithm_name}_result.json"
         result.save(result_file)
         print(f"✅ 结果已保存: {result_file}")
@@ -432,17 +476,30 @@ def save_experiment_data(
         summary["algorithms"].append(algo_summary)
     
     summary_file = output_path / "summary.json"
-    with open(summary_file, 'w', encoding='utf-8') as f:
-        json.dump(summary, f, indent=2, ensure_ascii=False)
+    if orjson is not None:
+        summary_file.write_bytes(orjson.dumps(summary, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
     print(f"✅ 汇总已保存: {summary_file}")
     
     # 保存为 CSV 格式（便于分析）
     csv_file = output_path / "comparison.csv"
-    with open(csv_file, 'w', encoding='utf-8') as f:
-        f.write("Algorithm,R_res,Collapse_Fraction,Initial_Nodes,Initial_Edges,Budget\n")
-        for result in results:
-            collapse = result.collapse_fraction if result.collapse_fraction else "N/A"
-            f.write(f"{result.algorithm_name},{result.r_res:.6f},{collapse},{result.initial_nodes},{result.initial_edges},{result.budget}\n")
+    rows = [
+        (
+            result.algorithm_name,
+            f"{result.r_res:.6f}",
+            result.collapse_fraction if result.collapse_fraction else "N/A",
+            result.initial_nodes,
+            result.initial_edges,
+            result.budget,
+        )
+        for result in results
+    ]
+    with open(csv_file, 'w', encoding='utf-8', newline='', buffering=1 << 20) as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(("Algorithm", "R_res", "Collapse_Fraction", "Initial_Nodes", "Initial_Edges", "Budget"))
+        writer.writerows(rows)
     print(f"✅ CSV 已保存: {csv_file}")
 
 
@@ -459,9 +516,12 @@ def main():
     parser.add_argument("--collapse_threshold", type=float, default=0.2, help="崩溃阈值 (默认 0.2)")
     parser.add_argument("--random_runs", type=int, default=10, help="随机攻击运行次数")
     parser.add_argument("--random_seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--random_workers", type=int, default=None, help="随机攻击并行进程数 (默认: min(运行次数, CPU 核数))")
     parser.add_argument("--checkpoint", type=str, default=None, help="LLM 模型检查点路径（用于 llm 算法）")
     parser.add_argument("--config", type=str, default="configs/default.yaml", help="配置文件路径（用于 llm 算法）")
     parser.add_argument("--device", type=str, default="cuda", help="设备 cuda/cpu（用于 llm 算法）")
+    parser.add_argument("--no_reverse_unionfind", action="store_true", help="HDA 每步用 connected_components 计算 LCC，而不是倒序并查集")
+    parser.add_argument("--cuda_graph", action="store_true", help="用 CUDA Graph 捕获 LLM 每步打分前向（用于 llm 算法）")
     
     args = parser.parse_args()
     
@@ -502,6 +562,9 @@ def main():
     print(f"节点数: {G.number_of_nodes()}")
     print(f"边数: {G.number_of_edges()}")
     
+    # 邻接结构只转换一次 CSR，hda/random 共用（多重图的度数与 CSR 非零元不一致，不走快速路径）
+    adj_csr = None if G.is_multigraph() or G.number_of_nodes() == 0 else nx.to_scipy_sparse_array(G, format='csr', dtype=np.int32, weight=None)
+    
     # 设置攻击预算
     budget = args.budget or int(G.number_of_nodes() * 0.3)
     print(f"攻击预算: {budget}")
@@ -521,18 +584,16 @@ def main():
                 collapse_threshold=args.collapse_threshold,
                 random_runs=args.random_runs,
                 random_seed=args.random_seed,
+                random_workers=args.random_workers,
                 checkpoint_path=args.checkpoint,
                 config_path=args.config,
                 device=args.device,
+                use_cuda_graph=args.cuda_graph,
+                adj_csr=adj_csr,
+                use_reverse_unionfind=not args.no_reverse_unionfind,
             )
             results.append(result)
-            
-            # 计算正确的 R_res
-            r_res = compute_r_res_correct(result.removal_fractions, result.lcc_values)
-            collapse = result.find_collapse_point(args.collapse_threshold)
-            
-            print(f"  R_res: {r_res:.4f}")
-            print(f"  崩溃点: {collapse:.2%}" if collapse else "  崩溃点: 未崩溃")
+            print(f"  完成: 移除 {len(result.attack_sequence)} 个节点")
             
         except Exception as e:
             print(f"  ❌ 错误: {e}")
@@ -543,6 +604,9 @@ def main():
         print("\n❌ 没有成功运行的算法")
         return
     
+    # 所有算法的 R_res 与崩溃点一次批量计算，保存/绘图/汇总共用
+    _finalize(results, args.collapse_threshold)
+    
     # 保存数据
     print("\n保存实验数据...")
     save_experiment_data(results, experiment_dir, args.collapse_threshold)
@@ -565,10 +629,9 @@ def main():
     print(f"{'算法':<25} {'R_res':<12} {'崩溃点':<12}")
     print("-" * 60)
     for result in results:
-        r_res = compute_r_res_correct(result.removal_fractions, result.lcc_values)
-        collapse = result.find_collapse_point(args.collapse_threshold)
+        collapse = result.collapse_fraction
         collapse_str = f"{collapse:.2%}" if collapse else "N/A"
-        print(f"{result.algorithm_name:<25} {r_res:<12.4f} {collapse_str:<12}")
+        print(f"{result.algorithm_name:<25} {result.r_res:<12.4f} {collapse_str:<12}")
     print("=" * 60)
     print(f"\n所有结果已保存到: {experiment_dir}")
 
@@ -7,12 +7,35 @@
     python scripts/find_checkpoints.py
 """
 
+import os
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-def find_checkpoints(output_dir: str = "outputs"):
+def _iter_checkpoint_dirs(root: str, max_depth: int = 4):
+    """
+    用显式栈遍历 root，产出名为 checkpoints 的目录
+
+    每层只调用一次 os.scandir，DirEntry.is_dir 通常无需额外 stat；
+    不进入 checkpoints 目录内部继续搜索，超过 max_depth 层的目录也不再展开。
+    """
+    stack = [(root, 0)]
+    while stack:
+        path, depth = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                subdirs = [entry for entry in it if entry.is_dir(follow_symlinks=False)]
+        except OSError:
+            continue
+        for entry in subdirs:
+            if entry.name == "checkpoints":
+                yield entry.path
+            elif depth < max_depth:
+                stack.append((entry.path, depth + 1))
+
+
+def find_checkpoints(output_dir: str = "outputs", max_depth: int = 4):
     """查找所有检查点"""
     output_path = Path(output_dir)
     
@@ -27,16 +50,22 @@ def find_checkpoints(output_dir: str = "outputs"):
     checkpoints = []
     
     # 查找所有 checkpoints 目录
-    for checkpoint_dir in output_path.rglob("checkpoints"):
-        for epoch_dir in checkpoint_dir.iterdir():
-            if epoch_dir.is_dir():
-                model_file = epoch_dir / "model.pt"
-                if model_file.exists():
-                    checkpoints.append({
-                        "path": str(model_file),
-                        "epoch": epoch_dir.name,
-                        "parent": str(checkpoint_dir.parent)
-                    })
+    for checkpoint_dir in _iter_checkpoint_dirs(str(output_path), max_depth):
+        with os.scandir(checkpoint_dir) as it:
+            epoch_dirs = [entry for entry in it if entry.is_dir(follow_symlinks=False)]
+        for epoch_dir in epoch_dirs:
+            # 训练器装有 safetensors 时保存 model.safetensors，否则保存 model.pt
+            for name in ("model.safetensors", "model.pt"):
+                model_file = os.path.join(epoch_dir.path, name)
+                if os.path.isfile(model_file):
+                    break
+            else:
+                continue
+            checkpoints.append({
+                "path": model_file,
+                "epoch": epoch_dir.name,
+                "parent": os.path.dirname(checkpoint_dir)
+            })
     
     if checkpoints:
         print(f"\n找到 {len(checkpoints)} 个检查点:\n")
@@ -63,6 +92,7 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="查找所有检查点")
     parser.add_argument("--output_dir", type=str, default="outputs", help="输出目录")
+    parser.add_argument("--max_depth", type=int, default=4, help="搜索 checkpoints 目录的最大深度")
     args = parser.parse_args()
     
-    find_checkpoints(args.output_dir)
+    find_checkpoints(args.output_dir, args.max_depth)
@@ -9,6 +9,7 @@
     python scripts/fix_network.py
 """
 
+import asyncio
 import os
 import sys
 
@@ -30,25 +31,54 @@ def setup_hf_mirror():
     print()
 
 
-def test_connection():
-    """测试网络连接"""
+async def _probe_all(urls):
+    """并发探测所有地址，返回状态码或异常（与 urls 顺序一致）"""
+    import httpx
+    
+    async with httpx.AsyncClient(timeout=5, follow_redirects=True) as client:
+        async def probe(url):
+            response = await client.get(url)
+            return response.status_code
+        
+        return await asyncio.gather(*[probe(url) for url in urls], return_exceptions=True)
+
+
+def _probe_all_sync(urls):
+    """逐个探测所有地址（未安装 httpx 时使用）"""
     import requests
     
+    results = []
+    for url in urls:
+        try:
+            results.append(requests.get(url, timeout=5).status_code)
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def test_connection():
+    """测试网络连接（安装了 httpx 时并发探测，总耗时约为最慢的一个）"""
     mirrors = [
         ("hf-mirror.com (推荐)", "https://hf-mirror.com"),
         ("huggingface.co (官方)", "https://huggingface.co"),
     ]
+    urls = [url for _, url in mirrors]
     
     print("测试网络连接...")
     print()
     
-    for name, url in mirrors:
-        try:
-            response = requests.get(url, timeout=5)
-            status = "✅ 可访问" if response.status_code == 200 else f"⚠️ 状态码: {response.status_code}"
+    try:
+        import httpx  # noqa: F401
+        results = asyncio.run(_probe_all(urls))
+    except ImportError:
+        results = _probe_all_sync(urls)
+    
+    for (name, _), result in zip(mirrors, results):
+        if isinstance(result, Exception):
+            print(f"{name}: ❌ 无法访问 - {str(result)[:50]}")
+        else:
+            status = "✅ 可访问" if result == 200 else f"⚠️ 状态码: {result}"
             print(f"{name}: {status}")
-        except Exception as e:
-            print(f"{name}: ❌ 无法访问 - {str(e)[:50]}")
     print()
 
 
@@ -76,8 +106,8 @@ def main():
     try:
         test_connection()
     except ImportError:
-        print("⚠️  requests 未安装，跳过连接测试")
-        print("   安装: pip install requests")
+        print("⚠️  httpx 和 requests 均未安装，跳过连接测试")
+        print("   安装: pip install httpx")
     
     print("=" * 60)
     print("配置完成！")
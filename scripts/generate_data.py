@@ -19,18 +19,39 @@
 """
 
 import argparse
+import contextlib
+import hashlib
+import io
+import itertools
+import math
 import json
+import os
+import pickle
 import random
+import shutil
+import traceback
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 import sys
 
-# 添加项目根目录到路径
-sys.path.insert(0, str(Path(__file__).parent.parent))
+# 添加项目根目录到路径（已在路径中时不重复插入，例如 quick_validate 导入本模块时）
+_PROJECT_ROOT = str(Path(__file__).parent.parent)
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
 
 import numpy as np
 import networkx as nx
 
+from src.env.simulator import NetworkEnvironment, TaskType
+from src.env.metrics import ResilienceMetrics
+from src.data.ocg_builder import OCGExtractor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 def generate_node_semantics(num_nodes: int, graph_type: str = "generic", node_ids: Optional[List] = None) -> Dict:
     """
@@ -86,23 +107,35 @@ def generate_node_semantics(num_nodes: int, graph_type: str = "generic", node_id
     else:
         roles = server_roles + infra_roles
     
-    semantics = {}
     if node_ids is None:
         node_ids = list(range(num_nodes))
     
-    for node_id in node_ids:
-        role = random.choice(roles)
-        # 添加一些随机性
-        importance = random.choice(["关键", "重要", "普通", "辅助"])
-        semantics[node_id] = f"{importance}{role}"
+    # 角色与重要性（添加一些随机性）一次性批量抽取
+    importance = ["关键", "重要", "普通", "辅助"]
+    role_idx = np.random.randint(0, len(roles), size=len(node_ids))
+    importance_idx = np.random.randint(0, len(importance), size=len(node_ids))
     
-    return semantics
+    return {
+        node_id: f"{importance[imp]}{roles[role]}"
+        for node_id, role, imp in zip(node_ids, role_idx.tolist(), importance_idx.tolist())
+    }
+
+
+# 大于该大小的 GML 文件，处理后的图以 pickle 缓存到同目录的 .cache/ 下，之后直接读取缓存
+_GML_CACHE_MIN_BYTES = 5 * 1024 * 1024
+
+
+def _graph_cache_path(filepath: Path) -> Path:
+    return filepath.parent / ".cache" / f"{filepath.name}.pkl"
 
 
 def load_graph_from_file(filepath: Path) -> Optional[nx.Graph]:
     """
     从文件加载图
     
+    大 GML 文件（>5MB）用 NetworkX 纯 Python 解析很慢，第一次加载后把处理好的图
+    （无向、最大连通分量）pickle 到 .cache/，源文件未更新时之后直接读取缓存。
+    
     Args:
         filepath: 图文件路径
     
@@ -110,6 +143,15 @@ def load_graph_from_file(filepath: Path) -> Optional[nx.Graph]:
         NetworkX 图对象，如果加载失败返回 None
     """
     try:
+        cache_path = None
+        if filepath.suffix == '.gml':
+            source_stat = filepath.stat()
+            if source_stat.st_size > _GML_CACHE_MIN_BYTES:
+                cache_path = _graph_cache_path(filepath)
+                if cache_path.exists() and cache_path.stat().st_mtime >= source_stat.st_mtime:
+                    with open(cache_path, 'rb') as f:
+                        return pickle.load(f)
+        
         if filepath.suffix == '.gml':
             # GML 文件可能使用不同的标签，尝试几种方式
             try:
@@ -130,10 +172,16 @@ def load_graph_from_file(filepath: Path) -> Optional[nx.Graph]:
         if graph.is_directed():
             graph = graph.to_undirected()
         
-        # 只保留最大连通分量
-        if graph.number_of_nodes() > 0 and not nx.is_connected(graph):
-            largest_cc = max(nx.connected_components(graph), key=len)
-            graph = graph.subgraph(largest_cc).copy()
+        # 只保留最大连通分量：第一个分量已覆盖全部节点时即为连通图，不再遍历
+        if graph.number_of_nodes() > 0:
+            components = nx.connected_components(graph)
+            first_cc = next(components)
+            if len(first_cc) < graph.number_of_nodes():
+                largest_cc = max(itertools.chain([first_cc], components), key=len)
+                graph = graph.subgraph(largest_cc).copy()
+        
+        if cache_path is not None:
+            _save_graph_cache(graph, cache_path)
         
         return graph
     except Exception as e:
@@ -141,6 +189,19 @@ def load_graph_from_file(filepath: Path) -> Optional[nx.Graph]:
         return None
 
 
+def _save_graph_cache(graph: nx.Graph, cache_path: Path) -> None:
+    """原子地写入图缓存（并行进程可能同时写同一个文件）；目录不可写等失败时只打印提示"""
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(graph, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"  Warning: failed to cache graph to {cache_path}: {e}")
+        tmp_path.unlink(missing_ok=True)
+
+
 def get_graph_files(data_source: str, raw_graphs_dir: Path) -> List[Tuple[Path, str]]:
     """
     获取图文件列表
@@ -185,7 +246,7 @@ def generate_single_graph_data(
     为单个图生成训练数据
     
     Args:
-        graph: NetworkX 图对象（如果提供则直接使用）
+        graph: NetworkX 图对象（如果提供则直接使用，需为连通图；load_graph_from_file 已只保留最大连通分量）
         graph_type: 图类型 ("ba", "er")，仅在 graph=None 时使用
         num_nodes: 节点数，仅在 graph=None 时使用
         task_type: 任务类型 ("dismantle", "construct")
@@ -198,29 +259,22 @@ def generate_single_graph_data(
     Returns:
         样本列表
     """
-    from src.env.simulator import NetworkEnvironment, TaskType
-    from src.env.metrics import ResilienceMetrics
-    from src.data.ocg_builder import OCGExtractor
-    
     # 如果没有提供图，则生成图
     if graph is None:
         if graph_type == "ba":
             m = max(2, num_nodes // 20) if num_nodes else 3
             graph = nx.barabasi_albert_graph(num_nodes, m)
         elif graph_type == "er":
-            p = 3.0 / num_nodes if num_nodes else 0.05
+            # 取略高于连通阈值 ln(n)/n 的概率，通常一次生成即连通
+            p = max(3.0 / num_nodes, 1.1 * math.log(num_nodes) / num_nodes) if num_nodes else 0.05
             graph = nx.erdos_renyi_graph(num_nodes, p)
-            # 确保连通
-            while not nx.is_connected(graph):
-                graph = nx.erdos_renyi_graph(num_nodes, p * 1.2)
+            # 确保连通：仍不连通时在相邻连通分量之间各补一条边，而不是反复重新生成
+            components = list(nx.connected_components(graph))
+            for cc_a, cc_b in zip(components, components[1:]):
+                graph.add_edge(next(iter(cc_a)), next(iter(cc_b)))
         else:
             raise ValueError(f"Unknown graph type: {graph_type}")
     
-    # 确保图是连通的（只保留最大连通分量）
-    if not nx.is_connected(graph):
-        largest_cc = max(nx.connected_components(graph), key=len)
-        graph = graph.subgraph(largest_cc).copy()
-    
     actual_num_nodes = graph.number_of_nodes()
     
     # 生成语义（基于实际节点数和节点ID）
@@ -258,6 +312,26 @@ def generate_single_graph_data(
     return samples
 
 
+def _top_k_by_degree(nodes: List, degrees: Dict, k: int) -> List:
+    """
+    取度数最高的 k 个节点，按度数降序、度数相同时按节点顺序排列
+    
+    与 sorted(nodes, key=degree, reverse=True)[:k] 结果相同，但先用 np.partition 以 O(N)
+    找到第 k 大的度数，只对不小于它的少量节点做稳定排序。
+    """
+    k = min(k, len(nodes))
+    if k <= 0:
+        return []
+    deg_arr = np.fromiter((degrees[n] for n in nodes), dtype=np.int64, count=len(nodes))
+    if k < len(nodes):
+        kth_degree = np.partition(deg_arr, len(nodes) - k)[len(nodes) - k]
+        idx = np.flatnonzero(deg_arr >= kth_degree)
+    else:
+        idx = np.arange(len(nodes))
+    top = idx[np.argsort(-deg_arr[idx], kind="stable")][:k]
+    return [nodes[i] for i in top]
+
+
 def _generate_dismantle_data(
     env, metrics, extractor, budget, graph_idx, graph_file,
     data_source, semantic_type, node_semantics, actual_num_nodes
@@ -273,8 +347,7 @@ def _generate_dismantle_data(
         # 获取候选节点 (这里用简单的度数排序模拟谱梯度剪枝)
         nodes = list(env.graph.nodes())
         degrees = dict(env.graph.degree())
-        sorted_nodes = sorted(nodes, key=lambda x: degrees[x], reverse=True)
-        candidates = sorted_nodes[:min(5, len(sorted_nodes))]
+        candidates = _top_k_by_degree(nodes, degrees, 5)
         
         if not candidates:
             break
@@ -294,13 +367,13 @@ def _generate_dismantle_data(
             auxiliary_labels[op_id] = round(score, 4)
             operations.append({"op_id": op_id, "target": node})
         
-        # 获取正确排序
-        ground_truth = sorted(
-            auxiliary_labels.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )
-        ground_truth_ranking = [op_id for op_id, _ in ground_truth]
+        # 获取正确排序（稳定排序，分数相同时保持候选顺序）
+        label_scores = np.fromiter(auxiliary_labels.values(), dtype=np.float64, count=len(auxiliary_labels))
+        ground_truth_ranking = [operations[i]["op_id"] for i in np.argsort(-label_scores, kind="stable")]
+        op_index = {op["op_id"]: i for i, op in enumerate(operations)}
+        
+        # 割点集合每步只求一次（一次 Tarjan DFS），供推理过程中的各候选共用
+        articulation_set = set(nx.articulation_points(env.graph)) if nx.is_connected(env.graph) else set()
         
         # 生成推理过程
         reasoning = generate_reasoning_trace_dismantle(
@@ -308,7 +381,10 @@ def _generate_dismantle_data(
             auxiliary_labels, 
             ground_truth_ranking,
             env.graph,
-            node_semantics
+            node_semantics,
+            articulation_set=articulation_set,
+            degree_map=degrees,
+            op_index=op_index
         )
         
         # 提取 OCG 并构建样本
@@ -318,7 +394,9 @@ def _generate_dismantle_data(
             task_type="dismantle",
             current_step=step + 1,
             total_steps=budget,
-            node_semantics=node_semantics
+            node_semantics=node_semantics,
+            degree_map=degrees,
+            articulation_set=articulation_set
         )
         
         sample = extractor.build_conversation_data(
@@ -344,7 +422,7 @@ def _generate_dismantle_data(
         # 执行最佳操作
         if ground_truth_ranking:
             best_op = ground_truth_ranking[0]
-            best_node = operations[int(best_op.split("_")[1]) - 1]["target"]
+            best_node = operations[op_index[best_op]]["target"]
             if best_node in env.graph:
                 env.graph.remove_node(best_node)
         
@@ -374,6 +452,9 @@ def _generate_construct_data(
         # 计算添加边的增益分数
         edge_gains = metrics.batch_compute_edge_gains(env.graph, candidate_edges)
         
+        # 度数每步只统计一次，推理过程与对话构建共用
+        degrees = dict(env.graph.degree())
+        
         # 构建操作和标签
         auxiliary_labels = {}
         operations = []
@@ -385,13 +466,10 @@ def _generate_construct_data(
             auxiliary_labels[op_id] = round(score, 4)
             operations.append({"op_id": op_id, "target": edge})
         
-        # 获取正确排序
-        ground_truth = sorted(
-            auxiliary_labels.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )
-        ground_truth_ranking = [op_id for op_id, _ in ground_truth]
+        # 获取正确排序（稳定排序，分数相同时保持候选顺序）
+        label_scores = np.fromiter(auxiliary_labels.values(), dtype=np.float64, count=len(auxiliary_labels))
+        ground_truth_ranking = [operations[i]["op_id"] for i in np.argsort(-label_scores, kind="stable")]
+        op_index = {op["op_id"]: i for i, op in enumerate(operations)}
         
         # 生成推理过程
         reasoning = generate_reasoning_trace_construct(
@@ -399,7 +477,9 @@ def _generate_construct_data(
             auxiliary_labels, 
             ground_truth_ranking,
             env.graph,
-            node_semantics
+            node_semantics,
+            degree_map=degrees,
+            op_index=op_index
         )
         
         # 构建自定义的 OCG 数据（因为 construct 是边操作）
@@ -411,7 +491,8 @@ def _generate_construct_data(
             node_semantics=node_semantics,
             ground_truth_ranking=ground_truth_ranking,
             auxiliary_labels=auxiliary_labels,
-            reasoning_trace=reasoning
+            reasoning_trace=reasoning,
+            degree_map=degrees
         )
         
         # 更新样本 ID 和元数据
@@ -430,7 +511,7 @@ def _generate_construct_data(
         # 执行最佳操作（添加边）
         if ground_truth_ranking and operations:
             best_op = ground_truth_ranking[0]
-            best_edge = operations[int(best_op.split("_")[1]) - 1]["target"]
+            best_edge = operations[op_index[best_op]]["target"]
             u, v = best_edge
             if u in env.graph and v in env.graph:
                 env.graph.add_edge(u, v)
@@ -440,6 +521,14 @@ def _generate_construct_data(
     return samples
 
 
+# construct 任务的系统提示（强调这是统一的韧性优化任务），各样本共用
+_CONSTRUCT_SYSTEM_PROMPT = (
+    "你是一个网络韧性优化专家。你的目标是通过分析局部子图结构（OCG）"
+    "和节点语义，选择能最显著改变网络韧性积分 R_res 的操作。"
+    "本次任务是构造任务（σ=+1）：选择添加后能最大化提升网络韧性的边。"
+)
+
+
 def build_construct_conversation_data(
     graph: nx.Graph,
     candidate_edges: List[Tuple],
@@ -448,41 +537,45 @@ def build_construct_conversation_data(
     node_semantics: Dict,
     ground_truth_ranking: List[str],
     auxiliary_labels: Dict[str, float],
-    reasoning_trace: str
+    reasoning_trace: str,
+    degree_map: Optional[Dict] = None
 ) -> Dict:
-    """为 construct 任务构建对话数据"""
-    import json
-    
-    # 系统提示（强调这是统一的韧性优化任务）
-    system_prompt = (
-        "你是一个网络韧性优化专家。你的目标是通过分析局部子图结构（OCG）"
-        "和节点语义，选择能最显著改变网络韧性积分 R_res 的操作。"
-        "本次任务是构造任务（σ=+1）：选择添加后能最大化提升网络韧性的边。"
-    )
+    """
+    为 construct 任务构建对话数据
     
-    # 构建用户提示
-    user_prompt = f"【当前状态】\n步骤：{current_step} / {total_steps}\n"
-    user_prompt += "目标：最大化韧性 (Construct, σ=+1)\n\n"
-    user_prompt += "【候选边信息】\n以下是候选边及其端点的语义摘要：\n\n"
+    degree_map: 当前图的 {节点: 度数}，由调用方每步统计一次；未提供时在此统计
+    """
+    if degree_map is None:
+        degree_map = dict(graph.degree())
+    
+    # 构建用户提示（各段收集到列表中，最后一次拼接）
+    parts = [
+        f"【当前状态】\n步骤：{current_step} / {total_steps}\n"
+        "目标：最大化韧性 (Construct, σ=+1)\n\n"
+        "【候选边信息】\n以下是候选边及其端点的语义摘要：\n\n"
+    ]
     
     for idx, edge in enumerate(candidate_edges, 1):
         u, v = edge
         sem_u = node_semantics.get(u, f"节点{u}")
         sem_v = node_semantics.get(v, f"节点{v}")
-        deg_u = graph.degree(u) if u in graph else 0
-        deg_v = graph.degree(v) if v in graph else 0
+        deg_u = degree_map.get(u, 0)
+        deg_v = degree_map.get(v, 0)
         
-        user_prompt += f"{idx}. 边 [{u} — {v}]:\n"
-        user_prompt += f"   - 端点1 [{u}]: {sem_u}，度数 {deg_u}\n"
-        user_prompt += f"   - 端点2 [{v}]: {sem_v}，度数 {deg_v}\n"
-        user_prompt += f"   - 连接意义：添加此边可增强两节点间的连通性\n\n"
+        parts.append(
+            f"{idx}. 边 [{u} — {v}]:\n"
+            f"   - 端点1 [{u}]: {sem_u}，度数 {deg_u}\n"
+            f"   - 端点2 [{v}]: {sem_v}，度数 {deg_v}\n"
+            "   - 连接意义：添加此边可增强两节点间的连通性\n\n"
+        )
     
-    user_prompt += "【候选操作列表】\n"
+    parts.append("【候选操作列表】\n")
     for idx, edge in enumerate(candidate_edges, 1):
         u, v = edge
-        user_prompt += f"- [op_{idx:02d}]: 添加边 ({u}, {v})\n"
+        parts.append(f"- [op_{idx:02d}]: 添加边 ({u}, {v})\n")
     
-    user_prompt += "\n请分析上述选项，并按推荐优先级排序（增益最大的优先）。"
+    parts.append("\n请分析上述选项，并按推荐优先级排序（增益最大的优先）。")
+    user_prompt = "".join(parts)
     
     # 生成 Assistant 回复
     response = {
@@ -490,7 +583,11 @@ def build_construct_conversation_data(
         "ranked_list": ground_truth_ranking,
         "best_action": ground_truth_ranking[0] if ground_truth_ranking else ""
     }
-    assistant_content = f"```json\n{json.dumps(response, ensure_ascii=False, indent=2)}\n```"
+    if orjson is not None:
+        response_json = orjson.dumps(response, option=orjson.OPT_INDENT_2).decode("utf-8")
+    else:
+        response_json = json.dumps(response, ensure_ascii=False, indent=2)
+    assistant_content = f"```json\n{response_json}\n```"
     
     return {
         "id": f"train_construct_{current_step:03d}",
@@ -499,7 +596,7 @@ def build_construct_conversation_data(
             "budget_step": f"{current_step}/{total_steps}"
         },
         "conversations": [
-            {"from": "system", "value": system_prompt},
+            {"from": "system", "value": _CONSTRUCT_SYSTEM_PROMPT},
             {"from": "user", "value": user_prompt},
             {"from": "assistant", "value": assistant_content}
         ],
@@ -525,25 +622,37 @@ def generate_reasoning_trace_dismantle(
     auxiliary_labels: Dict[str, float],
     ground_truth_ranking: List[str],
     graph,
-    node_semantics: Dict
+    node_semantics: Dict,
+    articulation_set: Optional[set] = None,
+    degree_map: Optional[Dict] = None,
+    op_index: Optional[Dict[str, int]] = None
 ) -> str:
-    """生成 dismantle 任务的推理过程文本"""
-    import networkx as nx
+    """
+    生成 dismantle 任务的推理过程文本
+    
+    articulation_set: 当前图的割点集合（图不连通时为空集）；未提供时在此计算一次
+    degree_map: 当前图的 {节点: 度数}；未提供时在此统计一次
+    op_index: {op_id: 候选下标}；未提供时按 "op_XX" 的编号推算
+    """
+    if articulation_set is None:
+        articulation_set = set(nx.articulation_points(graph)) if nx.is_connected(graph) else set()
+    if degree_map is None:
+        degree_map = dict(graph.degree())
     
     reasoning_parts = []
     
     for rank, op_id in enumerate(ground_truth_ranking[:3], 1):
-        idx = int(op_id.split("_")[1]) - 1
+        idx = op_index[op_id] if op_index is not None else int(op_id.split("_")[1]) - 1
         if idx >= len(candidates):
             continue
         
         node = candidates[idx]
         score = auxiliary_labels[op_id]
-        degree = graph.degree(node)
+        degree = degree_map[node]
         semantic = node_semantics.get(node, "未知")
         
         # 检查是否是割点
-        is_articulation = node in set(nx.articulation_points(graph)) if nx.is_connected(graph) else False
+        is_articulation = node in articulation_set
         
         reason = f"{rank}. 分析 [{op_id}] (移除节点 {node}): "
         reason += f"该节点是'{semantic}'，"
@@ -571,15 +680,23 @@ def generate_reasoning_trace_construct(
     auxiliary_labels: Dict[str, float],
     ground_truth_ranking: List[str],
     graph,
-    node_semantics: Dict
+    node_semantics: Dict,
+    degree_map: Optional[Dict] = None,
+    op_index: Optional[Dict[str, int]] = None
 ) -> str:
-    """生成 construct 任务的推理过程文本（添加边）"""
-    import networkx as nx
+    """
+    生成 construct 任务的推理过程文本（添加边）
+    
+    degree_map: 当前图的 {节点: 度数}；未提供时在此统计一次
+    op_index: {op_id: 候选下标}；未提供时按 "op_XX" 的编号推算
+    """
+    if degree_map is None:
+        degree_map = dict(graph.degree())
     
     reasoning_parts = []
     
     for rank, op_id in enumerate(ground_truth_ranking[:3], 1):
-        idx = int(op_id.split("_")[1]) - 1
+        idx = op_index[op_id] if op_index is not None else int(op_id.split("_")[1]) - 1
         if idx >= len(candidate_edges):
             continue
         
@@ -588,8 +705,8 @@ def generate_reasoning_trace_construct(
         score = auxiliary_labels[op_id]
         
         # 获取端点信息
-        deg_u = graph.degree(u) if u in graph else 0
-        deg_v = graph.degree(v) if v in graph else 0
+        deg_u = degree_map.get(u, 0)
+        deg_v = degree_map.get(v, 0)
         sem_u = node_semantics.get(u, f"节点{u}")
         sem_v = node_semantics.get(v, f"节点{v}")
         
@@ -616,6 +733,131 @@ def generate_reasoning_trace_construct(
     return "\n".join(reasoning_parts)
 
 
+def _dump_sample(sample: Dict) -> bytes:
+    """把单个样本序列化为 UTF-8 JSON（缩进 2），有 orjson 时使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(sample, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(sample, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def _write_json_array(samples_file, spans: List[Tuple[int, int]], output_path: Path) -> None:
+    """按 (偏移, 长度) 从已序列化的样本文件中取出样本，写成一个 JSON 数组"""
+    with open(output_path, 'wb') as f:
+        f.write(b"[")
+        for i, (offset, length) in enumerate(spans):
+            samples_file.seek(offset)
+            f.write(b",\n" if i else b"\n")
+            f.write(samples_file.read(length))
+        f.write(b"\n]" if spans else b"]")
+
+
+def _samples_cache_key(task: Tuple, worker_args: Dict) -> str:
+    """
+    单图样本缓存的键：决定该图输出的全部参数，文件数据再加上图文件内容的哈希
+    （文件被替换或修改后自动失效）
+    """
+    i, data_source, graph_file, graph_type, num_nodes, task_type, semantic_type = task
+    h = hashlib.sha1()
+    h.update(repr((
+        i, data_source, graph_type, num_nodes, task_type, semantic_type,
+        worker_args["budget"], worker_args["min_graph_size"], worker_args["seed"]
+    )).encode("utf-8"))
+    if graph_file is not None:
+        with open(graph_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+def _load_samples_cache(cache_path: Path) -> Optional[List[Dict]]:
+    if not cache_path.exists():
+        return None
+    data = cache_path.read_bytes()
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _save_samples_cache(samples: List[Dict], cache_path: Path) -> None:
+    """原子地写入单图样本缓存；失败时只打印提示"""
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        if orjson is not None:
+            data = orjson.dumps(samples, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        else:
+            data = json.dumps(samples, ensure_ascii=False).encode("utf-8")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"  Warning: failed to cache samples to {cache_path}: {e}")
+        tmp_path.unlink(missing_ok=True)
+
+
+def _process_one(task: Tuple, worker_args: Dict) -> Tuple[List[Dict], str, bool]:
+    """
+    处理单个图（加载或生成图并生成样本），供进程池调用
+    
+    每个图用 seed + 图索引 重新设定随机种子，结果与进程数和完成顺序无关。
+    提供 cache_dir 时，成功生成的样本按 _samples_cache_key 缓存，再次运行时直接读取。
+    
+    Args:
+        task: (图索引, 数据来源, 图文件, 图类型, 节点数, 任务类型, 语义类型)
+        worker_args: budget / min_graph_size / seed / total_graphs / cache_dir
+    
+    Returns:
+        (样本列表, 日志文本, 是否成功)
+    """
+    i, data_source, graph_file, graph_type, num_nodes, task_type, semantic_type = task
+    total_graphs = worker_args["total_graphs"]
+    random.seed(worker_args["seed"] + i)
+    np.random.seed(worker_args["seed"] + i)
+    
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            cache_path = None
+            if worker_args["cache_dir"] is not None:
+                cache_path = worker_args["cache_dir"] / f"{_samples_cache_key(task, worker_args)}.json"
+                cached = _load_samples_cache(cache_path)
+                if cached is not None:
+                    print(f"[{i+1}/{total_graphs}] Loaded {len(cached)} cached samples, task={task_type}")
+                    return cached, log.getvalue(), True
+            
+            # 加载或生成图
+            if data_source == "generate":
+                graph = None
+                print(f"[{i+1}/{total_graphs}] Generating {graph_type} graph with {num_nodes} nodes, task={task_type}")
+            else:
+                print(f"[{i+1}/{total_graphs}] Loading graph from {graph_file.name}, task={task_type}")
+                graph = load_graph_from_file(graph_file)
+                if graph is None:
+                    return [], log.getvalue(), False
+                
+                actual_nodes = graph.number_of_nodes()
+                if actual_nodes < worker_args["min_graph_size"]:
+                    print(f"  Skipped: graph too small ({actual_nodes} nodes < {worker_args['min_graph_size']})")
+                    return [], log.getvalue(), False
+            
+            # 生成训练数据
+            samples = generate_single_graph_data(
+                graph=graph,
+                graph_type=graph_type,
+                num_nodes=num_nodes,
+                task_type=task_type,
+                budget=worker_args["budget"],
+                graph_idx=i,
+                graph_file=graph_file if data_source != "generate" else None,
+                data_source=data_source,
+                semantic_type=semantic_type
+            )
+            print(f"  Generated {len(samples)} samples")
+            if cache_path is not None:
+                _save_samples_cache(samples, cache_path)
+        return samples, log.getvalue(), True
+    except Exception as e:
+        print(f"  Error: {e}", file=log)
+        log.write(traceback.format_exc())
+        return [], log.getvalue(), False
+
+
 def main():
     parser = argparse.ArgumentParser(description="生成网络韧性优化训练数据")
     
@@ -649,6 +891,12 @@ def main():
                         help="训练集比例")
     parser.add_argument("--min_graph_size", type=int, default=20,
                         help="最小图大小（节点数），小于此大小的图会被跳过")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="并行处理图的进程数（默认: CPU 核数；1 表示串行）")
+    parser.add_argument("--no_cache", action="store_true",
+                        help="不读写单图样本缓存（output_dir/.cache）")
+    parser.add_argument("--force", action="store_true",
+                        help="清空单图样本缓存后重新生成所有图")
     
     args = parser.parse_args()
     
@@ -685,7 +933,9 @@ def main():
         print(f"  - Graph type: {args.graph_type}")
         print(f"  - Nodes range: [{args.min_nodes}, {args.max_nodes}]")
     
-    all_samples = []
+    # 样本边生成边写入临时文件，只在内存中保留各样本的 (偏移, 长度)
+    samples_tmp_path = output_dir / "samples.tmp"
+    sample_spans = []
     
     # 确定任务类型
     if args.task_type == "both":
@@ -725,77 +975,79 @@ def main():
         for graph_file, source_type in graph_files:
             graphs_to_process.append((source_type, graph_file, None, None, graph_file))
     
-    # 处理所有图
+    # 处理所有图：任务类型与语义类型在主进程按顺序抽取，各图相互独立，交给进程池并行处理
     total_graphs = len(graphs_to_process)
     successful = 0
     failed = 0
     
+    graph_tasks = []
     for i, (data_source, graph_file, graph_type, num_nodes, file_path) in enumerate(graphs_to_process):
         task_type = random.choice(tasks)
         semantic_type = random.choice(["network", "infra", "generic"])
-        
-        try:
-            # 加载或生成图
-            if data_source == "generate":
-                graph = None
-                print(f"[{i+1}/{total_graphs}] Generating {graph_type} graph with {num_nodes} nodes, task={task_type}")
-            else:
-                print(f"[{i+1}/{total_graphs}] Loading graph from {graph_file.name}, task={task_type}")
-                graph = load_graph_from_file(graph_file)
-                if graph is None:
-                    failed += 1
-                    continue
-                
-                actual_nodes = graph.number_of_nodes()
-                if actual_nodes < args.min_graph_size:
-                    print(f"  Skipped: graph too small ({actual_nodes} nodes < {args.min_graph_size})")
+        graph_tasks.append((i, data_source, graph_file, graph_type, num_nodes, task_type, semantic_type))
+    
+    # 单图样本缓存：按参数和图内容寻址，重复运行时跳过已生成的图
+    cache_dir = None
+    if not args.no_cache:
+        cache_dir = output_dir / ".cache"
+        if args.force and cache_dir.exists():
+            shutil.rmtree(cache_dir)
+        cache_dir.mkdir(exist_ok=True)
+    
+    worker_args = {
+        "budget": args.budget,
+        "min_graph_size": args.min_graph_size,
+        "seed": args.seed,
+        "total_graphs": total_graphs,
+        "cache_dir": cache_dir,
+    }
+    workers = max(1, min(args.workers or os.cpu_count() or 1, total_graphs))
+    
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        outcomes = executor.map(_process_one, graph_tasks, [worker_args] * total_graphs, chunksize=1)
+    else:
+        executor = None
+        outcomes = (_process_one(task, worker_args) for task in graph_tasks)
+    
+    try:
+        with open(samples_tmp_path, 'wb') as samples_file:
+            # 按图的顺序取回结果并输出日志
+            for samples, log, ok in outcomes:
+                print(log, end="")
+                if ok:
+                    for sample in samples:
+                        data = _dump_sample(sample)
+                        sample_spans.append((samples_file.tell(), len(data)))
+                        samples_file.write(data)
+                    successful += 1
+                else:
                     failed += 1
-                    continue
-            
-            # 生成训练数据
-            samples = generate_single_graph_data(
-                graph=graph,
-                graph_type=graph_type,
-                num_nodes=num_nodes,
-                task_type=task_type,
-                budget=args.budget,
-                graph_idx=i,
-                graph_file=graph_file if data_source != "generate" else None,
-                data_source=data_source,
-                semantic_type=semantic_type
-            )
-            
-            all_samples.extend(samples)
-            successful += 1
-            print(f"  Generated {len(samples)} samples")
-        except Exception as e:
-            print(f"  Error: {e}")
-            import traceback
-            traceback.print_exc()
-            failed += 1
-            continue
+    finally:
+        if executor is not None:
+            executor.shutdown()
     
     print(f"\nProcessing completed: {successful} successful, {failed} failed")
     
-    print(f"\nTotal samples generated: {len(all_samples)}")
+    print(f"\nTotal samples generated: {len(sample_spans)}")
     
-    # 划分训练集和验证集
-    random.shuffle(all_samples)
-    split_idx = int(len(all_samples) * args.split_ratio)
-    train_samples = all_samples[:split_idx]
-    eval_samples = all_samples[split_idx:]
+    # 划分训练集和验证集（串行时各图会重设全局随机种子，打乱使用独立的随机数生成器）
+    perm = np.random.default_rng(args.seed).permutation(len(sample_spans))
+    split_idx = int(len(sample_spans) * args.split_ratio)
+    train_samples = [sample_spans[i] for i in perm[:split_idx]]
+    eval_samples = [sample_spans[i] for i in perm[split_idx:]]
     
-    # 保存数据
+    # 保存数据：从临时文件按偏移逐个拷贝到 JSON 数组，不整体载入内存
     train_path = output_dir / "train.json"
     eval_path = output_dir / "eval.json"
     
-    with open(train_path, 'w', encoding='utf-8') as f:
-        json.dump(train_samples, f, ensure_ascii=False, indent=2)
-    print(f"Saved {len(train_samples)} training samples to {train_path}")
-    
-    with open(eval_path, 'w', encoding='utf-8') as f:
-        json.dump(eval_samples, f, ensure_ascii=False, indent=2)
-    print(f"Saved {len(eval_samples)} evaluation samples to {eval_path}")
+    with open(samples_tmp_path, 'rb') as samples_file:
+        _write_json_array(samples_file, train_samples, train_path)
+        print(f"Saved {len(train_samples)} training samples to {train_path}")
+        
+        _write_json_array(samples_file, eval_samples, eval_path)
+        print(f"Saved {len(eval_samples)} evaluation samples to {eval_path}")
+    samples_tmp_path.unlink()
     
     # 保存配置
     config = {
@@ -804,7 +1056,7 @@ def main():
         "task_type": args.task_type,
         "budget": args.budget,
         "seed": args.seed,
-        "total_samples": len(all_samples),
+        "total_samples": len(sample_spans),
         "train_samples": len(train_samples),
         "eval_samples": len(eval_samples),
         "successful_graphs": successful,
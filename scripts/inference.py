@@ -15,15 +15,22 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 import yaml
+import numpy as np
 import torch
+import torch.nn.functional as F
 import networkx as nx
-from typing import List, Dict, Union, Tuple
+from typing import List, Dict, Optional, Union, Tuple
 
 from src.model.fusion_llm import ResilienceLLM, ModelConfig
+from src.model.checkpoint import load_checkpoint_state
 from src.env.simulator import NetworkEnvironment, TaskType
 from src.env.metrics import ResilienceMetrics
 from src.data.ocg_builder import OCGExtractor
 
+# torch.compile(mode="reduce-overhead") 按输入形状捕获 CUDA Graph；序列长度向上对齐到这几档，
+# 预算循环中的各步复用同一张图，而不是每种长度都重新编译
+_LENGTH_BUCKETS = (256, 512, 1024)
+
 
 def load_config(config_path: str) -> dict:
     """加载配置文件"""
@@ -32,135 +39,179 @@ def load_config(config_path: str) -> dict:
     return config
 
 
+def _prepare_candidates(env: NetworkEnvironment) -> Tuple[Optional[List], Optional[List[Tuple]]]:
+    """
+    根据任务类型获取候选节点
+    
+    Returns:
+        (候选节点列表, 边候选列表)；dismantle 时边候选为 None，没有候选时候选节点为 None
+    """
+    if env.task_type == TaskType.CONSTRUCT:
+        # Construct: 获取边候选
+        edge_candidates = env.prune_candidates(candidate_type="edge")
+        if not edge_candidates:
+            return None, None
+        
+        # 将边候选转换为节点候选（用于 OCG 提取）
+        # 取所有边候选中的唯一节点
+        candidate_nodes = list(set([u for u, v in edge_candidates] + [v for u, v in edge_candidates]))
+        candidate_nodes = candidate_nodes[:env.spectral_top_k]  # 限制数量
+        return candidate_nodes, edge_candidates
+    
+    # Dismantle: 获取节点候选
+    candidate_nodes = env.prune_candidates(candidate_type="node")
+    if not candidate_nodes:
+        return None, None
+    return candidate_nodes, None
+
+
+def _highest_degree_non_neighbor(env: NetworkEnvironment, node) -> Optional[Union[int, str]]:
+    """
+    与 node 不相邻（且不是 node 本身）的节点中度数最高的一个，度数相同时取图中靠前的节点
+    
+    在 NumPy 中按度数降序稳定排序，再从前往后跳过邻居；通常只需检查前几个节点，
+    不必对全部节点逐个调用 has_edge。
+    """
+    degrees = env.degree_map()
+    nodes = list(degrees)
+    deg_arr = np.fromiter(degrees.values(), dtype=np.int64, count=len(nodes))
+    neighbors = env.graph.adj[node]
+    for i in np.argsort(-deg_arr, kind="stable"):
+        other = nodes[i]
+        if other != node and other not in neighbors:
+            return other
+    return None
+
+
+def _select_action(
+    env: NetworkEnvironment,
+    candidates: List,
+    edge_candidates: Optional[List[Tuple]],
+    scores: Optional[torch.Tensor]
+) -> Union[int, Tuple[int, int], None]:
+    """根据候选分数选择操作；scores 为 None 时退回启发式随机选择"""
+    if scores is not None:
+        # 选择分数最高的候选
+        best_idx = torch.argmax(scores).item()
+        selected_node = candidates[best_idx]
+        
+        # 对于 construct 任务，需要选择目标节点
+        if env.task_type == TaskType.CONSTRUCT:
+            # 从边候选中找到包含该节点的最佳边
+            if edge_candidates:
+                # 优先选择包含选中节点且分数高的边
+                candidate_edges_with_node = [(u, v) for u, v in edge_candidates 
+                                              if u == selected_node or v == selected_node]
+                if candidate_edges_with_node:
+                    # 选择第一个可用的边（可以改进为基于某种评分）
+                    u, v = candidate_edges_with_node[0]
+                    if u == selected_node:
+                        return (u, v)
+                    else:
+                        return (v, u)
+            
+            # 如果没有找到合适的边，使用启发式方法选择目标节点：
+            # 与选中节点不相邻的节点中度数最高的一个（增加连接性）
+            target = _highest_degree_non_neighbor(env, selected_node)
+            return (selected_node, target) if target is not None else None
+        else:
+            # Dismantle: 直接返回节点
+            return selected_node
+    else:
+        # 如果没有 scores，使用启发式方法
+        import random
+        if env.task_type == TaskType.CONSTRUCT:
+            selected_node = random.choice(candidates)
+            target = _highest_degree_non_neighbor(env, selected_node)
+            return (selected_node, target) if target is not None else None
+        else:
+            return random.choice(candidates)
+
+
+# inference_mode 比 no_grad 更省：不维护版本计数和视图追踪；整个函数内构造的张量都不会进入 autograd
+@torch.inference_mode()
 def predict_action(
     model: ResilienceLLM,
     env: NetworkEnvironment,
     ocg_extractor: OCGExtractor,
-    device: str = "cuda"
+    device: str = "cuda",
+    forward=None,
+    length_buckets: Optional[Tuple[int, ...]] = None
 ) -> Union[int, Tuple[int, int]]:
     """
     使用模型预测下一个操作
     
+    prompt 不再 padding 到固定的 1024，只按实际长度送入模型；
+    候选位置与训练时一致，取序列最后若干个有效 token。
+    
     Args:
         model: 训练好的模型
         env: 网络环境
         ocg_extractor: OCG 提取器
         device: 设备
+        forward: 替代 model 做前向的可调用对象（例如 torch.compile 后的模型），None 时直接调用 model
+        length_buckets: 序列长度分桶；提供时 padding 到不小于序列长度的最小一档
     
     Returns:
         - 对于 dismantle: 选择的节点 ID
         - 对于 construct: (源节点, 目标节点) 元组
     """
-    # 根据任务类型获取候选
-    if env.task_type == TaskType.CONSTRUCT:
-        # Construct: 获取边候选
-        edge_candidates = env.prune_candidates(candidate_type="edge")
-        if not edge_candidates:
-            return None
-        
-        # 将边候选转换为节点候选（用于 OCG 提取）
-        # 取所有边候选中的唯一节点
-        candidate_nodes = list(set([u for u, v in edge_candidates] + [v for u, v in edge_candidates]))
-        candidate_nodes = candidate_nodes[:env.spectral_top_k]  # 限制数量
-    else:
-        # Dismantle: 获取节点候选
-        candidate_nodes = env.prune_candidates(candidate_type="node")
-        if not candidate_nodes:
-            return None
-        edge_candidates = None
-    
-    candidates = candidate_nodes
+    candidates, edge_candidates = _prepare_candidates(env)
+    if not candidates:
+        return None
     
     # 提取 OCG 并构建 prompt
+    # graph_version 全局唯一地标识图状态：状态未变时（例如上一步的边被跳过）直接复用之前的 OCG
     ocg_data = ocg_extractor.extract_ocg(
         graph=env.graph,
         candidate_nodes=candidates,
         task_type=env.task_type.value,
         current_step=env.current_step + 1,
-        total_steps=env.budget
+        total_steps=env.budget,
+        cache_key=(env.graph_version, tuple(candidates), env.task_type.value,
+                   env.current_step, env.budget)
     )
     
-    # 构建输入文本
-    # 推理阶段只需要 user_prompt（build_conversation_data 是训练数据构造接口）
-    input_text = ocg_data.user_prompt
-    
-    # Tokenize
+    # Tokenize：推理阶段只需要 user_prompt（build_conversation_data 是训练数据构造接口）
     inputs = model.tokenizer(
-        input_text,
+        ocg_data.user_prompt,
         max_length=1024,
-        padding="max_length",
         truncation=True,
         return_tensors="pt"
     )
-    input_ids = inputs["input_ids"].to(device)
-    attention_mask = inputs["attention_mask"].to(device)
+    input_ids = inputs["input_ids"]
+    attention_mask = inputs["attention_mask"]
+    # 未分桶时整条序列都是有效 token；分桶 padding 在右侧时有效部分仍以 seq_len 结束
+    seq_len = valid_length = input_ids.shape[1]
+    if length_buckets:
+        bucket = next((b for b in length_buckets if b >= seq_len), seq_len)
+        if bucket > seq_len:
+            if model.tokenizer.padding_side == "left":
+                pad = (bucket - seq_len, 0)
+                valid_length = bucket
+            else:
+                pad = (0, bucket - seq_len)
+            input_ids = F.pad(input_ids, pad, value=model.tokenizer.pad_token_id)
+            attention_mask = F.pad(attention_mask, pad, value=0)
+    input_ids = input_ids.to(device)
+    attention_mask = attention_mask.to(device)
     
-    # 获取候选操作位置索引（简化：使用序列末尾）
+    # 获取候选操作位置索引（简化：使用最后 num_candidates 个有效 token，与训练一致）
     num_candidates = len(candidates)
-    seq_len = input_ids.shape[1]
-    candidate_indices = torch.tensor(
-        [[seq_len - num_candidates + j for j in range(num_candidates)]],
-        device=device,
-        dtype=torch.long
-    )
+    candidate_indices = (
+        valid_length - num_candidates + torch.arange(num_candidates, device=device)
+    ).clamp_min_(0).unsqueeze(0)
     
     # 模型推理
     model.eval()
-    with torch.no_grad():
-        outputs = model(
-            input_ids=input_ids,
-            attention_mask=attention_mask,
-            candidate_indices=candidate_indices,
-            return_scores=True
-        )
-        
-        if "scores" in outputs and outputs["scores"] is not None:
-            scores = outputs["scores"][0]  # [num_candidates]
-            # 选择分数最高的候选
-            best_idx = torch.argmax(scores).item()
-            selected_node = candidates[best_idx]
-            
-            # 对于 construct 任务，需要选择目标节点
-            if env.task_type == TaskType.CONSTRUCT:
-                # 从边候选中找到包含该节点的最佳边
-                if edge_candidates:
-                    # 优先选择包含选中节点且分数高的边
-                    candidate_edges_with_node = [(u, v) for u, v in edge_candidates 
-                                                  if u == selected_node or v == selected_node]
-                    if candidate_edges_with_node:
-                        # 选择第一个可用的边（可以改进为基于某种评分）
-                        u, v = candidate_edges_with_node[0]
-                        if u == selected_node:
-                            return (u, v)
-                        else:
-                            return (v, u)
-                
-                # 如果没有找到合适的边，使用启发式方法选择目标节点
-                remaining_nodes = [n for n in env.graph.nodes() 
-                                  if n != selected_node and not env.graph.has_edge(selected_node, n)]
-                if remaining_nodes:
-                    # 选择度数最高的节点作为目标（增加连接性）
-                    degrees = dict(env.graph.degree())
-                    target = max(remaining_nodes, key=lambda n: degrees.get(n, 0))
-                    return (selected_node, target)
-                return None
-            else:
-                # Dismantle: 直接返回节点
-                return selected_node
-        else:
-            # 如果没有 scores，使用启发式方法
-            import random
-            if env.task_type == TaskType.CONSTRUCT:
-                selected_node = random.choice(candidates)
-                remaining_nodes = [n for n in env.graph.nodes() 
-                                  if n != selected_node and not env.graph.has_edge(selected_node, n)]
-                if remaining_nodes:
-                    degrees = dict(env.graph.degree())
-                    target = max(remaining_nodes, key=lambda n: degrees.get(n, 0))
-                    return (selected_node, target)
-                return None
-            else:
-                return random.choice(candidates)
+    outputs = (forward or model)(
+        input_ids=input_ids,
+        attention_mask=attention_mask,
+        candidate_indices=candidate_indices,
+        return_scores=True
+    )
+    scores = outputs.get("scores")
+    return _select_action(env, candidates, edge_candidates, scores[0] if scores is not None else None)
 
 
 def run_inference(
@@ -169,7 +220,9 @@ def run_inference(
     task_type: str = "dismantle",
     budget: int = 10,
     config_path: str = "configs/default.yaml",
-    device: str = "cuda"
+    device: str = "cuda",
+    use_compile: bool = False,
+    half_precision: bool = True
 ):
     """
     在单个图上运行推理
@@ -181,6 +234,8 @@ def run_inference(
         budget: 操作预算
         config_path: 配置文件路径
         device: 设备
+        use_compile: 是否用 torch.compile(mode="reduce-overhead") 编译前向，输入长度按 _LENGTH_BUCKETS 分桶
+        half_precision: CUDA 上是否把模型转为 BF16（不支持时 FP16）推理
     """
     print("=" * 60)
     print("模型推理测试")
@@ -222,41 +277,47 @@ def run_inference(
         # 查找所有 epoch 目录
         epoch_dirs = sorted(checkpoint_path_obj.glob("epoch_*"), key=lambda p: int(p.name.split("_")[1]) if p.name.startswith("epoch_") else 0, reverse=True)
         if epoch_dirs:
-            # 使用最新的 epoch
+            # 使用最新的 epoch；训练器装有 safetensors 时保存 model.safetensors，否则保存 model.pt
             latest_epoch_dir = epoch_dirs[0]
-            checkpoint_file = latest_epoch_dir / "model.pt"
+            checkpoint_file = latest_epoch_dir / "model.safetensors"
+            if not checkpoint_file.exists():
+                checkpoint_file = latest_epoch_dir / "model.pt"
             if checkpoint_file.exists():
                 print(f"找到检查点: {checkpoint_file}")
-                checkpoint = torch.load(checkpoint_file, map_location=device)
-                if 'model_state_dict' in checkpoint:
-                    model.load_state_dict(checkpoint['model_state_dict'], strict=False)
-                else:
-                    model.load_state_dict(checkpoint, strict=False)
             else:
-                raise FileNotFoundError(f"在 {latest_epoch_dir} 中未找到 model.pt")
+                raise FileNotFoundError(f"在 {latest_epoch_dir} 中未找到 model.safetensors 或 model.pt")
         else:
-            checkpoint_files = list(checkpoint_path_obj.glob("*.pt")) + list(checkpoint_path_obj.glob("*.pth"))
+            checkpoint_files = (
+                list(checkpoint_path_obj.glob("*.safetensors"))
+                + list(checkpoint_path_obj.glob("*.pt"))
+                + list(checkpoint_path_obj.glob("*.pth"))
+            )
             if checkpoint_files:
                 checkpoint_file = max(checkpoint_files, key=lambda p: p.stat().st_mtime)
                 print(f"加载检查点: {checkpoint_file}")
-                checkpoint = torch.load(checkpoint_file, map_location=device)
-                if 'model_state_dict' in checkpoint:
-                    model.load_state_dict(checkpoint['model_state_dict'], strict=False)
-                else:
-                    model.load_state_dict(checkpoint, strict=False)
             else:
                 raise FileNotFoundError(f"在 {checkpoint_path_obj} 中未找到模型文件")
     elif checkpoint_path_obj.is_file():
-        print(f"加载检查点: {checkpoint_path_obj}")
-        checkpoint = torch.load(checkpoint_path_obj, map_location=device)
-        if 'model_state_dict' in checkpoint:
-            model.load_state_dict(checkpoint['model_state_dict'], strict=False)
-        else:
-            model.load_state_dict(checkpoint, strict=False)
+        checkpoint_file = checkpoint_path_obj
+        print(f"加载检查点: {checkpoint_file}")
     else:
         raise FileNotFoundError(f"检查点路径不存在: {checkpoint_path}")
     
+    model.load_state_dict(load_checkpoint_state(checkpoint_file, device), strict=False)
+    
     model.eval()
+    
+    # 推理没有训练时的数值稳定性压力：CUDA 上把权重（含 LoRA 适配器）转为 BF16/FP16，
+    # 前向搬运的字节数减半并走 tensor core；训练仍保持 FP32
+    amp_dtype = None
+    if half_precision and str(device).startswith("cuda") and torch.cuda.is_available():
+        amp_dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+        model.to(dtype=amp_dtype)
+        print(f"推理精度: {amp_dtype}")
+    if str(device).startswith("cuda"):
+        # 模型以 attn_implementation="sdpa" 加载；确保 FlashAttention / memory-efficient 后端可选
+        torch.backends.cuda.enable_flash_sdp(True)
+        torch.backends.cuda.enable_mem_efficient_sdp(True)
     print("模型加载完成")
     
     # 加载图
@@ -281,7 +342,7 @@ def run_inference(
     metrics = ResilienceMetrics()
     
     # 记录初始状态
-    initial_lcc = metrics.compute_lcc_ratio(env.graph)
+    initial_lcc = env.lcc_ratio()
     # R_res 需要 LCC 曲线；推理过程中用当前已观测到的曲线近似
     lcc_curve = [initial_lcc]
     initial_r_res = metrics.compute_r_res(lcc_curve)
@@ -290,13 +351,24 @@ def run_inference(
     print(f"  LCC 比例: {initial_lcc:.4f}")
     print(f"  R_res: {initial_r_res:.4f}")
     
+    # 编译前向：每步形状固定（长度分桶），CUDA Graph 在第一次出现该形状时捕获，之后直接 replay
+    forward = None
+    length_buckets = None
+    if use_compile:
+        forward = torch.compile(model, mode="reduce-overhead", dynamic=False)
+        length_buckets = _LENGTH_BUCKETS
+    
     # 执行推理
     print(f"\n开始推理 (预算: {budget} 步)...")
     actions_taken = []
     
     for step in range(budget):
         # 预测下一个操作
-        action = predict_action(model, env, ocg_extractor, device)
+        with torch.autocast(device_type="cuda", dtype=amp_dtype or torch.bfloat16, enabled=amp_dtype is not None):
+            action = predict_action(
+                model, env, ocg_extractor, device,
+                forward=forward, length_buckets=length_buckets
+            )
         
         if action is None:
             print(f"步骤 {step + 1}: 没有可用候选，提前结束")
@@ -320,7 +392,7 @@ def run_inference(
                 continue
         
         # 计算当前状态
-        current_lcc = metrics.compute_lcc_ratio(env.graph)
+        current_lcc = env.lcc_ratio()
         lcc_curve.append(current_lcc)
         current_r_res = metrics.compute_r_res(lcc_curve)
         
@@ -328,7 +400,7 @@ def run_inference(
         print(f"  LCC: {current_lcc:.4f}, R_res: {current_r_res:.4f}")
     
     # 最终结果
-    final_lcc = metrics.compute_lcc_ratio(env.graph)
+    final_lcc = env.lcc_ratio()
     # 确保最终状态也计入曲线（如果循环提前 break 且未 append）
     if not lcc_curve or lcc_curve[-1] != final_lcc:
         lcc_curve.append(final_lcc)
@@ -360,6 +432,10 @@ def main():
     parser.add_argument("--budget", type=int, default=10, help="操作预算")
     parser.add_argument("--config", type=str, default="configs/default.yaml", help="配置文件路径")
     parser.add_argument("--device", type=str, default="cuda", help="设备 (cuda/cpu)")
+    parser.add_argument("--compile", action="store_true",
+                        help="用 torch.compile(mode=\"reduce-overhead\") 编译模型前向（输入长度分桶为 256/512/1024）")
+    parser.add_argument("--fp32", action="store_true",
+                        help="CUDA 上保持 FP32 推理（默认转为 BF16，不支持时 FP16）")
     
     args = parser.parse_args()
     
@@ -369,7 +445,9 @@ def main():
         task_type=args.task,
         budget=args.budget,
         config_path=args.config,
-        device=args.device
+        device=args.device,
+        use_compile=args.compile,
+        half_precision=not args.fp32
     )
 
 
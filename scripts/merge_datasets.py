@@ -10,13 +10,16 @@
 """
 
 import argparse
-import json
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 from collections import Counter
 
+import numpy as np
 
-def merge_datasets(input_dirs: List[str], output_file: str, split_ratio: float = 0.9):
+from sample_io import load_samples, save_samples
+
+
+def merge_datasets(input_dirs: List[str], output_file: str, split_ratio: float = 0.9, seed: Optional[int] = None):
     """
     合并多个数据集
     
@@ -24,9 +27,11 @@ def merge_datasets(input_dirs: List[str], output_file: str, split_ratio: float =
         input_dirs: 输入目录列表（每个目录应包含 train.json 和 eval.json）
         output_file: 输出文件路径
         split_ratio: 训练集比例（用于重新划分）
+        seed: 打乱使用的随机种子（None 时每次不同）
     """
     all_train_samples = []
     all_eval_samples = []
+    has_non_finite = False
     
     for input_dir in input_dirs:
         input_path = Path(input_dir)
@@ -34,28 +39,24 @@ def merge_datasets(input_dirs: List[str], output_file: str, split_ratio: float =
         eval_file = input_path / "eval.json"
         
         if train_file.exists():
-            with open(train_file, 'r', encoding='utf-8') as f:
-                samples = json.load(f)
-                all_train_samples.extend(samples)
+            samples, non_finite = load_samples(train_file)
+            all_train_samples.extend(samples)
+            has_non_finite |= non_finite
             print(f"Loaded {len(samples)} training samples from {input_dir}")
         
         if eval_file.exists():
-            with open(eval_file, 'r', encoding='utf-8') as f:
-                samples = json.load(f)
-                all_eval_samples.extend(samples)
+            samples, non_finite = load_samples(eval_file)
+            all_eval_samples.extend(samples)
+            has_non_finite |= non_finite
             print(f"Loaded {len(samples)} eval samples from {input_dir}")
     
-    # 合并并重新划分
-    all_samples = all_train_samples + all_eval_samples
-    
-    # 打乱
-    import random
-    random.shuffle(all_samples)
-    
-    # 重新划分
+    # 合并后按随机排列的下标重新划分（只打乱下标数组，不在 Python 层搬动样本）
+    all_samples = all_train_samples
+    all_samples.extend(all_eval_samples)
+    perm = np.random.default_rng(seed).permutation(len(all_samples))
     split_idx = int(len(all_samples) * split_ratio)
-    merged_train = all_samples[:split_idx]
-    merged_eval = all_samples[split_idx:]
+    merged_train = [all_samples[i] for i in perm[:split_idx]]
+    merged_eval = [all_samples[i] for i in perm[split_idx:]]
     
     # 保存
     output_path = Path(output_file)
@@ -64,11 +65,8 @@ def merge_datasets(input_dirs: List[str], output_file: str, split_ratio: float =
     train_output = output_path.parent / "train.json"
     eval_output = output_path.parent / "eval.json"
     
-    with open(train_output, 'w', encoding='utf-8') as f:
-        json.dump(merged_train, f, ensure_ascii=False, indent=2)
-    
-    with open(eval_output, 'w', encoding='utf-8') as f:
-        json.dump(merged_eval, f, ensure_ascii=False, indent=2)
+    save_samples(merged_train, train_output, allow_nan=has_non_finite)
+    save_samples(merged_eval, eval_output, allow_nan=has_non_finite)
     
     print(f"\nMerged {len(merged_train)} training samples")
     print(f"Merged {len(merged_eval)} eval samples")
@@ -81,8 +79,7 @@ def merge_datasets(input_dirs: List[str], output_file: str, split_ratio: float =
 
 def analyze_dataset(data_file: str):
     """分析数据集统计信息"""
-    with open(data_file, 'r', encoding='utf-8') as f:
-        samples = json.load(f)
+    samples, _ = load_samples(Path(data_file))
     
     print(f"\n{'='*60}")
     print(f"Dataset Analysis: {data_file}")
@@ -101,26 +98,27 @@ def analyze_dataset(data_file: str):
     for source, count in Counter(data_sources).items():
         print(f"  {source}: {count} ({count/len(samples)*100:.1f}%)")
     
-    # 节点数分布
-    node_counts = [s['meta'].get('num_nodes', 0) for s in samples]
-    if node_counts:
+    # 节点数分布（中位数用 np.partition 选第 n//2 个，O(N) 而不是整体排序）
+    node_counts = np.fromiter((s['meta'].get('num_nodes', 0) for s in samples), dtype=np.int64, count=len(samples))
+    if node_counts.size:
+        mid = node_counts.size // 2
         print(f"\nNode count statistics:")
-        print(f"  Min: {min(node_counts)}")
-        print(f"  Max: {max(node_counts)}")
-        print(f"  Mean: {sum(node_counts) / len(node_counts):.2f}")
-        print(f"  Median: {sorted(node_counts)[len(node_counts)//2]}")
+        print(f"  Min: {node_counts.min()}")
+        print(f"  Max: {node_counts.max()}")
+        print(f"  Mean: {node_counts.mean():.2f}")
+        print(f"  Median: {np.partition(node_counts, mid)[mid]}")
     
     # auxiliary_labels 统计
-    label_values = []
-    for s in samples:
-        if 'auxiliary_labels' in s:
-            label_values.extend(s['auxiliary_labels'].values())
+    label_values = np.fromiter(
+        (v for s in samples if 'auxiliary_labels' in s for v in s['auxiliary_labels'].values()),
+        dtype=np.float64
+    )
     
-    if label_values:
+    if label_values.size:
         print(f"\nLabel value statistics:")
-        print(f"  Min: {min(label_values):.4f}")
-        print(f"  Max: {max(label_values):.4f}")
-        print(f"  Mean: {sum(label_values) / len(label_values):.4f}")
+        print(f"  Min: {label_values.min():.4f}")
+        print(f"  Max: {label_values.max():.4f}")
+        print(f"  Mean: {label_values.mean():.4f}")
 
 
 def main():
@@ -132,13 +130,15 @@ def main():
                         help="输出文件路径（实际会生成 train.json 和 eval.json）")
     parser.add_argument("--split_ratio", type=float, default=0.9,
                         help="训练集比例（默认：0.9）")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="打乱使用的随机种子（默认：不固定）")
     parser.add_argument("--analyze", action="store_true",
                         help="分析合并后的数据集")
     
     args = parser.parse_args()
     
     # 合并数据集
-    merge_datasets(args.input_dirs, args.output_file, args.split_ratio)
+    merge_datasets(args.input_dirs, args.output_file, args.split_ratio, seed=args.seed)
     
     # 分析数据集
     if args.analyze:
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+数据集 JSON 样本数组的读写（analyze_dataset / diagnose_training / merge_datasets 共用）
+
+json.dump 默认会写出 NaN/Infinity，ijson 与 orjson 都不接受这些记号，
+遇到时统一退回标准库 json。
+"""
+
+import json
+from pathlib import Path
+from typing import Iterator, Tuple, Union
+
+try:
+    import ijson
+except ImportError:  # 未安装 ijson 时 iter_samples 退回一次性读取
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def load_samples(path: Union[str, Path]) -> Tuple[list, bool]:
+    """
+    一次性读取 JSON 样本数组，有 orjson 时使用 orjson
+
+    Returns:
+        (样本列表, 是否含 NaN/Infinity)：含这些值时退回标准库 json 读取，
+        写回时也需要用 json 以保留这些值
+    """
+    data = Path(path).read_bytes()
+    if orjson is not None:
+        try:
+            return orjson.loads(data), False
+        except orjson.JSONDecodeError:
+            return json.loads(data), True
+    return json.loads(data), False
+
+
+def save_samples(samples: list, path: Union[str, Path], allow_nan: bool = False) -> None:
+    """写出 JSON 样本数组（缩进 2）；有 orjson 且数据不含 NaN/Infinity 时使用 orjson"""
+    if orjson is not None and not allow_nan:
+        Path(path).write_bytes(orjson.dumps(samples, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(samples, f, ensure_ascii=False, indent=2)
+
+
+def iter_samples(path: Union[str, Path]) -> Iterator[dict]:
+    """逐个产出数据集中的样本；安装了 ijson 时流式解析，内存占用不随文件大小增长"""
+    num_yielded = 0
+    if ijson is not None:
+        try:
+            with open(path, 'rb') as f:
+                for sample in ijson.items(f, 'item', use_float=True):
+                    yield sample
+                    num_yielded += 1
+            return
+        except ijson.JSONError:
+            # 文件含 NaN/Infinity：整体读取，并跳过已经产出的样本
+            pass
+
+    yield from load_samples(path)[0][num_yielded:]
@@ -59,6 +59,7 @@ plt.rcParams['axes.unicode_minus'] = False
 
 from src.evaluation import UnifiedEvaluator, EvaluationResult
 from src.attack import HighestDegreeAttack, RandomAttack
+from src.env.gml import load_gml_robust
 
 
 def load_graph(graph_path: str) -> nx.Graph:
@@ -69,7 +70,7 @@ def load_graph(graph_path: str) -> nx.Graph:
         try:
             G = nx.read_gml(path, label='id')
         except Exception:
-            G = _load_gml_robust(path)
+            G = load_gml_robust(path)
     elif path.suffix == '.graphml':
         G = nx.read_graphml(path)
     elif path.suffix == '.edgelist':
@@ -88,68 +89,6 @@ def load_graph(graph_path: str) -> nx.Graph:
     return G
 
 
-def _load_gml_robust(filepath: Path) -> nx.Graph:
-    """稳健地加载 GML 文件"""
-    g = nx.Graph()
-    with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-        lines = f.readlines()
-
-    in_node = False
-    in_edge = False
-    node_id = None
-    node_label = None
-    edge_u = None
-    edge_v = None
-
-    for raw in lines:
-        line = raw.strip()
-        if not line:
-            continue
-
-        if line.startswith("node"):
-            in_node = True
-            node_id = None
-            node_label = None
-            continue
-        if line.startswith("edge"):
-            in_edge = True
-            edge_u = None
-            edge_v = None
-            continue
-
-        if line == "]":
-            if in_node and node_id is not None:
-                g.add_node(node_id, label=node_label)
-            if in_edge and edge_u is not None and edge_v is not None:
-                g.add_edge(edge_u, edge_v)
-            in_node = False
-            in_edge = False
-            continue
-
-        if in_node:
-            if line.startswith("id "):
-                try:
-                    node_id = int(line.split()[1])
-                except Exception:
-                    pass
-            elif line.startswith('label "'):
-                if line.endswith('"') and len(line) >= 8:
-                    node_label = line[len('label "'): -1]
-        elif in_edge:
-            if line.startswith("source "):
-                try:
-                    edge_u = int(line.split()[1])
-                except Exception:
-                    pass
-            elif line.startswith("target "):
-                try:
-                    edge_v = int(line.split()[1])
-                except Exception:
-                    pass
-
-    return g
-
-
 def plot_dismant_comparison(
     results: Dict[str, Dict],
     output_path: str,
@@ -10,3 +10,15 @@ network dismantling and construction tasks.
 
 __version__ = "0.1.0"
 __author__ = "Resilience Lab"
+
+import importlib.util
+import os
+
+# huggingface_hub 在导入时读取下列环境变量，所以在包初始化时、任何子模块导入 transformers 之前设置。
+# 默认使用镜像站点（已设置 HF_ENDPOINT 时不覆盖），HF_USE_MIRROR=0 时关闭
+if os.environ.get('HF_USE_MIRROR', '1') == '1':
+    os.environ.setdefault('HF_ENDPOINT', 'https://hf-mirror.com')
+
+# 启用 hf_transfer (Rust 实现的多连接下载器)；未安装时开启该开关会导致下载报错，因此只在已安装时启用
+if importlib.util.find_spec('hf_transfer') is not None:
+    os.environ.setdefault('HF_HUB_ENABLE_HF_TRANSFER', '1')
@@ -10,10 +10,17 @@ from dataclasses import dataclass, field
 from typing import List, Dict, Any, Optional, Tuple, Union
 import numpy as np
 import networkx as nx
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 from pathlib import Path
 import json
 import os
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 @dataclass
 class AttackResult:
@@ -106,6 +113,12 @@ class AttackResult:
         """保存结果到 JSON 文件"""
         filepath = Path(filepath)
         filepath.parent.mkdir(parents=True, exist_ok=True)
+        if orjson is not None:
+            filepath.write_bytes(orjson.dumps(
+                self.to_dict(),
+                option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            ))
+            return
         with open(filepath, 'w', encoding='utf-8') as f:
             json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
     
@@ -138,6 +151,12 @@ class BaseAttack(ABC):
     所有攻击算法都需要继承此类并实现 select_node 方法。
     """
     
+    # 子类实现 select_index_csr 后置 True，attack 传入 adj_csr 时走 CSR 快速路径
+    supports_csr = False
+    # CSR 路径下选点不依赖连通性时可置 True：先跑完整个移除序列，再倒序加回节点、
+    # 用并查集一次算出整条 LCC 曲线，代替每步一次 connected_components
+    use_reverse_unionfind = False
+    
     def __init__(self, name: str = "BaseAttack"):
         """
         初始化攻击算法
@@ -161,6 +180,27 @@ class BaseAttack(ABC):
         """
         pass
     
+    def select_index_csr(
+        self,
+        adj_csr,
+        alive: np.ndarray,
+        degrees: np.ndarray,
+        **kwargs
+    ) -> Optional[int]:
+        """
+        CSR 快速路径下选择下一个要移除的节点下标
+        
+        Args:
+            adj_csr: 初始图的 CSR 邻接矩阵（行顺序与 graph.nodes() 一致，只读）
+            alive: 各节点是否仍在图中的布尔数组
+            degrees: 当前度数数组（已移除节点为 -1）
+            **kwargs: 额外参数
+        
+        Returns:
+            选中节点在 graph.nodes() 中的下标，如果没有可选节点则返回 None
+        """
+        raise NotImplementedError
+    
     def attack(
         self,
         graph: nx.Graph,
@@ -168,6 +208,7 @@ class BaseAttack(ABC):
         dataset_name: str = "unknown",
         graph_name: str = "unknown",
         collapse_threshold: float = 0.2,
+        adj_csr=None,
         **kwargs
     ) -> AttackResult:
         """
@@ -179,15 +220,51 @@ class BaseAttack(ABC):
             dataset_name: 数据集名称
             graph_name: 图名称
             collapse_threshold: 崩溃阈值
+            adj_csr: 可选的 CSR 邻接矩阵（nx.to_scipy_sparse_array(graph, format='csr')），
+                多个算法可共用同一份；子类支持时不再复制和修改 networkx 图
             **kwargs: 传递给 select_node 的额外参数
         
         Returns:
             AttackResult: 攻击结果
         """
+        initial_nodes = graph.number_of_nodes()
+        initial_edges = graph.number_of_edges()
+        
+        if adj_csr is not None and self.supports_csr:
+            attack_sequence, removal_fractions, lcc_values = self._run_attack_csr(
+                graph, adj_csr, budget, **kwargs
+            )
+        else:
+            attack_sequence, removal_fractions, lcc_values = self._run_attack(
+                graph, budget, **kwargs
+            )
+        
+        # 创建结果对象
+        result = AttackResult(
+            algorithm_name=self.name,
+            dataset_name=dataset_name,
+            graph_name=graph_name,
+            attack_sequence=attack_sequence,
+            removal_fractions=removal_fractions,
+            lcc_values=lcc_values,
+            r_res=0.0,  # 稍后计算
+            collapse_threshold=collapse_threshold,
+            initial_nodes=initial_nodes,
+            initial_edges=initial_edges,
+            budget=budget,
+        )
+        
+        # 计算 R_res 和崩溃点
+        result.r_res = result.compute_r_res()
+        result.collapse_fraction = result.find_collapse_point(collapse_threshold)
+        
+        return result
+    
+    def _run_attack(self, graph: nx.Graph, budget: int, **kwargs) -> Tuple[List[Any], List[float], List[float]]:
+        """在图副本上逐步移除节点，返回 (攻击序列, 移除比例序列, LCC 序列)"""
         # 复制图以避免修改原图
         g = graph.copy()
         initial_nodes = g.number_of_nodes()
-        initial_edges = g.number_of_edges()
         
         # 初始化记录
         attack_sequence = []
@@ -215,26 +292,138 @@ class BaseAttack(ABC):
             lcc_ratio = self._compute_lcc_ratio(g, initial_nodes)
             lcc_values.append(lcc_ratio)
         
-        # 创建结果对象
-        result = AttackResult(
-            algorithm_name=self.name,
-            dataset_name=dataset_name,
-            graph_name=graph_name,
-            attack_sequence=attack_sequence,
-            removal_fractions=removal_fractions,
-            lcc_values=lcc_values,
-            r_res=0.0,  # 稍后计算
-            collapse_threshold=collapse_threshold,
-            initial_nodes=initial_nodes,
-            initial_edges=initial_edges,
-            budget=budget,
+        return attack_sequence, removal_fractions, lcc_values
+    
+    def _run_attack_csr(self, graph: nx.Graph, adj_csr, budget: int, **kwargs) -> Tuple[List[Any], List[float], List[float]]:
+        """
+        CSR 快速路径：用存活掩码和度数数组代替复制、修改 networkx 图
+        
+        移除节点时只对其邻居的度数减一；LCC 由 scipy 的 connected_components 在
+        两端都存活的边上计算，已移除节点成为孤立点且不计入。
+        use_reverse_unionfind 为 True 时循环中不算 LCC，结束后由 _lcc_curve_reverse_unionfind 一次算出。
+        """
+        nodes = list(graph.nodes())
+        initial_nodes = len(nodes)
+        indptr, indices = adj_csr.indptr, adj_csr.indices
+        
+        # networkx 的度数把自环计为 2，CSR 对角线上只有一个非零元
+        degrees = np.diff(indptr).astype(np.int64)
+        degrees += adj_csr.diagonal() != 0
+        alive = np.ones(initial_nodes, dtype=bool)
+        rows = np.repeat(np.arange(initial_nodes), np.diff(indptr))
+        
+        reverse = self.use_reverse_unionfind
+        attack_sequence = []
+        removed_indices = []
+        removal_fractions = [0.0]
+        lcc_values = [] if reverse else [self._compute_lcc_ratio_csr(rows, indices, alive, initial_nodes)]
+        
+        for step in range(budget):
+            if len(attack_sequence) == initial_nodes:
+                break
+            
+            idx = self.select_index_csr(adj_csr, alive, degrees, **kwargs)
+            if idx is None:
+                break
+            
+            # 移除节点：存活邻居度数减一，自身度数置为 -1
+            neighbors = indices[indptr[idx]:indptr[idx + 1]]
+            neighbors = neighbors[alive[neighbors] & (neighbors != idx)]
+            degrees[neighbors] -= 1
+            degrees[idx] = -1
+            alive[idx] = False
+            attack_sequence.append(nodes[idx])
+            removed_indices.append(idx)
+            
+            removal_fractions.append(len(attack_sequence) / initial_nodes)
+            if not reverse:
+                lcc_values.append(self._compute_lcc_ratio_csr(rows, indices, alive, initial_nodes))
+        
+        if reverse:
+            lcc_values = self._lcc_curve_reverse_unionfind(rows, indices, indptr, alive, removed_indices, initial_nodes)
+        
+        return attack_sequence, removal_fractions, lcc_values
+    
+    @staticmethod
+    def _lcc_curve_reverse_unionfind(
+        rows: np.ndarray,
+        cols: np.ndarray,
+        indptr: np.ndarray,
+        alive: np.ndarray,
+        removed_indices: List[int],
+        initial_nodes: int
+    ) -> List[float]:
+        """
+        倒序加回被移除的节点，用并查集得到每一步的 LCC 比例
+        
+        残余图（alive）的连通分量只用 connected_components 算一次作为并查集初值，
+        之后每加回一个节点只合并它与已存在邻居的边，LCC 只会变大，维护最大值即可。
+        返回值与逐步调用 _compute_lcc_ratio_csr 相同（含移除前的初始点）。
+        """
+        if initial_nodes == 0:
+            return [0.0]
+        
+        keep = alive[rows] & alive[cols]
+        sub = coo_matrix(
+            (np.ones(int(keep.sum()), dtype=np.int8), (rows[keep], cols[keep])),
+            shape=(initial_nodes, initial_nodes)
         )
+        _, labels = connected_components(sub, directed=False)
         
-        # 计算 R_res 和崩溃点
-        result.r_res = result.compute_r_res()
-        result.collapse_fraction = result.find_collapse_point(collapse_threshold)
+        # 每个分量以其第一个节点为根
+        _, first = np.unique(labels, return_index=True)
+        parent = first[labels].tolist()
+        size = [0] * initial_nodes
+        for root, count in zip(first.tolist(), np.bincount(labels[alive], minlength=len(first)).tolist()):
+            size[root] = count
         
-        return result
+        present = alive.tolist()
+        neighbor_list = cols.tolist()
+        bounds = indptr.tolist()
+        
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+        
+        largest = max(size) if size else 0
+        lcc_sizes = [largest]
+        for idx in reversed(removed_indices):
+            present[idx] = True
+            parent[idx] = idx
+            size[idx] = 1
+            largest = max(largest, 1)
+            for j in neighbor_list[bounds[idx]:bounds[idx + 1]]:
+                if not present[j] or j == idx:
+                    continue
+                ri, rj = find(idx), find(j)
+                if ri == rj:
+                    continue
+                if size[ri] < size[rj]:
+                    ri, rj = rj, ri
+                parent[rj] = ri
+                size[ri] += size[rj]
+                if size[ri] > largest:
+                    largest = size[ri]
+            lcc_sizes.append(largest)
+        
+        lcc_sizes.reverse()
+        return [lcc_size / initial_nodes for lcc_size in lcc_sizes]
+    
+    @staticmethod
+    def _compute_lcc_ratio_csr(rows: np.ndarray, cols: np.ndarray, alive: np.ndarray, initial_nodes: int) -> float:
+        """在存活节点诱导子图上计算 LCC 比例 (相对于初始节点数)"""
+        if not alive.any():
+            return 0.0
+        
+        keep = alive[rows] & alive[cols]
+        sub = coo_matrix(
+            (np.ones(int(keep.sum()), dtype=np.int8), (rows[keep], cols[keep])),
+            shape=(initial_nodes, initial_nodes)
+        )
+        _, labels = connected_components(sub, directed=False)
+        return int(np.bincount(labels[alive]).max()) / initial_nodes
     
     def _compute_lcc_ratio(self, graph: nx.Graph, initial_nodes: int) -> float:
         """
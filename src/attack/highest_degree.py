@@ -12,6 +12,7 @@ Highest Degree Attack (HDA)
 """
 
 from typing import Optional, Any, List
+import numpy as np
 import networkx as nx
 from .base import BaseAttack
 
@@ -33,7 +34,9 @@ class HighestDegreeAttack(BaseAttack):
     - recalculate=False: 使用初始度数排序 (一次性计算)
     """
     
-    def __init__(self, recalculate: bool = True):
+    supports_csr = True
+    
+    def __init__(self, recalculate: bool = True, use_reverse_unionfind: bool = False):
         """
         初始化高度数攻击算法
         
@@ -41,10 +44,15 @@ class HighestDegreeAttack(BaseAttack):
             recalculate: 是否每步重新计算度数
                 - True: 自适应攻击，每步选择当前最高度数节点
                 - False: 静态攻击，按初始度数排序
+            use_reverse_unionfind: 传入 adj_csr 时，是否先求出整个移除序列再倒序用并查集计算 LCC 曲线
+                （度数选点不依赖连通性，结果与逐步计算一致）
         """
         super().__init__(name="HighestDegreeAttack" if recalculate else "HighestDegreeAttack_Static")
         self.recalculate = recalculate
+        self.use_reverse_unionfind = use_reverse_unionfind
         self._initial_ranking = None
+        self._initial_ranking_idx = None
+        self._ranking_pos = 0
     
     def select_node(self, graph: nx.Graph, **kwargs) -> Optional[Any]:
         """
@@ -79,6 +87,33 @@ class HighestDegreeAttack(BaseAttack):
                     return node
             return None
     
+    def select_index_csr(
+        self,
+        adj_csr,
+        alive: np.ndarray,
+        degrees: np.ndarray,
+        **kwargs
+    ) -> Optional[int]:
+        """
+        CSR 快速路径：在度数数组上选择度数最高的节点下标
+        
+        argmax 取第一个最大值，与 select_node 按节点顺序取第一个最大度数节点一致。
+        """
+        if not alive.any():
+            return None
+        
+        if self.recalculate:
+            return int(np.argmax(degrees))
+        
+        # 静态攻击：沿初始排序跳过已移除的节点
+        ranking = self._initial_ranking_idx
+        while self._ranking_pos < len(ranking):
+            idx = int(ranking[self._ranking_pos])
+            if alive[idx]:
+                return idx
+            self._ranking_pos += 1
+        return None
+    
     def attack(
         self,
         graph: nx.Graph,
@@ -86,6 +121,7 @@ class HighestDegreeAttack(BaseAttack):
         dataset_name: str = "unknown",
         graph_name: str = "unknown",
         collapse_threshold: float = 0.2,
+        adj_csr=None,
         **kwargs
     ):
         """
@@ -93,7 +129,12 @@ class HighestDegreeAttack(BaseAttack):
         
         如果使用静态模式，先计算初始度数排序。
         """
-        if not self.recalculate:
+        if not self.recalculate and adj_csr is not None:
+            # 稳定排序，度数相同时保持节点顺序（与 sorted(..., reverse=True) 一致）
+            degrees = np.diff(adj_csr.indptr) + (adj_csr.diagonal() != 0)
+            self._initial_ranking_idx = np.argsort(-degrees, kind="stable")
+            self._ranking_pos = 0
+        elif not self.recalculate:
             # 预计算初始度数排序
             degrees = dict(graph.degree())
             self._initial_ranking = sorted(
@@ -108,6 +149,7 @@ class HighestDegreeAttack(BaseAttack):
             dataset_name=dataset_name,
             graph_name=graph_name,
             collapse_threshold=collapse_threshold,
+            adj_csr=adj_csr,
             **kwargs
         )
 
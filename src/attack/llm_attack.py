@@ -17,6 +17,7 @@ from pathlib import Path
 
 from .base import BaseAttack
 from src.model.fusion_llm import ResilienceLLM, ModelConfig
+from src.model.checkpoint import load_checkpoint_state
 from src.env.simulator import NetworkEnvironment, TaskType
 from src.data.ocg_builder import OCGExtractor
 
@@ -41,7 +42,8 @@ class LLMAttack(BaseAttack):
         checkpoint_path: str,
         config_path: str = "configs/default.yaml",
         device: str = "cuda",
-        name: str = "LLMAttack"
+        name: str = "LLMAttack",
+        use_cuda_graph: bool = False
     ):
         """
         初始化 LLM 攻击算法
@@ -51,6 +53,8 @@ class LLMAttack(BaseAttack):
             config_path: 配置文件路径
             device: 设备 (cuda/cpu)
             name: 算法名称
+            use_cuda_graph: 是否用 CUDA Graph 捕获单步打分前向（输入已填充到固定长度，
+                每步只需拷贝输入并 replay，省去大量小 kernel 的 Python 启动开销）
         """
         super().__init__(name=name)
         self.checkpoint_path = checkpoint_path
@@ -62,6 +66,11 @@ class LLMAttack(BaseAttack):
         self._ocg_extractor = None
         self._env = None
         self._config = None
+        
+        # CUDA Graph 缓存：(batch, seq_len, num_candidates) -> (graph, 静态输入, 静态输出)
+        self.use_cuda_graph = use_cuda_graph and str(device).startswith("cuda") and torch.cuda.is_available()
+        self._cuda_graphs = {}
+        self._graph_pool = None
     
     def _load_model(self):
         """延迟加载模型和相关组件"""
@@ -105,28 +114,28 @@ class LLMAttack(BaseAttack):
             )
             if epoch_dirs:
                 latest_epoch_dir = epoch_dirs[0]
-                checkpoint_file = latest_epoch_dir / "model.pt"
-                if checkpoint_file.exists():
-                    checkpoint = torch.load(checkpoint_file, map_location=self.device)
-                else:
-                    raise FileNotFoundError(f"在 {latest_epoch_dir} 中未找到 model.pt")
+                checkpoint_file = latest_epoch_dir / "model.safetensors"
+                if not checkpoint_file.exists():
+                    checkpoint_file = latest_epoch_dir / "model.pt"
+                if not checkpoint_file.exists():
+                    raise FileNotFoundError(f"在 {latest_epoch_dir} 中未找到 model.safetensors 或 model.pt")
             else:
-                checkpoint_files = list(checkpoint_path_obj.glob("*.pt")) + list(checkpoint_path_obj.glob("*.pth"))
+                checkpoint_files = (
+                    list(checkpoint_path_obj.glob("*.safetensors"))
+                    + list(checkpoint_path_obj.glob("*.pt"))
+                    + list(checkpoint_path_obj.glob("*.pth"))
+                )
                 if checkpoint_files:
                     checkpoint_file = max(checkpoint_files, key=lambda p: p.stat().st_mtime)
-                    checkpoint = torch.load(checkpoint_file, map_location=self.device)
                 else:
                     raise FileNotFoundError(f"在 {checkpoint_path_obj} 中未找到模型文件")
         elif checkpoint_path_obj.is_file():
-            checkpoint = torch.load(checkpoint_path_obj, map_location=self.device)
+            checkpoint_file = checkpoint_path_obj
         else:
             raise FileNotFoundError(f"检查点路径不存在: {self.checkpoint_path}")
         
         # 加载模型权重
-        if 'model_state_dict' in checkpoint:
-            self._model.load_state_dict(checkpoint['model_state_dict'], strict=False)
-        else:
-            self._model.load_state_dict(checkpoint, strict=False)
+        self._model.load_state_dict(load_checkpoint_state(checkpoint_file, self.device), strict=False)
         
         self._model.eval()
         
@@ -186,37 +195,33 @@ class LLMAttack(BaseAttack):
         # 构建输入文本
         input_text = ocg_data.user_prompt
         
-        # Tokenize
+        # Tokenize：单条输入不做 padding，前向只处理真实长度；
+        # CUDA Graph 需要固定形状，此时仍填充到 1024
         inputs = self._model.tokenizer(
             input_text,
             max_length=1024,
-            padding="max_length",
+            padding="max_length" if self.use_cuda_graph else False,
             truncation=True,
             return_tensors="pt"
         )
         input_ids = inputs["input_ids"].to(self.device)
         attention_mask = inputs["attention_mask"].to(self.device)
         
-        # 获取候选操作位置索引
+        # 获取候选操作位置索引（最后 num_candidates 个有效 token，与训练一致）
         num_candidates = len(candidate_nodes)
-        seq_len = input_ids.shape[1]
+        valid_len = int(inputs["attention_mask"][0].sum())
         candidate_indices = torch.tensor(
-            [[seq_len - num_candidates + j for j in range(num_candidates)]],
+            [[max(0, valid_len - num_candidates + j) for j in range(num_candidates)]],
             device=self.device,
             dtype=torch.long
         )
         
         # 模型推理
         with torch.no_grad():
-            outputs = self._model(
-                input_ids=input_ids,
-                attention_mask=attention_mask,
-                candidate_indices=candidate_indices,
-                return_scores=True
-            )
+            scores = self._score_candidates(input_ids, attention_mask, candidate_indices)
             
-            if "scores" in outputs and outputs["scores"] is not None:
-                scores = outputs["scores"][0]  # [num_candidates]
+            if scores is not None:
+                scores = scores[0]  # [num_candidates]
                 # 选择分数最高的候选
                 best_idx = torch.argmax(scores).item()
                 selected_node = candidate_nodes[best_idx]
@@ -226,6 +231,80 @@ class LLMAttack(BaseAttack):
                 import random
                 return random.choice(candidate_nodes)
     
+    def _score_candidates(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: torch.Tensor,
+        candidate_indices: torch.Tensor
+    ) -> Optional[torch.Tensor]:
+        """
+        计算候选分数 [batch_size, num_candidates]，模型未返回分数时为 None
+        
+        启用 CUDA Graph 时，每种输入形状第一次出现先热身再捕获，之后只拷贝输入并 replay；
+        捕获失败（例如前向中存在主机同步）时退回普通前向。
+        """
+        if self.use_cuda_graph:
+            key = (*input_ids.shape, candidate_indices.shape[1])
+            entry = self._cuda_graphs.get(key)
+            if entry is None:
+                try:
+                    entry = self._capture_cuda_graph(input_ids, attention_mask, candidate_indices)
+                except RuntimeError as e:
+                    print(f"⚠️ CUDA Graph 捕获失败，退回普通前向: {e}")
+                    self.use_cuda_graph = False
+                    self._cuda_graphs.clear()
+                else:
+                    self._cuda_graphs[key] = entry
+            if entry is not None:
+                graph, static_inputs, static_scores = entry
+                static_inputs[0].copy_(input_ids, non_blocking=True)
+                static_inputs[1].copy_(attention_mask, non_blocking=True)
+                static_inputs[2].copy_(candidate_indices, non_blocking=True)
+                graph.replay()
+                return static_scores
+        
+        outputs = self._model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            candidate_indices=candidate_indices,
+            return_scores=True
+        )
+        return outputs.get("scores")
+    
+    def _capture_cuda_graph(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: torch.Tensor,
+        candidate_indices: torch.Tensor
+    ):
+        """为当前输入形状热身并捕获 CUDA Graph，返回 (graph, 静态输入, 静态分数)"""
+        static_inputs = (input_ids.clone(), attention_mask.clone(), candidate_indices.clone())
+        
+        def run():
+            return self._model(
+                input_ids=static_inputs[0],
+                attention_mask=static_inputs[1],
+                candidate_indices=static_inputs[2],
+                return_scores=True
+            ).get("scores")
+        
+        # 在旁路 stream 上热身两次（cuBLAS 句柄、autotune 等惰性初始化不能发生在捕获期间）
+        warmup_stream = torch.cuda.Stream()
+        warmup_stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(warmup_stream):
+            for _ in range(2):
+                if run() is None:
+                    raise RuntimeError("模型未返回 scores")
+        torch.cuda.current_stream().wait_stream(warmup_stream)
+        
+        # 不同形状的图共用同一个显存池
+        if self._graph_pool is None:
+            self._graph_pool = torch.cuda.graph_pool_handle()
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph, pool=self._graph_pool):
+            static_scores = run()
+        return graph, static_inputs, static_scores
+    
     def attack(
         self,
         graph: nx.Graph,
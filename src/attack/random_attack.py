@@ -12,9 +12,36 @@ Random Attack
 """
 
 from typing import Optional, Any, List
+from concurrent.futures import ProcessPoolExecutor
 import random
+import numpy as np
 import networkx as nx
-from .base import BaseAttack
+from .base import BaseAttack, AttackResult
+
+
+# 并行多次运行时，每个工作进程只接收一次图（通过 initializer），而不是每个任务都序列化一遍
+_WORKER_GRAPH: Optional[nx.Graph] = None
+_WORKER_ADJ_CSR = None
+
+
+def _init_worker(graph: nx.Graph, adj_csr=None) -> None:
+    global _WORKER_GRAPH, _WORKER_ADJ_CSR
+    _WORKER_GRAPH = graph
+    _WORKER_ADJ_CSR = adj_csr
+
+
+def _run_in_worker(seed: int, budget: int, dataset_name: str, graph_name: str,
+                   collapse_threshold: float, kwargs: dict) -> AttackResult:
+    """工作进程中以给定种子执行一次随机攻击"""
+    return RandomAttack(seed=seed).attack(
+        graph=_WORKER_GRAPH,
+        budget=budget,
+        dataset_name=dataset_name,
+        graph_name=graph_name,
+        collapse_threshold=collapse_threshold,
+        adj_csr=_WORKER_ADJ_CSR,
+        **kwargs
+    )
 
 
 class RandomAttack(BaseAttack):
@@ -35,6 +62,8 @@ class RandomAttack(BaseAttack):
     - num_runs: 运行次数（用于取平均）
     """
     
+    supports_csr = True
+    
     def __init__(self, seed: Optional[int] = None):
         """
         初始化随机攻击算法
@@ -62,6 +91,17 @@ class RandomAttack(BaseAttack):
         nodes = list(graph.nodes())
         return self._rng.choice(nodes)
     
+    def select_index_csr(self, adj_csr, alive: np.ndarray, degrees: np.ndarray, **kwargs) -> Optional[int]:
+        """
+        CSR 快速路径：在存活节点下标中随机选择
+        
+        存活下标按节点顺序排列，与 select_node 使用同一随机数序列，结果一致。
+        """
+        alive_idx = np.flatnonzero(alive)
+        if len(alive_idx) == 0:
+            return None
+        return int(self._rng.choice(alive_idx))
+    
     def set_seed(self, seed: int) -> None:
         """
         设置随机种子
@@ -80,6 +120,8 @@ class RandomAttack(BaseAttack):
         dataset_name: str = "unknown",
         graph_name: str = "unknown",
         collapse_threshold: float = 0.2,
+        max_workers: int = 1,
+        adj_csr=None,
         **kwargs
     ) -> dict:
         """
@@ -92,6 +134,8 @@ class RandomAttack(BaseAttack):
             dataset_name: 数据集名称
             graph_name: 图名称
             collapse_threshold: 崩溃阈值
+            max_workers: 并行进程数（各次运行相互独立，>1 时用进程池并行；结果与串行一致）
+            adj_csr: 可选的 CSR 邻接矩阵，各次运行共用（并行时随图一起只发送一次）
         
         Returns:
             dict: 包含平均结果和所有运行结果的字典
@@ -103,20 +147,41 @@ class RandomAttack(BaseAttack):
         all_r_res = []
         all_collapse_fractions = []
         
-        for run_idx in range(num_runs):
-            # 设置不同的种子
-            self.set_seed(self.seed + run_idx if self.seed else run_idx)
-            
-            # 执行攻击
-            result = self.attack(
-                graph=graph,
-                budget=budget,
-                dataset_name=dataset_name,
-                graph_name=f"{graph_name}_run{run_idx}",
-                collapse_threshold=collapse_threshold,
-                **kwargs
-            )
-            
+        # 每次运行使用不同的种子
+        seeds = [self.seed + run_idx if self.seed else run_idx for run_idx in range(num_runs)]
+        run_names = [f"{graph_name}_run{run_idx}" for run_idx in range(num_runs)]
+        
+        if max_workers > 1 and num_runs > 1:
+            with ProcessPoolExecutor(
+                max_workers=min(max_workers, num_runs),
+                initializer=_init_worker,
+                initargs=(graph, adj_csr)
+            ) as executor:
+                run_results = list(executor.map(
+                    _run_in_worker,
+                    seeds,
+                    [budget] * num_runs,
+                    [dataset_name] * num_runs,
+                    run_names,
+                    [collapse_threshold] * num_runs,
+                    [kwargs] * num_runs,
+                ))
+        else:
+            run_results = []
+            for seed, run_name in zip(seeds, run_names):
+                self.set_seed(seed)
+                # 执行攻击
+                run_results.append(self.attack(
+                    graph=graph,
+                    budget=budget,
+                    dataset_name=dataset_name,
+                    graph_name=run_name,
+                    collapse_threshold=collapse_threshold,
+                    adj_csr=adj_csr,
+                    **kwargs
+                ))
+        
+        for result in run_results:
             all_results.append(result)
             all_lcc_curves.append(result.lcc_values)
             all_r_res.append(result.r_res)
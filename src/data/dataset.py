@@ -91,7 +91,8 @@ class ResilienceDataset(Dataset):
         max_length: int = 2048,
         task_filter: Optional[str] = None,
         transform: Optional[Callable] = None,
-        cache_tokenization: bool = True
+        cache_tokenization: bool = True,
+        tokenization_cache_path: Optional[Union[str, Path]] = None
     ):
         """
         初始化数据集
@@ -103,6 +104,7 @@ class ResilienceDataset(Dataset):
             task_filter: 任务类型过滤 ("dismantle", "construct", None)
             transform: 数据变换函数
             cache_tokenization: 是否缓存分词结果
+            tokenization_cache_path: 分词结果的磁盘缓存文件；存在时直接加载，跳过分词
         """
         self.data_path = data_path
         self.tokenizer = tokenizer
@@ -117,6 +119,10 @@ class ResilienceDataset(Dataset):
         
         # 分词缓存
         self._tokenization_cache: Dict[str, Dict] = {}
+        self.tokenization_cache_path = Path(tokenization_cache_path) if tokenization_cache_path else None
+        if self.tokenization_cache_path is not None and self.tokenization_cache_path.exists():
+            self._tokenization_cache = torch.load(self.tokenization_cache_path, map_location="cpu", weights_only=True)
+            print(f"Loaded tokenization cache: {self.tokenization_cache_path}")
     
     def _load_data(self) -> None:
         """加载数据文件"""
@@ -332,6 +338,25 @@ class ResilienceDataset(Dataset):
         
         return result
     
+    def pretokenize(self) -> None:
+        """对所有样本分词并写入缓存（已缓存的样本跳过）"""
+        if self.tokenizer is None:
+            return
+        for sample in self.samples:
+            if sample.sample_id not in self._tokenization_cache:
+                self._tokenize(sample.sample_id, self._build_input_text(sample), sample.assistant_response)
+    
+    def save_tokenization_cache(self, path: Optional[Union[str, Path]] = None) -> Path:
+        """把分词缓存写到磁盘，下次构建数据集时通过 tokenization_cache_path 直接加载"""
+        path = Path(path) if path is not None else self.tokenization_cache_path
+        if path is None:
+            raise ValueError("No tokenization cache path given")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        torch.save(self._tokenization_cache, tmp_path)
+        tmp_path.replace(path)
+        return path
+    
     def get_sample_by_id(self, sample_id: str) -> Optional[DataSample]:
         """根据 ID 获取样本"""
         for sample in self.samples:
@@ -587,6 +612,7 @@ def create_dataloader(
     batch_size: int = 8,
     shuffle: bool = True,
     num_workers: int = None,  # None = 自动检测
+    pin_memory: bool = None,  # None = 沿用默认策略
     **kwargs
 ) -> DataLoader:
     """
@@ -598,6 +624,8 @@ def create_dataloader(
         batch_size: 批大小
         shuffle: 是否打乱
         num_workers: 工作进程数 (None=自动, Windows默认0, Linux默认4)
+        pin_memory: 是否使用锁页内存 (None=仅在 num_workers 为 0 时开启)；
+            配合 .to(device, non_blocking=True) 可让 H2D 拷贝与计算重叠
         **kwargs: 传递给 Dataset 的其他参数
     
     Returns:
@@ -621,13 +649,16 @@ def create_dataloader(
         else:
             num_workers = min(4, os.cpu_count() or 1)
     
+    if pin_memory is None:
+        pin_memory = True if num_workers == 0 else False  # Windows 下 pin_memory 也可能有问题
+    
     return DataLoader(
         dataset,
         batch_size=batch_size,
         shuffle=shuffle,
         num_workers=num_workers,
         collate_fn=collator,
-        pin_memory=True if num_workers == 0 else False  # Windows 下 pin_memory 也可能有问题
+        pin_memory=pin_memory
     )
 
 
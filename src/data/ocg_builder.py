@@ -10,12 +10,18 @@ OCGExtractor: 操作中心图 (Operation-Centric Graph) 提取器
 4. 生成结构化的 Prompt 文本
 """
 
-from typing import Dict, List, Tuple, Optional, Union, Any
+from typing import Dict, List, Tuple, Optional, Union, Any, Hashable
 from dataclasses import dataclass, field
+from collections import OrderedDict
 import json
 import networkx as nx
 import numpy as np
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 @dataclass
 class NodeFeature:
@@ -67,7 +73,8 @@ class OCGExtractor:
         hop_distance: int = 1,
         max_neighbors_display: int = 5,
         degree_thresholds: Tuple[int, int] = (3, 8),
-        language: str = "zh"
+        language: str = "zh",
+        cache_size: int = 32
     ):
         """
         初始化 OCG 提取器
@@ -80,11 +87,14 @@ class OCGExtractor:
                 - degree >= high_threshold: "高"
                 - otherwise: "中"
             language: 输出语言 ("zh" 中文, "en" 英文)
+            cache_size: extract_ocg 按 cache_key 缓存的最近结果数 (LRU)
         """
         self.hop_distance = hop_distance
         self.max_neighbors_display = max_neighbors_display
         self.degree_thresholds = degree_thresholds
         self.language = language
+        self.cache_size = cache_size
+        self._ocg_cache: "OrderedDict[Hashable, OCGData]" = OrderedDict()
         
         # Prompt 模板
         self._init_prompt_templates()
@@ -174,7 +184,10 @@ class OCGExtractor:
         self, 
         graph: nx.Graph, 
         node_id: Union[int, str],
-        node_semantics: Optional[Dict[Union[int, str], str]] = None
+        node_semantics: Optional[Dict[Union[int, str], str]] = None,
+        degree_map: Optional[Dict[Union[int, str], int]] = None,
+        articulation_set: Optional[set] = None,
+        betweenness: Optional[Dict[Union[int, str], float]] = None
     ) -> NodeFeature:
         """
         提取单个节点的完整特征
@@ -183,6 +196,9 @@ class OCGExtractor:
             graph: NetworkX 图
             node_id: 目标节点 ID
             node_semantics: 节点语义描述字典
+            degree_map: 预先统计的 {节点: 度数}，未提供时查询 graph
+            articulation_set: 预先计算的割点集合，未提供时在此计算
+            betweenness: 预先计算的中介中心性字典，未提供时在此计算
         
         Returns:
             NodeFeature: 节点特征数据
@@ -191,7 +207,7 @@ class OCGExtractor:
             raise ValueError(f"Node {node_id} not in graph")
         
         # 基础结构特征
-        degree = graph.degree(node_id)
+        degree = degree_map[node_id] if degree_map is not None else graph.degree(node_id)
         clustering = nx.clustering(graph, node_id)
         
         # 度数等级
@@ -212,15 +228,14 @@ class OCGExtractor:
                 neighbor_descriptions.append(desc)
         
         # 中介中心性 (可能较慢，大图中考虑采样)
-        try:
-            betweenness = nx.betweenness_centrality(graph).get(node_id, 0.0)
-        except Exception:
-            betweenness = 0.0
+        if betweenness is None:
+            betweenness = self._compute_betweenness(graph)
+        node_betweenness = betweenness.get(node_id, 0.0)
         
         # 检查是否是割点 (关节点)
-        articulation_points = set(nx.articulation_points(graph)) \
-            if nx.is_connected(graph) else set()
-        is_articulation = node_id in articulation_points
+        if articulation_set is None:
+            articulation_set = self._compute_articulation_set(graph)
+        is_articulation = node_id in articulation_set
         
         # 语义描述
         semantic = ""
@@ -232,7 +247,7 @@ class OCGExtractor:
             degree=degree,
             degree_level=degree_level,
             clustering_coeff=clustering,
-            betweenness_centrality=betweenness,
+            betweenness_centrality=node_betweenness,
             neighbors=neighbors,
             neighbor_descriptions=neighbor_descriptions,
             semantic_description=semantic,
@@ -240,6 +255,19 @@ class OCGExtractor:
             community_role=""  # TODO: 社区检测
         )
     
+    @staticmethod
+    def _compute_betweenness(graph: nx.Graph) -> Dict[Union[int, str], float]:
+        """全图中介中心性，失败时返回空字典（各节点按 0.0 处理）"""
+        try:
+            return nx.betweenness_centrality(graph)
+        except Exception:
+            return {}
+    
+    @staticmethod
+    def _compute_articulation_set(graph: nx.Graph) -> set:
+        """割点集合（图不连通时为空集）"""
+        return set(nx.articulation_points(graph)) if nx.is_connected(graph) else set()
+    
     def extract_ocg(
         self,
         graph: nx.Graph,
@@ -247,7 +275,10 @@ class OCGExtractor:
         task_type: str,
         current_step: int,
         total_steps: int,
-        node_semantics: Optional[Dict[Union[int, str], str]] = None
+        node_semantics: Optional[Dict[Union[int, str], str]] = None,
+        degree_map: Optional[Dict[Union[int, str], int]] = None,
+        articulation_set: Optional[set] = None,
+        cache_key: Optional[Hashable] = None
     ) -> OCGData:
         """
         提取操作中心图数据
@@ -261,15 +292,34 @@ class OCGExtractor:
             current_step: 当前步骤
             total_steps: 总步骤数
             node_semantics: 节点语义描述字典
+            degree_map: 调用方已统计的 {节点: 度数}（可选）
+            articulation_set: 调用方已计算的割点集合（可选）
+            cache_key: 缓存键（可选）。调用方需保证键能唯一确定图状态与其余参数，
+                例如 (env.graph_version, tuple(candidates), ...)；命中时直接返回之前的结果
         
         Returns:
             OCGData: 操作中心图数据
         """
-        # 提取候选节点特征
+        if cache_key is not None:
+            cached = self._ocg_cache.get(cache_key)
+            if cached is not None:
+                self._ocg_cache.move_to_end(cache_key)
+                return cached
+        
+        # 提取候选节点特征；全图的中介中心性和割点每次调用只算一次，各候选共用
         candidate_features = []
-        for node in candidate_nodes:
-            if node in graph:
-                feature = self.extract_node_features(graph, node, node_semantics)
+        present = [node for node in candidate_nodes if node in graph]
+        if present:
+            betweenness = self._compute_betweenness(graph)
+            if articulation_set is None:
+                articulation_set = self._compute_articulation_set(graph)
+            for node in present:
+                feature = self.extract_node_features(
+                    graph, node, node_semantics,
+                    degree_map=degree_map,
+                    articulation_set=articulation_set,
+                    betweenness=betweenness
+                )
                 candidate_features.append(feature)
         
         # 生成操作列表
@@ -308,7 +358,7 @@ class OCGExtractor:
             "num_candidates": len(candidate_nodes)
         }
         
-        return OCGData(
+        ocg_data = OCGData(
             task_type=task_type,
             current_step=current_step,
             total_steps=total_steps,
@@ -318,6 +368,12 @@ class OCGExtractor:
             user_prompt=user_prompt,
             graph_summary=graph_summary
         )
+        
+        if cache_key is not None and self.cache_size > 0:
+            self._ocg_cache[cache_key] = ocg_data
+            if len(self._ocg_cache) > self.cache_size:
+                self._ocg_cache.popitem(last=False)
+        return ocg_data
     
     def _build_user_prompt(
         self,
@@ -429,7 +485,11 @@ class OCGExtractor:
             "best_action": ground_truth_ranking[0] if ground_truth_ranking else ""
         }
         
-        assistant_content = f"```json\n{json.dumps(response, ensure_ascii=False, indent=2)}\n```"
+        if orjson is not None:
+            response_json = orjson.dumps(response, option=orjson.OPT_INDENT_2).decode("utf-8")
+        else:
+            response_json = json.dumps(response, ensure_ascii=False, indent=2)
+        assistant_content = f"```json\n{response_json}\n```"
         
         return {
             "id": f"train_{ocg_data.task_type}_{ocg_data.current_step:03d}",
@@ -6,5 +6,6 @@ Environment module for network simulation and resilience computation.
 
 from .simulator import NetworkEnvironment
 from .metrics import ResilienceMetrics
+from .gml import load_gml_robust
 
-__all__ = ["NetworkEnvironment", "ResilienceMetrics"]
+__all__ = ["NetworkEnvironment", "ResilienceMetrics", "load_gml_robust"]
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+GML 文件的稳健加载
+
+networkx.read_gml 遇到重复或缺失的 label 会报错；评估脚本在这种情况下退回 load_gml_robust，
+以 id 作为节点标识符、label 作为节点属性。
+"""
+
+import re
+from pathlib import Path
+from typing import Optional, Union
+
+import networkx as nx
+
+
+# GML 扫描用的预编译正则（在字节上匹配）
+# 快速路径：标准格式的块 node [ id N label "x" ] / edge [ source U target V ]，一次 findall 取出全部
+_GML_NODE_FAST_RE = re.compile(rb'\bnode\s*\[\s*id\s+(-?\d+)\s+(?:label\s+("[^"\n]*")\s*)?\]')
+_GML_EDGE_FAST_RE = re.compile(rb'\bedge\s*\[\s*source\s+(-?\d+)\s+target\s+(-?\d+)\s*\]')
+# 通用路径：任意属性顺序，块内允许一层嵌套（如 graphics [ ... ]）
+_GML_NODE_RE = re.compile(rb'\bnode\s*\[((?:[^\[\]]+|\[[^\[\]]*\])*)\]')
+_GML_EDGE_RE = re.compile(rb'\bedge\s*\[((?:[^\[\]]+|\[[^\[\]]*\])*)\]')
+_GML_ID_RE = re.compile(rb'^\s*id\s+(-?\d+)\s*$', re.M)
+_GML_LABEL_RE = re.compile(rb'^\s*label\s+("[^"\n]*")\s*$', re.M)
+_GML_SOURCE_RE = re.compile(rb'^\s*source\s+(-?\d+)\s*$', re.M)
+_GML_TARGET_RE = re.compile(rb'^\s*target\s+(-?\d+)\s*$', re.M)
+
+
+def _decode_gml_label(quoted: bytes) -> Optional[str]:
+    """b'"xxx"' -> 'xxx'；没有 label 时为 None"""
+    return quoted[1:-1].decode("utf-8", errors="ignore") if quoted else None
+
+
+def load_gml_robust(filepath: Union[str, Path]) -> nx.Graph:
+    """
+    稳健地加载 GML 文件，处理重复标签问题
+    
+    使用 id 作为节点标识符，而不是 label。
+    整个文件按字节读入，用预编译正则在 C 层扫描 node/edge 块，再批量加入图中；
+    标准格式的文件走一次 findall 的快速路径，匹配数与关键字出现次数不一致时退回逐块解析。
+    """
+    g = nx.Graph()
+    with open(filepath, "rb") as f:
+        data = f.read()
+    
+    # 使用 id 作为节点标识符，label 作为属性
+    fast_nodes = _GML_NODE_FAST_RE.findall(data)
+    if len(fast_nodes) == data.count(b"node"):
+        nodes = [(int(node_id), {"label": _decode_gml_label(label)}) for node_id, label in fast_nodes]
+    else:
+        nodes = []
+        for block in _GML_NODE_RE.findall(data):
+            id_match = _GML_ID_RE.search(block)
+            if id_match is None:
+                continue
+            label_match = _GML_LABEL_RE.search(block)
+            nodes.append((int(id_match.group(1)), {"label": _decode_gml_label(label_match.group(1) if label_match else None)}))
+    
+    fast_edges = _GML_EDGE_FAST_RE.findall(data)
+    if len(fast_edges) == data.count(b"edge"):
+        edges = [(int(u), int(v)) for u, v in fast_edges]
+    else:
+        edges = []
+        for block in _GML_EDGE_RE.findall(data):
+            source_match = _GML_SOURCE_RE.search(block)
+            target_match = _GML_TARGET_RE.search(block)
+            if source_match is not None and target_match is not None:
+                edges.append((int(source_match.group(1)), int(target_match.group(1))))
+    
+    g.add_nodes_from(nodes)
+    g.add_edges_from(edges)
+    return g
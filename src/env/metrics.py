@@ -267,12 +267,63 @@ class ResilienceMetrics:
         
         Returns:
             Dict[node_id, impact_score]: 影响分数字典
+        
+        Note:
+            结果与逐个调用 compute_impact_score 相同。连通分量只计算一次，
+            移除候选节点只会拆分它所在的分量（"脏"分量），其余分量大小直接复用，
+            因此每个候选只需在自身分量内遍历一次，无需复制整张图。
         """
+        n = graph.number_of_nodes()
+        if n == 0:
+            return {node: 0.0 for node in candidate_nodes}
+        
+        components = list(nx.connected_components(graph))
+        component_of = {}
+        for idx, cc in enumerate(components):
+            for node in cc:
+                component_of[node] = idx
+        sizes = [len(cc) for cc in components]
+        # 最大和次大分量，用于得到"除候选所在分量外"的最大分量
+        order = sorted(range(len(sizes)), key=sizes.__getitem__, reverse=True)
+        largest_idx = order[0]
+        second_size = sizes[order[1]] if len(order) > 1 else 0
+        lcc_before = sizes[largest_idx] / n
+        
         scores = {}
         for node in candidate_nodes:
-            scores[node] = self.compute_impact_score(graph, node)
+            if node not in component_of:
+                scores[node] = 0.0
+                continue
+            idx = component_of[node]
+            other_max = second_size if idx == largest_idx else sizes[largest_idx]
+            piece_max = self._largest_piece_without(graph, components[idx], node)
+            lcc_after = max(other_max, piece_max) / n
+            scores[node] = max(0.0, min(1.0, lcc_before - lcc_after))
         return scores
     
+    @staticmethod
+    def _largest_piece_without(graph: nx.Graph, component, removed) -> int:
+        """移除 removed 后，其所在连通分量 component 拆分出的最大片段大小"""
+        adj = graph.adj
+        seen = {removed}
+        best = 0
+        for start in component:
+            if start in seen:
+                continue
+            seen.add(start)
+            stack = [start]
+            size = 0
+            while stack:
+                x = stack.pop()
+                size += 1
+                for y in adj[x]:
+                    if y not in seen:
+                        seen.add(y)
+                        stack.append(y)
+            if size > best:
+                best = size
+        return best
+    
     def compute_edge_gain(
         self, 
         graph: nx.Graph, 
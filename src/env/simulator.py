@@ -16,6 +16,11 @@ from pathlib import Path
 import numpy as np
 import networkx as nx
 from abc import ABC, abstractmethod
+import itertools
+
+# 图状态版本号：所有环境共用一个递增计数器，每个图状态拿到全局唯一的版本号，
+# 可直接作为缓存键（reset 后也不会与之前的状态冲突）
+_graph_versions = itertools.count(1)
 
 
 class TaskType(Enum):
@@ -90,6 +95,7 @@ class NetworkEnvironment:
         budget (int): 操作预算
         current_step (int): 当前步骤
         history (List[GraphState]): 状态历史
+        graph_version (int): 图状态版本号，经 remove_node / add_edge / reset 改变图时更新（全局唯一）
     """
     
     def __init__(
@@ -119,12 +125,23 @@ class NetworkEnvironment:
         
         self.current_step = 0
         self.history: List[GraphState] = []
+        self.graph_version = next(_graph_versions)
         
         # 缓存计算结果
         self._laplacian_cache = None
         self._fiedler_cache = None
         self._betweenness_cache = None
         
+        # 度数缓存：由 remove_node / add_edge 增量维护
+        self._degree_cache: Optional[Dict[Union[int, str], int]] = None
+        self._degree_cache_shape: Optional[Tuple[int, int]] = None
+        
+        # 连通分量缓存：{节点: 分量编号} 与 {分量编号: 节点集合}，由 remove_node / add_edge 增量维护
+        self._comp_of: Optional[Dict[Union[int, str], int]] = None
+        self._comp_members: Dict[int, Set[Union[int, str]]] = {}
+        self._comp_shape: Optional[Tuple[int, int]] = None
+        self._next_comp_id = 0
+        
         # 记录初始状态
         self._record_state()
     
@@ -138,6 +155,9 @@ class NetworkEnvironment:
         self.graph = self.initial_graph.copy()
         self.current_step = 0
         self.history = []
+        self.graph_version = next(_graph_versions)
+        self._degree_cache = None
+        self._comp_of = None
         self._invalidate_cache()
         self._record_state()
         return self
@@ -219,14 +239,16 @@ class NetworkEnvironment:
             nodes = list(self.graph.nodes())
             if not nodes:
                 return []
-            nodes_sorted = sorted(nodes, key=lambda n: self.graph.degree(n), reverse=True)
+            degrees = self.degree_map()
+            nodes_sorted = sorted(nodes, key=degrees.__getitem__, reverse=True)
             return nodes_sorted[: min(k, len(nodes_sorted))]
 
         if candidate_type == "edge":
             nodes = list(self.graph.nodes())
             if len(nodes) < 2:
                 return []
-            nodes_sorted = sorted(nodes, key=lambda n: self.graph.degree(n), reverse=True)
+            degrees = self.degree_map()
+            nodes_sorted = sorted(nodes, key=degrees.__getitem__, reverse=True)
             pool = nodes_sorted[: min(max(k, 50), len(nodes_sorted))]
             candidates: List[Tuple] = []
             seen = set()
@@ -248,21 +270,199 @@ class NetworkEnvironment:
 
     # ==================== 推理脚本需要的简化操作接口 ====================
 
+    def degree_map(self) -> Dict[Union[int, str], int]:
+        """
+        当前图的 {节点: 度数}
+        
+        由 remove_node / add_edge 增量更新，不必每步遍历整张图；调用方只读，不要修改。
+        若图被直接修改（节点数或边数与缓存时不一致），重新统计一次。
+        """
+        shape = self._graph_shape()
+        if self._degree_cache is None or self._degree_cache_shape != shape:
+            self._degree_cache = dict(self.graph.degree())
+            self._degree_cache_shape = shape
+        return self._degree_cache
+
+    def largest_component_size(self) -> int:
+        """当前图最大连通分量的节点数（由连通分量缓存得到，不遍历整张图）"""
+        self._ensure_components(self._graph_shape())
+        return max(map(len, self._comp_members.values()), default=0)
+
+    def lcc_ratio(self) -> float:
+        """
+        当前图的 LCC 比例 |LCC| / N，与 ResilienceMetrics.compute_lcc_ratio 结果相同
+        
+        remove_node 只重新遍历被移除节点所在的分量，add_edge 把较小的分量并入较大的分量，
+        每步不再对整张图求连通分量。
+        """
+        n = self.graph.number_of_nodes()
+        return self.largest_component_size() / n if n else 0.0
+
+    def _graph_shape(self) -> Tuple[int, int]:
+        """(节点数, 边数)，用于判断缓存之后图是否被直接修改过"""
+        return (self.graph.number_of_nodes(), self.graph.number_of_edges())
+
+    def _ensure_components(self, shape: Tuple[int, int]) -> None:
+        """连通分量缓存缺失或图被直接修改（节点数或边数不一致）时重新计算"""
+        if self._comp_of is not None and self._comp_shape == shape:
+            return
+        self._comp_of = {}
+        self._comp_members = {}
+        for cid, cc in enumerate(nx.connected_components(self.graph)):
+            for node in cc:
+                self._comp_of[node] = cid
+            self._comp_members[cid] = cc
+        self._next_comp_id = len(self._comp_members)
+        self._comp_shape = shape
+
+    def _split_component(self, removed, neighbors) -> None:
+        """
+        removed 已从图中删除：把它原来所在的分量按剩余连通性拆分
+        
+        从各邻居同时交替做 DFS，两路搜索相遇即合并；只剩一路仍在扩展时停止，
+        该路所在的（最大）片段沿用原分量编号，只有提前走完的小片段被重新编号。
+        移除叶子或不拆分分量时几乎不需要遍历。
+        """
+        cid = self._comp_of.pop(removed)
+        members = self._comp_members[cid]
+        members.discard(removed)
+        seeds = list(dict.fromkeys(n for n in neighbors if n != removed))
+        if len(seeds) <= 1:
+            if not members:
+                del self._comp_members[cid]
+            return
+        
+        adj = self.graph.adj
+        owner = {}    # 节点 -> 发现它的搜索编号
+        parent = {}   # 搜索编号并查集：相遇的搜索属于同一片段
+        stacks = {}
+        visited = {}
+        for i, seed in enumerate(seeds):
+            owner[seed] = i
+            parent[i] = i
+            stacks[i] = [seed]
+            visited[i] = [seed]
+        
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        
+        active = list(range(len(seeds)))
+        closed = []
+        while len(active) > 1:
+            still_active = []
+            for g in active:
+                if parent[g] != g:
+                    continue  # 本轮已被并入其他搜索
+                if not stacks[g]:
+                    # 走完且没有遇到其他搜索：这是一个脱离出去的片段
+                    closed.append(g)
+                    continue
+                x = stacks[g].pop()
+                for y in adj[x]:
+                    h = owner.get(y)
+                    if h is None:
+                        owner[y] = g
+                        stacks[g].append(y)
+                        visited[g].append(y)
+                        continue
+                    h = find(h)
+                    if h != g:
+                        # 两路搜索相遇：较小的并入较大的
+                        if len(visited[h]) > len(visited[g]):
+                            g, h = h, g
+                        parent[h] = g
+                        stacks[g].extend(stacks.pop(h))
+                        visited[g].extend(visited.pop(h))
+                still_active.append(g)
+            active = list(dict.fromkeys(find(g) for g in still_active))
+        
+        # 提前走完的搜索即为脱离出去的片段，重新编号；剩下的最后一路沿用原编号
+        for g in closed:
+            piece = set(visited[g])
+            new_cid = self._next_comp_id
+            self._next_comp_id += 1
+            for node in piece:
+                self._comp_of[node] = new_cid
+            self._comp_members[new_cid] = piece
+            members -= piece
+        if not members:
+            del self._comp_members[cid]
+
+    def _merge_components(self, u, v) -> None:
+        """u、v 之间新增了边：较小的分量并入较大的分量"""
+        cu, cv = self._comp_of[u], self._comp_of[v]
+        if cu == cv:
+            return
+        if len(self._comp_members[cu]) < len(self._comp_members[cv]):
+            cu, cv = cv, cu
+        small = self._comp_members.pop(cv)
+        for x in small:
+            self._comp_of[x] = cu
+        self._comp_members[cu] |= small
+
+    def _degree_cache_valid(self, shape: Tuple[int, int]) -> bool:
+        return (
+            self._degree_cache is not None
+            and not self.graph.is_multigraph()
+            and self._degree_cache_shape == shape
+        )
+
     def remove_node(self, node_id: Union[int, str]) -> None:
         """移除节点（推理脚本使用）"""
         if node_id in self.graph:
+            # number_of_edges() 需要遍历邻接表，每步只统计一次，变更后的形状直接推算
+            shape = self._graph_shape()
+            degree_valid = self._degree_cache_valid(shape)
+            components_valid = self._comp_of is not None and self._comp_shape == shape
+            neighbors = list(self.graph.adj[node_id])
+            if degree_valid:
+                for nbr in neighbors:
+                    if nbr != node_id:
+                        self._degree_cache[nbr] -= 1
+                del self._degree_cache[node_id]
+            else:
+                self._degree_cache = None
             self.graph.remove_node(node_id)
+            if self.graph.is_multigraph():
+                shape = self._graph_shape()
+            else:
+                shape = (shape[0] - 1, shape[1] - len(neighbors))
+            if degree_valid:
+                self._degree_cache_shape = shape
+            if components_valid:
+                self._split_component(node_id, neighbors)
+                self._comp_shape = shape
             self.current_step += 1
+            self.graph_version = next(_graph_versions)
             self._invalidate_cache()
-            self._record_state()
+            self._record_state(shape)
 
     def add_edge(self, u: Union[int, str], v: Union[int, str]) -> None:
         """添加边（推理脚本使用）"""
         if u in self.graph and v in self.graph and u != v:
+            shape = self._graph_shape()
+            degree_valid = self._degree_cache_valid(shape)
+            components_valid = self._comp_of is not None and self._comp_shape == shape
+            if self.graph.is_multigraph() or not self.graph.has_edge(u, v):
+                if degree_valid:
+                    self._degree_cache[u] += 1
+                    self._degree_cache[v] += 1
+                shape = (shape[0], shape[1] + 1)
+            if not degree_valid:
+                self._degree_cache = None
             self.graph.add_edge(u, v)
+            if degree_valid:
+                self._degree_cache_shape = shape
+            if components_valid:
+                self._merge_components(u, v)
+                self._comp_shape = shape
             self.current_step += 1
+            self.graph_version = next(_graph_versions)
             self._invalidate_cache()
-            self._record_state()
+            self._record_state(shape)
     
     # ==================== 操作执行接口 ====================
     
@@ -366,23 +566,23 @@ class NetworkEnvironment:
     
     # ==================== 内部方法 ====================
     
-    def _record_state(self) -> None:
-        """记录当前状态到历史"""
-        state = self._create_state_snapshot()
+    def _record_state(self, shape: Optional[Tuple[int, int]] = None) -> None:
+        """记录当前状态到历史（shape 为调用方已知的 (节点数, 边数)）"""
+        state = self._create_state_snapshot(shape)
         self.history.append(state)
     
-    def _create_state_snapshot(self) -> GraphState:
+    def _create_state_snapshot(self, shape: Optional[Tuple[int, int]] = None) -> GraphState:
         """创建当前状态快照"""
         from .metrics import ResilienceMetrics
         
-        largest_cc = max(nx.connected_components(self.graph), key=len) \
-            if self.graph.number_of_nodes() > 0 else set()
-        
+        if shape is None:
+            shape = self._graph_shape()
+        self._ensure_components(shape)
         return GraphState(
             step=self.current_step,
-            num_nodes=self.graph.number_of_nodes(),
-            num_edges=self.graph.number_of_edges(),
-            largest_cc_size=len(largest_cc),
+            num_nodes=shape[0],
+            num_edges=shape[1],
+            largest_cc_size=max(map(len, self._comp_members.values()), default=0),
             resilience_score=0.0,  # TODO: 计算实际韧性分数
             removed_nodes=set(),
             added_edges=set()
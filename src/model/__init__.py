@@ -6,5 +6,6 @@ Model module containing LLM architecture and loss functions.
 
 from .fusion_llm import ResilienceLLM, GeometricEncoder
 from .loss import ListMLELoss, ListNetLoss
+from .checkpoint import load_checkpoint_state
 
-__all__ = ["ResilienceLLM", "GeometricEncoder", "ListMLELoss", "ListNetLoss"]
+__all__ = ["ResilienceLLM", "GeometricEncoder", "ListMLELoss", "ListNetLoss", "load_checkpoint_state"]
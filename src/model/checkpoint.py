@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+模型检查点权重的读取（评估 / 推理 / LLM 攻击共用）
+
+训练器装有 safetensors 时保存 model.safetensors，否则保存 model.pt。
+"""
+
+from pathlib import Path
+from typing import Dict, Union
+
+import torch
+
+try:
+    from safetensors.torch import load_file
+except ImportError:  # 未安装 safetensors 时只能读取 .pt/.pth 检查点
+    load_file = None
+
+
+def load_checkpoint_state(
+    checkpoint_file: Union[str, Path],
+    device: Union[str, torch.device] = "cpu"
+) -> Dict[str, torch.Tensor]:
+    """
+    读取检查点中的模型权重
+
+    .safetensors 经 mmap 按偏移直接读到 device 上，不经过 pickle；
+    .pt/.pth 用 mmap + weights_only 读到 CPU，张量按需从文件读取，
+    由 load_state_dict 拷贝进模型已有的参数。
+
+    Args:
+        checkpoint_file: 权重文件路径
+        device: .safetensors 张量的目标设备
+
+    Returns:
+        state dict（检查点外层有 model_state_dict 时取其内容）
+    """
+    checkpoint_file = Path(checkpoint_file)
+    if checkpoint_file.suffix == ".safetensors":
+        if load_file is None:
+            raise ImportError(f"读取 {checkpoint_file} 需要安装 safetensors")
+        return load_file(str(checkpoint_file), device=str(device))
+    checkpoint = torch.load(checkpoint_file, map_location="cpu", mmap=True, weights_only=True)
+    return checkpoint.get('model_state_dict', checkpoint)
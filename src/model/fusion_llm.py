@@ -31,6 +31,7 @@ class ModelConfig:
     lora_alpha: int = 32
     lora_dropout: float = 0.1
     lora_target_modules: List[str] = None  # None 表示使用默认值
+    attn_implementation: Optional[str] = "sdpa"  # 注意力实现："sdpa" / "flash_attention_2" / "eager"，None 使用模型默认
     
     # 几何编码器配置
     use_geometric_encoder: bool = False
@@ -367,10 +368,24 @@ class ResilienceLLM(nn.Module):
         # 加载模型，强制使用 FP32 以避免 NaN 问题
         load_kwargs["dtype"] = torch.float32
         
-        self.llm = AutoModelForCausalLM.from_pretrained(
-            self.config.llm_model_name,
-            **load_kwargs
-        )
+        # 注意力使用 PyTorch SDPA（运行时选择 FlashAttention / memory-efficient kernel，
+        # 不再显式构造 [L, L] 注意力矩阵）；trust_remote_code 的模型可能不支持该参数，此时退回默认实现
+        if self.config.attn_implementation:
+            load_kwargs["attn_implementation"] = self.config.attn_implementation
+        try:
+            self.llm = AutoModelForCausalLM.from_pretrained(
+                self.config.llm_model_name,
+                **load_kwargs
+            )
+        except (ValueError, TypeError) as e:
+            if "attn_implementation" not in load_kwargs:
+                raise
+            print(f"⚠️  模型不支持 attn_implementation={self.config.attn_implementation}，使用默认注意力实现: {e}")
+            load_kwargs.pop("attn_implementation")
+            self.llm = AutoModelForCausalLM.from_pretrained(
+                self.config.llm_model_name,
+                **load_kwargs
+            )
         
         # 双重确保：将所有参数转换为 FP32
         self.llm = self.llm.float()
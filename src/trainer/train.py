@@ -23,6 +23,12 @@ from torch.optim import AdamW
 from torch.optim.lr_scheduler import CosineAnnealingLR, LinearLR
 from tqdm import tqdm
 
+try:
+    from safetensors.torch import save_model, load_model
+except ImportError:  # 未安装 safetensors 时仍用 torch.save 保存 model.pt
+    save_model = None
+    load_model = None
+
 
 @dataclass
 class TrainingConfig:
@@ -723,8 +729,11 @@ class ResilienceTrainer:
         checkpoint_dir = self.output_dir / "checkpoints" / name
         checkpoint_dir.mkdir(parents=True, exist_ok=True)
         
-        # 保存模型
-        torch.save(self.model.state_dict(), checkpoint_dir / "model.pt")
+        # 保存模型：safetensors 加载时按 mmap 直接读到目标设备，不经过 pickle
+        if save_model is not None:
+            save_model(self.model, str(checkpoint_dir / "model.safetensors"))
+        else:
+            torch.save(self.model.state_dict(), checkpoint_dir / "model.pt")
         
         # 保存优化器状态
         torch.save({
@@ -751,9 +760,13 @@ class ResilienceTrainer:
         checkpoint_dir = Path(checkpoint_path)
         
         # 加载模型
-        model_path = checkpoint_dir / "model.pt"
-        if model_path.exists():
-            self.model.load_state_dict(torch.load(model_path, map_location=self.device))
+        model_path = checkpoint_dir / "model.safetensors"
+        legacy_path = checkpoint_dir / "model.pt"
+        if load_model is not None and model_path.exists():
+            # load_model 会还原 save_model 去掉的共享张量（如绑定的 embedding），并严格检查键名
+            load_model(self.model, str(model_path), device=str(self.device))
+        elif legacy_path.exists():
+            self.model.load_state_dict(torch.load(legacy_path, map_location=self.device))
         
         # 加载优化器状态
         optimizer_path = checkpoint_dir / "optimizer.pt"
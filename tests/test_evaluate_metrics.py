@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+scripts/evaluate.py 排序指标内核的一致性测试
+
+Numba 内核（CPU 评估）与 _ranking_metrics_vectorized（GPU / 编译路径）必须给出相同的结果；
+数据覆盖被掩码的候选、同分候选、没有正标签的样本和没有有效候选的样本。
+"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="module")
+def evaluate():
+    spec = importlib.util.spec_from_file_location("evaluate_script", ROOT / "scripts" / "evaluate.py")
+    module = importlib.util.module_from_spec(spec)
+    # Numba 的 cache=True 读取磁盘缓存时需要按模块名重新导入
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    yield module
+    sys.modules.pop(spec.name, None)
+
+
+def _make_batch(seed: int, batch_size: int = 64, num_candidates: int = 12):
+    rng = np.random.default_rng(seed)
+    shape = (batch_size, num_candidates)
+    scores = rng.standard_normal(shape).astype(np.float32)
+    labels = (rng.integers(0, 3, shape) * (rng.random(shape) < 0.5)).astype(np.float32)
+    mask = rng.random(shape) < 0.8
+    labels[:4] = 0.0     # 没有正标签
+    mask[4:6] = False    # 没有有效候选
+    # 同分候选（标签也相同，topk 内部的先后顺序不影响指标）
+    scores[6:16, 1] = scores[6:16, 0]
+    labels[6:16, 1] = labels[6:16, 0]
+    mask[6:16, :2] = True
+    return scores, labels, mask
+
+
+def _vectorized(evaluate, scores, labels, mask):
+    k10 = min(10, scores.shape[1])
+    metrics = evaluate._ranking_metrics_vectorized(
+        torch.from_numpy(scores), torch.from_numpy(labels), torch.from_numpy(mask),
+        evaluate._get_discounts(k10, "cpu")
+    )
+    return np.array([metrics[name].item() for name in evaluate._METRIC_NAMES])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_numba_kernel_matches_vectorized(evaluate, seed):
+    if evaluate.numba is None:
+        pytest.skip("numba 未安装")
+    scores, labels, mask = _make_batch(seed)
+    k10 = min(10, scores.shape[1])
+    actual = evaluate._ranking_metrics_numba(scores, labels, mask, k10)
+    np.testing.assert_allclose(actual, _vectorized(evaluate, scores, labels, mask), rtol=1e-4, atol=1e-4)
+
+
+def test_rows_without_positive_labels_do_not_depend_on_batching(evaluate):
+    scores, labels, mask = _make_batch(0)
+    whole = _vectorized(evaluate, scores, labels, mask)
+    # 没有正标签 / 没有有效候选的样本单独成 batch 时不计入，与放在混合 batch 中的结果相同
+    split = _vectorized(evaluate, scores[:6], labels[:6], mask[:6]) + _vectorized(evaluate, scores[6:], labels[6:], mask[6:])
+    np.testing.assert_allclose(split, whole, rtol=1e-5, atol=1e-5)
+    assert whole[-1] == (mask & (labels > 0)).any(axis=1).sum()